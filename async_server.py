@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+ERPNext Web Installer - asyncio server
+Serves the job event streams from one event loop: every watcher is a
+coroutine parked on its job and woken when new events are published, so
+thousands of open browser tabs cost no threads and no polling. All other
+requests are handed to the Flask app in a small thread pool.
+
+    python3 async_server.py            (or: python3 web_installer.py --async)
+
+This is what Procfile, render.yaml and start_web_gui.sh start;
+`python3 web_installer.py` alone still runs the threaded Flask server.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import sys
+from urllib.parse import parse_qsl, unquote
+
+import web_installer
+
+STREAM_ROUTES = {
+    '/stream': 'install',
+    '/doctor/stream': 'doctor',
+    '/uninstall/stream': 'uninstall',
+    '/fleet/stream': 'fleet',
+    '/benchmark/stream': 'benchmark',
+}
+# Threads running Flask for the non-streaming requests
+WSGI_THREADS = 16
+# Idle streams get a comment line this often so proxies keep them open
+HEARTBEAT_SECONDS = 15
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 10 * 1024 * 1024
+KEEPALIVE_SECONDS = 30
+
+
+class BadRequest(Exception):
+    status = '400 BAD REQUEST'
+
+
+class LengthRequired(BadRequest):
+    status = '411 LENGTH REQUIRED'
+
+
+def raise_fd_limit():
+    """Every watcher is a socket: lift the soft open-files limit to the hard one"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+async def read_request(reader):
+    """(method, path, query, headers, body) of the next request, or None at EOF"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise BadRequest('Incomplete request')
+        return None
+    except asyncio.LimitOverrunError:
+        raise BadRequest('Request header too large')
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise BadRequest('Bad request line')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().title()] = value.strip()
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        raise LengthRequired('Chunked request bodies are not supported; send Content-Length')
+    try:
+        length = int(headers.get('Content-Length') or 0)
+    except ValueError:
+        raise BadRequest('Bad Content-Length')
+    if length < 0:
+        raise BadRequest('Bad Content-Length')
+    if length > MAX_BODY_BYTES:
+        raise BadRequest('Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    path, _, query = target.partition('?')
+    return method, path, query, headers, body, version
+
+
+def call_wsgi(method, path, query, headers, body, peer):
+    """Run one request through the Flask app (in a worker thread)"""
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote(path, 'latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '0',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': peer[0] if peer else '',
+        'CONTENT_TYPE': headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            environ[key] = value
+    if 'Host' in headers:
+        environ['SERVER_NAME'], _, port = headers['Host'].partition(':')
+        environ['SERVER_PORT'] = port or '80'
+
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = response_headers
+
+    result = web_installer.app(environ, start_response)
+    try:
+        payload = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], payload
+
+
+def response_head(status, headers, keep_alive):
+    lines = [f'HTTP/1.1 {status}']
+    lines += [f'{name}: {value}' for name, value in headers]
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def job_events(job, cursor, batch_ms, batch_lines):
+    """The SSE frames of one job from cursor on, as web_installer.stream_job
+    sends them, but parked on a future instead of a thread"""
+    loop = asyncio.get_running_loop()
+    yield f"retry: {web_installer.SSE_RETRY_MS}\n\n"
+    future = None
+    while True:
+        start, msgs = job.read(cursor, timeout=0)
+        if start > cursor:
+            yield f"event: log\ndata: ... {start - cursor} earlier events no longer buffered\n\n"
+        if not msgs:
+            if job.done:
+                yield "event: eof\ndata: {}\n\n"
+                return
+            if future is None or future.done():
+                future = job.waiter(loop, cursor)
+            # asyncio.wait leaves the future pending on timeout, so an idle
+            # watcher keeps a single registration with the job
+            done, _ = await asyncio.wait({future}, timeout=HEARTBEAT_SECONDS)
+            if not done:
+                yield ": heartbeat\n\n"
+            continue
+        if batch_ms and len(msgs) < batch_lines and not job.done:
+            await asyncio.sleep(batch_ms / 1000)  # let a burst of lines collect
+            more_start, more = job.read(start + len(msgs), timeout=0)
+            if more_start == start + len(msgs):
+                msgs.extend(more)
+        yield "".join(web_installer.coalesce(start, msgs, batch_lines))
+        cursor = start + len(msgs)
+
+
+async def serve_stream(writer, kind, query, headers):
+    args = dict(parse_qsl(query))
+    job = web_installer.broker.get(args.get('job')) or web_installer.broker.latest(kind)
+    if job is None:
+        body = f'{{"success": false, "message": "No {kind} job found"}}'.encode()
+        writer.write(response_head('404 NOT FOUND', [('Content-Type', 'application/json'),
+                                                      ('Content-Length', str(len(body)))], False) + body)
+        await writer.drain()
+        return
+    cursor = web_installer.resume_cursor(headers, args)
+    batch_ms, batch_lines = web_installer.stream_batching(args)
+    writer.write(response_head('200 OK', [('Content-Type', 'text/event-stream; charset=utf-8'),
+                                          ('Cache-Control', 'no-cache'),
+                                          ('X-Accel-Buffering', 'no')], False))
+    async for frame in job_events(job, cursor, batch_ms, batch_lines):
+        writer.write(frame.encode('utf-8'))
+        await writer.drain()  # a slow client holds its own frames, not the server's memory
+
+
+async def handle(reader, writer, executor):
+    loop = asyncio.get_running_loop()
+    peer = writer.get_extra_info('peername')
+    try:
+        while True:
+            try:
+                request = await asyncio.wait_for(read_request(reader), KEEPALIVE_SECONDS)
+            except BadRequest as e:
+                body = str(e).encode()
+                writer.write(response_head(e.status, [('Content-Type', 'text/plain'),
+                                                      ('Content-Length', str(len(body)))], False) + body)
+                break
+            if request is None:
+                break
+            method, path, query, headers, body, version = request
+            if method == 'GET' and path in STREAM_ROUTES:
+                await serve_stream(writer, STREAM_ROUTES[path], query, headers)
+                break
+            status, response_headers, payload = await loop.run_in_executor(
+                executor, call_wsgi, method, path, query, headers, body, peer)
+            keep_alive = version == 'HTTP/1.1' and headers.get('Connection', '').lower() != 'close'
+            if not any(name.lower() == 'content-length' for name, _ in response_headers):
+                response_headers = response_headers + [('Content-Length', str(len(payload)))]
+            writer.write(response_head(status, response_headers, keep_alive) + payload)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host='0.0.0.0', port=5000):
+    executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+    server = await asyncio.start_server(lambda r, w: handle(r, w, executor), host, port,
+                                        limit=MAX_HEADER_BYTES, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+def run(host='0.0.0.0', port=5000):
+    limit = raise_fd_limit()
+    print(f"⚡ Async server: streams on one event loop, {WSGI_THREADS} Flask threads"
+          + (f", up to {limit} open connections" if limit else ''))
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    run(port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+ERPNext backup engine
+Streams mysqldump through a multi-threaded compressor straight to disk,
+tars the site files at the same time and records every backup set in an
+index file next to the backups.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+
+# First available wins; zstd/pigz use every core
+COMPRESSORS = [
+    ('zstd', ['zstd', '-T0', '-3', '-q', '-c'], '.zst'),
+    ('pigz', ['pigz', '-c'], '.gz'),
+    ('gzip', ['gzip', '-c'], '.gz'),
+]
+INDEX_FILE = 'index.json'
+# <stamp>-<site>-<kind> files written by `bench backup` (and by backup_site)
+BENCH_FILE = re.compile(r'^([^-]+)-(?:.+?-)?(database\.sql|private-files\.tar|files\.tar)')
+CHUNK_SIZE = 1024 * 1024
+# Backups run at low CPU and I/O priority so live traffic comes first
+LOW_PRIORITY = ['nice', '-n', '10', 'ionice', '-c2', '-n7']
+
+
+class BackupError(Exception):
+    pass
+
+
+def pick_compressor(preferred=None):
+    for name, cmd, ext in COMPRESSORS:
+        if preferred and name != preferred:
+            continue
+        if shutil.which(cmd[0]):
+            return name, cmd, ext
+    raise BackupError(f'No compressor found ({preferred or ", ".join(c[0] for c in COMPRESSORS)})')
+
+
+def low_priority(cmd):
+    if shutil.which('nice') and shutil.which('ionice'):
+        return LOW_PRIORITY + cmd
+    return cmd
+
+
+def backup_dir(bench_dir, site):
+    return os.path.join(bench_dir, 'sites', site, 'private', 'backups')
+
+
+def stream_to_file(source_cmd, compressor_cmd, dest, env=None):
+    """Run source | compressor > dest, hashing the output on the way.
+
+    Returns (size, sha256). The file only appears under its final name
+    once both processes have succeeded.
+    """
+    part = dest + '.part'
+    with tempfile.TemporaryFile() as source_err, tempfile.TemporaryFile() as comp_err:
+        source = subprocess.Popen(low_priority(source_cmd), stdout=subprocess.PIPE, stderr=source_err, env=env)
+        comp = subprocess.Popen(low_priority(compressor_cmd), stdin=source.stdout, stdout=subprocess.PIPE,
+                                stderr=comp_err)
+        source.stdout.close()  # the compressor owns the pipe now
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(part, 'wb') as out:
+                for chunk in iter(lambda: comp.stdout.read(CHUNK_SIZE), b''):
+                    out.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        finally:
+            comp.stdout.close()
+            comp.wait()
+            source.wait()
+        if source.returncode or comp.returncode:
+            os.remove(part)
+            source_err.seek(0)
+            comp_err.seek(0)
+            message = (source_err.read() + comp_err.read()).decode('utf-8', 'replace').strip()
+            raise BackupError(f'{source_cmd[0]} failed: {message[-500:] or "exit " + str(source.returncode)}')
+    os.replace(part, dest)
+    return size, digest.hexdigest()
+
+
+def dump_database(site_config, dest, compressor_cmd):
+    """mysqldump --single-transaction of the site database (no table locks)"""
+    with tempfile.NamedTemporaryFile('w', prefix='erpnext-backup-', suffix='.cnf') as defaults:
+        # Password goes through a private option file, not the command line
+        os.chmod(defaults.name, 0o600)
+        defaults.write('[client]\n')
+        defaults.write(f"user={site_config['db_name']}\n")
+        defaults.write(f"password={site_config.get('db_password', '')}\n")
+        defaults.write(f"host={site_config.get('db_host') or 'localhost'}\n")
+        if site_config.get('db_port'):
+            defaults.write(f"port={site_config['db_port']}\n")
+        defaults.flush()
+        cmd = ['mysqldump', f'--defaults-extra-file={defaults.name}', '--single-transaction', '--quick',
+               '--routines', '--default-character-set=utf8mb4', site_config['db_name']]
+        return stream_to_file(cmd, compressor_cmd, dest)
+
+
+def tar_files(sites_dir, relative, dest, compressor_cmd):
+    """tar one files directory, laid out like bench backup (site/public/files)"""
+    return stream_to_file(['tar', '-C', sites_dir, '-cf', '-', relative], compressor_cmd, dest)
+
+
+def load_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'backups': []}
+
+
+def save_index(directory, index):
+    """Write the index and give it the directory's mtime, which is how
+    refresh_index() tells that nothing new appeared since"""
+    path = os.path.join(directory, INDEX_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=2)
+    if os.geteuid() == 0:
+        owner = os.stat(directory)
+        os.chown(path + '.tmp', owner.st_uid, owner.st_gid)  # the doctor runs as root
+    os.replace(path + '.tmp', path)
+    mtime = os.stat(directory).st_mtime_ns
+    os.utime(path, ns=(mtime, mtime))
+
+
+def refresh_index(directory):
+    """The index plus backups written to the directory by others since it was saved.
+
+    Files from `bench backup` (by hand or Frappe's scheduler) are grouped
+    into sets and added, sets whose dump was deleted are dropped. The
+    directory is only listed when its mtime is newer than the index.
+    """
+    index = load_index(directory)
+    path = os.path.join(directory, INDEX_FILE)
+    try:
+        if os.path.exists(path) and os.stat(path).st_mtime_ns >= os.stat(directory).st_mtime_ns:
+            return index
+        names = os.listdir(directory)
+    except OSError:
+        return index
+    present = set(names)
+    backups = [b for b in index['backups']
+               if all(f['file'] in present for f in b['files'] if f['kind'] == 'database')]
+    known = {f['file'] for b in backups for f in b['files']}
+    found = {}
+    for name in names:
+        match = BENCH_FILE.match(name)
+        if not match or name in known or name.endswith('.part'):
+            continue
+        stamp, kind = match.group(1), match.group(2).rsplit('.', 1)[0]
+        try:
+            info = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        backup = found.setdefault(stamp, {'id': stamp, 'created': info.st_mtime, 'duration': None,
+                                          'source': 'bench', 'size': 0, 'files': []})
+        backup['created'] = min(backup['created'], info.st_mtime)
+        backup['size'] += info.st_size
+        backup['files'].append({'kind': kind, 'file': name, 'size': info.st_size})
+    index['backups'] = sorted(backups + list(found.values()), key=lambda b: b['created'])
+    try:
+        save_index(directory, index)
+    except OSError:
+        pass  # not ours to write: rescan next time
+    return index
+
+
+def backup_site(bench_dir, site, with_files=True, compressor=None, emit=None):
+    """Back up one site: database dump and file tars run concurrently.
+
+    Returns the backup set recorded in the index. emit(message) receives
+    progress lines.
+    """
+    emit = emit or (lambda message: None)
+    sites_dir = os.path.join(bench_dir, 'sites')
+    with open(os.path.join(sites_dir, site, 'site_config.json')) as f:
+        site_config = json.load(f)
+    name, compressor_cmd, ext = pick_compressor(compressor)
+    directory = backup_dir(bench_dir, site)
+    os.makedirs(directory, exist_ok=True)
+
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    prefix = os.path.join(directory, f"{stamp}-{site.replace('.', '_')}")
+    jobs = {'database': (dump_database, (site_config, f'{prefix}-database.sql{ext}', compressor_cmd))}
+    if with_files:
+        for kind, relative in (('files', f'{site}/public/files'), ('private-files', f'{site}/private/files')):
+            if os.path.isdir(os.path.join(sites_dir, relative)):
+                jobs[kind] = (tar_files, (sites_dir, relative, f'{prefix}-{kind}.tar{ext}', compressor_cmd))
+
+    started = time.time()
+    emit(f'💾 Backing up {site} ({", ".join(jobs)}) with {name}')
+
+    def run(kind):
+        func, args = jobs[kind]
+        began = time.time()
+        size, sha256 = func(*args)
+        entry = {'kind': kind, 'file': os.path.basename(args[-2]), 'size': size, 'sha256': sha256,
+                 'duration': round(time.time() - began, 2)}
+        emit(f"   ✅ {kind}: {entry['file']} ({size // 1024} KB, {entry['duration']}s)")
+        return entry
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {kind: executor.submit(run, kind) for kind in jobs}
+        files = []
+        errors = []
+        for kind, future in futures.items():
+            try:
+                files.append(future.result())
+            except (BackupError, OSError) as e:
+                errors.append(f'{kind}: {e}')
+    if errors:
+        for entry in files:
+            os.remove(os.path.join(directory, entry['file']))
+        raise BackupError('; '.join(errors))
+
+    config_copy = f'{prefix}-site_config_backup.json'
+    shutil.copyfile(os.path.join(sites_dir, site, 'site_config.json'), config_copy)
+    os.chmod(config_copy, 0o600)
+
+    backup = {
+        'id': stamp,
+        'site': site,
+        'created': started,
+        'duration': round(time.time() - started, 2),
+        'compressor': name,
+        'size': sum(entry['size'] for entry in files),
+        'files': files,
+    }
+    index = refresh_index(directory)  # also records bench backups made since the last save
+    index['backups'] = [b for b in index['backups'] if b['id'] != stamp] + [backup]
+    save_index(directory, index)
+    emit(f"💾 Backup {stamp} done: {backup['size'] // 2**20} MB in {backup['duration']}s")
+    return backup
+
+
+def latest_backup(bench_dir, site):
+    """Newest backup set with a database dump, and how many there are.
+
+    Comes from the index; backups taken by `bench backup` are added to it
+    the first time the doctor sees them (see refresh_index()).
+    """
+    index = refresh_index(backup_dir(bench_dir, site))
+    sets = [b for b in index['backups'] if any(f['kind'] == 'database' for f in b['files'])]
+    if not sets:
+        return None, 0
+    return max(sets, key=lambda b: b['created']), len(sets)
+
+
+def restore_command(bench_dir, site, backup):
+    """Shell command restoring a backup set with `bench restore`, which
+    cannot read zstd: .zst files are decompressed to the temp directory
+    first (not next to the backups, where the index would pick them up)"""
+    steps = []
+    options = {'database': '', 'files': '--with-public-files ', 'private-files': '--with-private-files '}
+    restore = []
+    for entry in sorted((f for f in backup['files'] if f['kind'] in options),
+                        key=lambda f: list(options).index(f['kind'])):
+        path = os.path.join(backup_dir(bench_dir, site), entry['file'])
+        if path.endswith('.zst'):
+            plain = os.path.join(tempfile.gettempdir(), entry['file'][:-4])
+            steps.append(f'zstd -dcf {shlex.quote(path)} > {shlex.quote(plain)}')
+            path = plain
+        restore.append(options[entry['kind']] + shlex.quote(path))
+    steps.append(f'cd {shlex.quote(bench_dir)} && bench --site {site} restore {" ".join(restore)}')
+    return ' && '.join(steps)
+
+
+if __name__ == '__main__':
+    import argparse
+    import doctor_checks
+
+    parser = argparse.ArgumentParser(description='Streaming, parallel-compressed ERPNext site backup')
+    parser.add_argument('--bench', help='frappe-bench directory (default: auto-detect)')
+    parser.add_argument('--site', action='append', help='site to back up (repeatable, default: all)')
+    parser.add_argument('--no-files', action='store_true', help='database only')
+    parser.add_argument('--compressor', choices=[c[0] for c in COMPRESSORS], help='force a compressor')
+    args = parser.parse_args()
+
+    bench = args.bench or doctor_checks.find_bench()
+    if not bench:
+        raise SystemExit('ERPNext installation not found')
+    failed = False
+    for name in args.site or doctor_checks.list_sites(bench):
+        try:
+            backup_site(bench, name, not args.no_files, args.compressor, emit=lambda m: print(m, flush=True))
+        except (BackupError, OSError) as e:
+            print(f'❌ {name}: {e}', flush=True)
+            failed = True
+    raise SystemExit(1 if failed else 0)
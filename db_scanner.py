@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+ERPNext Doctor - incremental database integrity scanner
+Checks the tables of every site database one at a time, skipping tables
+unchanged since their last clean check, under an I/O and load budget.
+Progress lives in a catalog file so an interrupted scan resumes later.
+"""
+
+import json
+import os
+import time
+
+from log_analyzer import state_file
+import probes
+
+# Read budget for CHECK TABLE, in MB of table data per second
+SCAN_MB_PER_SEC = 20
+# Pause while the 1-minute load average is above CPU count * LOAD_LIMIT
+LOAD_LIMIT = 1.0
+LOAD_PAUSE_SECONDS = 5
+# Tables are re-verified at least this often even when unchanged
+# (InnoDB forgets UPDATE_TIME on restart)
+RECHECK_DAYS = 30
+CATALOG_FILE = 'db_catalog.json'
+# CHECK TABLE statuses that mean the table is fine
+OK_MESSAGES = ('OK', 'Table is already up to date')
+# Rough CHECK TABLE speed, to guess whether a never-timed table fits the time left
+CHECK_MB_PER_SEC = 50
+# Catalog statuses of checks that did not finish (say nothing about the table)
+UNFINISHED = ('timeout', 'error')
+
+
+def load_catalog(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+def save_catalog(path, catalog):
+    if not path:
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(catalog, f)
+    os.replace(tmp, path)
+
+
+def refresh_catalog(db, catalog, databases):
+    """Merge current table sizes / UPDATE_TIME of the given schemas into the catalog"""
+    names = ', '.join(f"'{name}'" for name in databases)
+    rows = db.query(
+        'SELECT table_schema, table_name, engine, data_length + index_length, '
+        'UNIX_TIMESTAMP(update_time) FROM information_schema.tables '
+        f"WHERE table_schema IN ({names}) AND table_type = 'BASE TABLE'")
+    seen = set()
+    for schema, table, engine, size, updated in rows:
+        key = f'{schema}.{table}'
+        seen.add(key)
+        entry = catalog.setdefault(key, {})
+        entry.update({
+            'schema': schema,
+            'table': table,
+            'engine': engine,
+            'size': int(size) if size.isdigit() else 0,
+            'update_time': float(updated) if updated != 'NULL' else None,
+        })
+    for key in [k for k, e in catalog.items() if e.get('schema') in databases and k not in seen]:
+        del catalog[key]  # dropped tables
+    return catalog
+
+
+def needs_check(entry, now):
+    """Why a table is due for CHECK TABLE, or None when it can be skipped"""
+    checked = entry.get('last_checked')
+    if not checked:
+        return 'never checked'
+    if entry.get('status') in UNFINISHED:
+        return 'unfinished last time'
+    if entry.get('status') != 'OK':
+        return 'failed last time'
+    if entry.get('update_time') and entry['update_time'] > checked:
+        return 'modified'
+    if entry.get('size') != entry.get('checked_size'):
+        return 'size changed'
+    if now - checked > RECHECK_DAYS * 86400:
+        return 'periodic re-check'
+    return None
+
+
+def check_table(db, entry, timeout):
+    """Run CHECK TABLE on one table; returns (status, messages)"""
+    rows = db.query(f"CHECK TABLE `{entry['schema']}`.`{entry['table']}`", timeout=timeout)
+    messages = [row[3] for row in rows if len(row) >= 4 and row[2] in ('error', 'warning', 'status')]
+    failed = any(len(row) >= 4 and (row[2] == 'error' or (row[2] == 'status' and row[3] not in OK_MESSAGES))
+                 for row in rows)
+    return ('corrupt' if failed else 'OK'), messages
+
+
+def expected_seconds(entry):
+    """How long CHECK TABLE should take, from the table's last timing if it has one"""
+    if entry.get('status') == 'OK' and entry.get('duration') and entry.get('checked_size'):
+        return entry['duration'] * entry['size'] / entry['checked_size']
+    guess = entry['size'] / 2**20 / CHECK_MB_PER_SEC
+    if entry.get('status') == 'timeout':
+        guess = max(guess, entry.get('duration') or 0)  # it ran at least this long
+    return guess
+
+
+def repair_sql(entry):
+    """REPAIR TABLE only works for MyISAM/Aria; InnoDB tables are rebuilt"""
+    name = f"`{entry['schema']}`.`{entry['table']}`"
+    if (entry.get('engine') or '').lower() == 'innodb':
+        return f'ALTER TABLE {name} FORCE'
+    return f'REPAIR TABLE {name}'
+
+
+def throttle(size_mb, elapsed, budget_mb, deadline):
+    """Sleep so the scan stays under budget_mb MB/s and off a busy host"""
+    if budget_mb:
+        wait = size_mb / budget_mb - elapsed
+        if wait > 0:
+            time.sleep(min(wait, max(0, deadline - time.time())))
+    limit = (os.cpu_count() or 1) * LOAD_LIMIT
+    paused = 0
+    while os.getloadavg()[0] > limit and time.time() + LOAD_PAUSE_SECONDS < deadline:
+        time.sleep(LOAD_PAUSE_SECONDS)
+        paused += LOAD_PAUSE_SECONDS
+    return paused
+
+
+def scan(db, databases, max_seconds=240, budget_mb=SCAN_MB_PER_SEC, catalog_path=None, repair=False,
+         emit=None):
+    """Check the due tables of `databases` until done or max_seconds pass.
+
+    Failing tables come first, then never-checked ones, then the oldest
+    checks; tables whose last check timed out or errored go last, so one
+    huge table cannot hold up the rest run after run. Tables not expected
+    to finish in the time left are skipped (listed in 'too_big'). The
+    catalog is saved after every table, so a scan cut short by the time
+    budget continues where it stopped on the next run. Returns a summary
+    dict; emit(entry) is called per checked table.
+    """
+    started = time.time()
+    deadline = started + max_seconds
+    if not databases:
+        return {'tables': 0, 'due': 0, 'checked': 0, 'bytes': 0, 'paused': 0,
+                'failed': [], 'repaired': [], 'unfinished': [], 'too_big': [], 'remaining': 0, 'duration': 0}
+    catalog_path = catalog_path or state_file(CATALOG_FILE)
+    catalog = refresh_catalog(db, load_catalog(catalog_path) if catalog_path else {}, databases)
+    now = time.time()
+
+    due = [(key, reason) for key, entry in catalog.items()
+           if entry['schema'] in databases
+           for reason in [needs_check(entry, now)] if reason]
+    priority = {'failed last time': 0, 'never checked': 1, 'unfinished last time': 3}
+    due.sort(key=lambda item: (priority.get(item[1], 2), catalog[item[0]].get('last_checked') or 0))
+
+    summary = {'tables': sum(1 for e in catalog.values() if e['schema'] in databases),
+               'due': len(due), 'checked': 0, 'bytes': 0, 'paused': 0,
+               'failed': [], 'repaired': [], 'unfinished': [], 'too_big': [], 'remaining': 0}
+    for index, (key, reason) in enumerate(due):
+        if time.time() >= deadline:
+            summary['remaining'] = len(due) - index
+            break
+        entry = catalog[key]
+        if expected_seconds(entry) > deadline - time.time():
+            summary['too_big'].append(key)
+            continue
+        began = time.time()
+        try:
+            status, messages = check_table(db, entry, timeout=max(5, deadline - began))
+            if status != 'OK' and repair:
+                try:
+                    db.query(repair_sql(entry), timeout=max(5, deadline - time.time()))
+                    summary['repaired'].append(key)
+                    status, messages = check_table(db, entry, timeout=max(5, deadline - time.time()))
+                except probes.MariaDBError as e:
+                    messages.append(str(e))
+        except TimeoutError as e:
+            status, messages = 'timeout', [str(e)]
+        except probes.MariaDBError as e:
+            status, messages = 'error', [str(e)]
+        elapsed = time.time() - began
+        entry.update({'status': status, 'messages': messages[-3:], 'last_checked': time.time(),
+                      'checked_size': entry['size'], 'duration': round(elapsed, 3), 'reason': reason})
+        save_catalog(catalog_path, catalog)
+        if emit:
+            emit(dict(entry, key=key))
+        if status in UNFINISHED:
+            summary['unfinished'].append(key)
+            if status == 'timeout':
+                # Out of time: leave the rest for the next run
+                summary['remaining'] = len(due) - index - 1
+                break
+            continue
+        summary['checked'] += 1
+        summary['bytes'] += entry['size']
+        if status != 'OK':
+            summary['failed'].append(key)
+        summary['paused'] += throttle(entry['size'] / 2**20, elapsed, budget_mb, deadline)
+
+    # Known-bad tables that were not re-checked this run still count as failing
+    summary['failed'] += [k for k, e in catalog.items() if e['schema'] in databases
+                          and e.get('status') not in (None, 'OK') + UNFINISHED and k not in summary['failed']]
+    summary['duration'] = round(time.time() - started, 2)
+    return summary
+
+
+if __name__ == '__main__':
+    import argparse
+    import doctor_checks
+
+    parser = argparse.ArgumentParser(description='Incremental ERPNext database integrity scanner')
+    parser.add_argument('--budget', type=float, default=SCAN_MB_PER_SEC, help='MB/s read budget (0 = unlimited)')
+    parser.add_argument('--max-seconds', type=int, default=3600, help='stop after this long; rerun to resume')
+    parser.add_argument('--repair', action='store_true', help='repair tables that fail the check')
+    args = parser.parse_args()
+
+    bench_dir = doctor_checks.find_bench()
+    if not bench_dir:
+        raise SystemExit('ERPNext installation not found')
+    ctx = doctor_checks.CheckContext(bench_dir, doctor_checks.list_sites(bench_dir))
+    session = probes.MariaDBSession()
+
+    def show(entry):
+        print(f"{entry['status']:<8} {entry['key']:<60} {entry['size'] // 2**20:>6} MB"
+              f" {entry['duration']:>7.2f}s ({entry['reason']})", flush=True)
+
+    try:
+        result = scan(session, [ctx.db_name(site) for site in ctx.sites], args.max_seconds, args.budget,
+                      repair=args.repair, emit=show)
+    finally:
+        session.close()
+    print(json.dumps(result, indent=2))
@@ -1477,8 +1477,17 @@ if [ "$SITE" != "unknown" ]; then
         INNODB_BUFFER_MB=$((INNODB_BUFFER / 1024 / 1024))
         log "${CYAN}InnoDB buffer pool: ${INNODB_BUFFER_MB} MB${NC}"
 
-        if [ "$INNODB_BUFFER_MB" -lt 256 ]; then
+        # Compare with the host performance profile when tuning.py is next to this script
+        TUNING_PY="$(dirname "$(readlink -f "$0")")/tuning.py"
+        RECOMMENDED_MB=256
+        if [ -f "$TUNING_PY" ]; then
+            RECOMMENDED_MB=$(python3 "$TUNING_PY" --json 2>/dev/null | awk -F'"' '/innodb_buffer_pool_size/ {sub("M", "", $4); print int($4 / 2); exit}')
+            RECOMMENDED_MB=${RECOMMENDED_MB:-256}
+        fi
+
+        if [ "$INNODB_BUFFER_MB" -lt "$RECOMMENDED_MB" ]; then
             log "${YELLOW}⚠️  InnoDB buffer pool is small - performance may be affected${NC}"
+            [ -f "$TUNING_PY" ] && log "${CYAN}   Fix: sudo python3 $TUNING_PY --apply mariadb${NC}"
             ((WARNINGS_FOUND++))
         fi
     fi
@@ -0,0 +1,892 @@
+#!/usr/bin/env python3
+"""
+ERPNext Doctor - checks engine
+Runs the doctor.sh diagnostics as independent checks, concurrently,
+each one returning a structured result instead of coloured log lines.
+"""
+
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import glob
+import json
+import os
+import pwd
+import re
+import resource
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+import time
+
+import backup_engine
+import db_scanner
+import log_analyzer
+import probes
+import sizing
+import tuning
+
+# Registry of check units, filled by the @check decorator in file order
+CHECKS = []
+
+# Thread pool size; most checks wait on sockets or subprocesses
+MAX_WORKERS = 16
+DEFAULT_TIMEOUT = 10
+
+STATUS_ICONS = {
+    'ok': '✅',
+    'warn': '⚠️',
+    'error': '❌',
+    'critical': '🛑',
+    'skip': '⏭️',
+    'timeout': '⏱',
+}
+
+REQUIRED_PACKAGES = [
+    'git', 'curl', 'wget', 'redis-server', 'nginx', 'supervisor', 'python3',
+    'python3-pip', 'python3-dev', 'default-libmysqlclient-dev', 'pkg-config',
+]
+BENCH_REDIS_PORTS = (11000, 12000, 13000)
+# Time the integrity scan may use per doctor run; the rest resumes next run
+DB_SCAN_SECONDS = 240
+
+
+def check(check_id, title, timeout=DEFAULT_TIMEOUT, per_site=False):
+    """Register a check unit.
+
+    The function gets a CheckContext (and the site name for per-site
+    checks) and returns result(...). Per-site checks are expanded into
+    one unit per site so a slow site does not hold up the others.
+    """
+    def register(func):
+        CHECKS.append({
+            'id': check_id,
+            'title': title,
+            'func': func,
+            'timeout': timeout,
+            'per_site': per_site,
+        })
+        return func
+    return register
+
+
+def result(status, evidence=None, fix=None, command=None, metrics=None):
+    """Outcome of a check.
+
+    evidence: list of short strings backing the status
+    fix: human readable suggestion
+    command: shell command that applies the fix (run when auto-fix is on)
+    metrics: optional machine-readable measurements
+    """
+    if isinstance(evidence, str):
+        evidence = [evidence]
+    outcome = {'status': status, 'evidence': evidence or [], 'fix': fix, 'command': command}
+    if metrics:
+        outcome['metrics'] = metrics
+    return outcome
+
+
+def find_bench():
+    """Same search order as doctor.sh"""
+    for path in ('/home/frappe/frappe-bench', os.path.expanduser('~/frappe-bench')):
+        if os.path.isdir(path):
+            return path
+    for pattern in ('/home/*/frappe-bench', '/home/*/*/frappe-bench', '/opt/frappe-bench', '/opt/*/frappe-bench'):
+        found = sorted(p for p in glob.glob(pattern) if os.path.isdir(p))
+        if found:
+            return found[0]
+    return None
+
+
+def list_sites(bench_dir):
+    sites_dir = os.path.join(bench_dir, 'sites')
+    try:
+        names = sorted(os.listdir(sites_dir))
+    except OSError:
+        return []
+    return [n for n in names if n != 'assets' and os.path.isdir(os.path.join(sites_dir, n))]
+
+
+class CheckContext:
+    """Shared, read-mostly state for one doctor run.
+
+    memo() lets checks share an expensive probe (e.g. `bench --site X
+    doctor` is needed by both the scheduler and accessibility checks):
+    whoever asks first runs it, concurrent callers wait for that result.
+    """
+
+    def __init__(self, bench_dir, sites):
+        self.bench_dir = bench_dir
+        self.sites = sites
+        try:
+            self.owner = pwd.getpwuid(os.stat(bench_dir).st_uid).pw_name
+        except (OSError, KeyError):
+            self.owner = None
+        self._memo = {}
+        self._lock = threading.Lock()
+        self._db = None
+        # Units still running; close() waits for the last one to leave
+        self._active = 0
+        self._closing = False
+
+    def db(self):
+        """MariaDB session shared by the quick checks of this run (the
+        integrity scan opens its own)"""
+        with self._lock:
+            if self._db is None:
+                self._db = probes.MariaDBSession()
+            return self._db
+
+    def http_pool(self, use_ssl=False):
+        """Keep-alive pool to the local nginx, shared by all site checks"""
+        return self.memo(('http_pool', use_ssl), lambda: probes.ConnectionPool('localhost', use_ssl))
+
+    @contextmanager
+    def in_use(self):
+        """Hold the shared connections open while a unit runs"""
+        with self._lock:
+            self._active += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active -= 1
+                last = self._closing and not self._active
+            if last:
+                self._release()
+
+    def close(self):
+        """Close the shared connections now, or once abandoned units finish"""
+        with self._lock:
+            self._closing = True
+            idle = not self._active
+        if idle:
+            self._release()
+
+    def _release(self):
+        if self._db:
+            self._db.close()
+        for use_ssl in (False, True):
+            entry = self._memo.get(('http_pool', use_ssl))
+            if entry and entry['value']:
+                entry['value'].close()
+
+    def memo(self, key, func):
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is None:
+                entry = self._memo[key] = {'done': threading.Event(), 'value': None}
+                owner = True
+            else:
+                owner = False
+        if owner:
+            try:
+                entry['value'] = func()
+            finally:
+                entry['done'].set()
+        else:
+            entry['done'].wait()
+        return entry['value']
+
+    def run(self, cmd, timeout=DEFAULT_TIMEOUT, sudo=False):
+        """Run a command, returning (exit_code, output); 127 when missing"""
+        if sudo and os.geteuid() != 0:
+            cmd = ['sudo', '-n'] + cmd
+        try:
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  text=True, timeout=timeout)
+        except FileNotFoundError:
+            return 127, ''
+        except subprocess.TimeoutExpired:
+            return 124, f'timed out after {timeout}s'
+        return proc.returncode, proc.stdout.strip()
+
+    def bench(self, args, timeout=60):
+        """Run a bench command as the bench owner, from the bench directory"""
+        script = f'cd "{self.bench_dir}" && bench {args}'
+        if self.owner and pwd.getpwuid(os.geteuid()).pw_name != self.owner:
+            return self.run(['sudo', '-n', '-u', self.owner, '-H', 'bash', '-lc', script], timeout)
+        return self.run(['bash', '-lc', script], timeout)
+
+    def site_config(self, site):
+        try:
+            with open(os.path.join(self.bench_dir, 'sites', site, 'site_config.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def db_name(self, site):
+        return self.site_config(site).get('db_name') or site.replace('.', '_').replace('-', '_')
+
+
+def service_active(ctx, *names):
+    procs = ctx.memo('processes', probes.processes)
+    return any(probes.service_running(name, procs) for name in names)
+
+
+def meminfo():
+    info = {}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                info[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return info
+
+
+def app_version(bench_dir, app):
+    try:
+        with open(os.path.join(bench_dir, 'apps', app, app, '__init__.py')) as f:
+            match = re.search(r'__version__\s*=\s*[\'"]([^\'"]+)', f.read())
+    except OSError:
+        return None
+    return match.group(1) if match else 'Unknown'
+
+
+def site_cert(ctx, site):
+    """Certificate path for a site; /etc/letsencrypt/live is root-only"""
+    def exists(path):
+        if os.path.exists(path):
+            return True
+        if os.geteuid() != 0 and path.startswith('/etc/letsencrypt/'):
+            return ctx.memo(('exists', path), lambda: ctx.run(['test', '-f', path], sudo=True)[0] == 0)
+        return False
+
+    for path in (f'/etc/letsencrypt/live/{site}/fullchain.pem',
+                 f'/etc/letsencrypt/live/{site}-0001/fullchain.pem',
+                 f'/etc/ssl/certs/{site}.crt'):
+        if exists(path):
+            return path
+    return None
+
+
+def nginx_site_conf(site):
+    for path in (f'/etc/nginx/conf.d/{site}.conf', f'/etc/nginx/sites-enabled/{site}'):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+#
+# ─── CHECKS ────────────────────────────────────────────────────────────────────
+#
+
+@check('packages', 'System Packages')
+def check_packages(ctx):
+    code, out = ctx.run(['dpkg-query', '-W', '-f=${Package} ${db:Status-Abbrev}\n'] + REQUIRED_PACKAGES)
+    if code == 127:
+        return result('skip', 'dpkg-query not available')
+    installed = {line.split()[0] for line in out.splitlines() if line.split()[1:2] == ['ii']}
+    missing = [p for p in REQUIRED_PACKAGES if p not in installed]
+    if missing:
+        return result('error', f'Missing packages: {" ".join(missing)}',
+                      'Install the missing packages',
+                      f'apt-get update -qq && apt-get install -y {" ".join(missing)}')
+    return result('ok', f'All {len(REQUIRED_PACKAGES)} required packages installed')
+
+
+@check('toolchain', 'wkhtmltopdf, Node.js & Yarn')
+def check_toolchain(ctx):
+    evidence = []
+    status = 'ok'
+    fix = None
+    for tool, args in (('wkhtmltopdf', ['--version']), ('node', ['--version']), ('yarn', ['--version'])):
+        if not shutil.which(tool):
+            evidence.append(f'{tool}: not found')
+            status = 'error'
+            continue
+        code, out = ctx.run([tool] + args)
+        evidence.append(f'{tool}: {out.splitlines()[0] if out else "installed"}')
+    if status != 'ok':
+        fix = 'Run doctor.sh (legacy mode) to install the missing tools'
+    return result(status, evidence, fix)
+
+
+@check('disk', 'Disk Space')
+def check_disk(ctx):
+    usage = shutil.disk_usage(ctx.bench_dir)
+    percent = usage.used * 100 // usage.total
+    evidence = f'Disk usage: {percent}% ({usage.free // 2**30} GB free)'
+    if percent > 90:
+        return result('critical', evidence, 'Clear bench caches and old logs',
+                      f'cd "{ctx.bench_dir}" && bench clear-cache; bench clear-website-cache; '
+                      f'find "{ctx.bench_dir}/logs" -name "*.log" -mtime +7 -delete')
+    if percent > 80:
+        return result('warn', evidence, 'Free up disk space soon')
+    return result('ok', evidence)
+
+
+@check('memory', 'Memory Usage')
+def check_memory(ctx):
+    info = meminfo()
+    total = info.get('MemTotal', 0)
+    if not total:
+        return result('skip', '/proc/meminfo not readable')
+    used = total - info.get('MemAvailable', info.get('MemFree', 0))
+    percent = used * 100 // total
+    evidence = f'Memory: {percent}% used ({used // 1024}MB/{total // 1024}MB)'
+    if percent > 90:
+        return result('error', evidence, 'Restart services to free memory', 'supervisorctl restart all')
+    if percent > 80:
+        return result('warn', evidence)
+    return result('ok', evidence)
+
+
+@check('mariadb', 'MariaDB/MySQL Status')
+def check_mariadb(ctx):
+    if not service_active(ctx, 'mariadb', 'mysql'):
+        return result('critical', 'MariaDB: NOT RUNNING', 'Start MariaDB',
+                      'systemctl start mariadb || systemctl start mysql')
+    evidence = ['MariaDB: Running']
+    try:
+        buffer_size = ctx.db().query('SELECT @@innodb_buffer_pool_size')[0][0]
+        databases = {row[0] for row in ctx.db().query('SHOW DATABASES')}
+    except (probes.MariaDBError, TimeoutError, OSError) as e:
+        evidence += ['Database connection requires password', str(e)]
+        return result('warn', evidence)
+    buffer_mb = int(buffer_size) // 2**20 if buffer_size.isdigit() else None
+    status = 'ok'
+    fix = None
+    command = None
+    if buffer_mb is not None:
+        facts = ctx.memo('host_facts', tuning.host_facts)
+        recommended = int(tuning.profile(facts)['mariadb']['innodb_buffer_pool_size'][:-1])
+        evidence.append(f'InnoDB buffer pool: {buffer_mb} MB (profile for this host: {recommended} MB)')
+        if buffer_mb < recommended // 2:
+            status = 'warn'
+            fix = 'Apply the host performance profile to MariaDB'
+            command = tuning_command('mariadb')
+    for site in ctx.sites:
+        db = ctx.db_name(site)
+        if db in databases:
+            evidence.append(f'{site}: database {db} exists')
+        else:
+            evidence.append(f'{site}: database {db} missing!')
+            status = 'error'
+    return result(status, evidence, fix, command)
+
+
+def tuning_command(*sections):
+    return f'{sys.executable} "{os.path.abspath(tuning.__file__)}" --apply ' + ' '.join(sections)
+
+
+@check('tuning', 'Performance Profile')
+def check_tuning(ctx):
+    facts = ctx.memo('host_facts', tuning.host_facts)
+    changes = tuning.plan(facts=facts)
+    evidence = [f'Host: {tuning.describe(facts)}']
+    if not changes:
+        return result('ok', evidence + ['MariaDB, Redis and kernel settings match the profile'])
+    for change in changes:
+        lines = change['diff'].splitlines()[2:]
+        differ = sum(1 for line in lines if line.startswith('+') and not line.startswith('+#'))
+        evidence.append(f"{change['path']}: " + ('missing' if change['old'] is None else f'{differ} setting(s) differ'))
+    return result('warn', evidence, 'Apply the host performance profile (python3 tuning.py shows the diff)',
+                  tuning_command(*sorted({c['section'] for c in changes})), {'changes': len(changes)})
+
+
+@check('redis', 'Redis Cache Server')
+def check_redis(ctx):
+    if not probes.redis_ping():
+        return result('critical', 'Redis: NOT RUNNING', 'Start Redis', 'systemctl start redis-server')
+    try:
+        used = probes.redis_info('memory').get('used_memory_human', '?')
+    except (OSError, probes.RedisError):
+        used = '?'
+    return result('ok', ['Redis: Running', f'Memory used: {used}'])
+
+
+@check('nginx', 'Nginx Web Server')
+def check_nginx(ctx):
+    if not service_active(ctx, 'nginx'):
+        return result('error', 'Nginx: NOT RUNNING', 'Start Nginx',
+                      f'nginx -t || (cd "{ctx.bench_dir}" && bench setup nginx --yes); systemctl start nginx')
+    evidence = ['Nginx: Running']
+    code, out = ctx.run(['nginx', '-t'], sudo=True)
+    if 'successful' not in out:
+        evidence += out.splitlines()[-3:]
+        return result('error', evidence, 'Regenerate the Nginx config',
+                      f'cd "{ctx.bench_dir}" && bench setup nginx --yes && nginx -t && systemctl reload nginx')
+    evidence.append('Nginx config: Valid')
+    missing = [s for s in ctx.sites if not nginx_site_conf(s)]
+    if missing:
+        evidence.append(f'Site Nginx config missing: {", ".join(missing)}')
+        return result('warn', evidence, 'Run: sudo bench setup nginx')
+    return result('ok', evidence)
+
+
+@check('supervisor', 'Supervisor Process Manager')
+def check_supervisor(ctx):
+    code, out = ctx.run(['supervisorctl', 'status'], sudo=True)
+    if code == 127 or not out or 'refused' in out or 'no such file' in out.lower():
+        return result('warn', 'Supervisor not configured or not running', 'supervisorctl reload')
+    lines = out.splitlines()
+    failed = [l for l in lines if re.search(r'STOPPED|FATAL|EXITED|BACKOFF', l)]
+    running = sum(1 for l in lines if 'RUNNING' in l)
+    evidence = [f'Running processes: {running}'] + [f'✗ {l}' for l in failed]
+    if failed:
+        procs = ' '.join(l.split()[0] for l in failed)
+        return result('error', evidence, 'Restart the failed processes', f'supervisorctl restart {procs}')
+    return result('ok', evidence)
+
+
+@check('sizing', 'Process Sizing')
+def check_sizing(ctx):
+    facts = ctx.memo('host_facts', tuning.host_facts)
+    recommended, found, diff = sizing.plan_changes(ctx.bench_dir, facts)
+    if found is None:
+        return result('skip', 'No supervisor config (bench setup production not run)')
+    web = (found['gunicorn_workers'] or 0) * found['gunicorn_threads']
+    jobs = sum(found['rq_workers'].values())
+    evidence = [f"Current: gunicorn {found['gunicorn_workers']} workers x {found['gunicorn_threads']} threads,"
+                f" {jobs} RQ workers ({', '.join(f'{q} {n}' for q, n in sorted(found['rq_workers'].items()))})"]
+    plan = sizing.summary(recommended)
+    evidence += [f'Recommended {line}' for line in plan[:2]] + plan[2:]
+    off = [name for name, have, want in (('web', web, recommended['web_concurrency']),
+                                          ('jobs', jobs, recommended['job_concurrency']))
+           if have < want / 2 or have > want * 2]
+    resize = bool(diff and off)
+    fixes = []
+    if recommended['overcommit_mb']:
+        fixes.append('This host has too little RAM for the minimum bench processes')
+    if resize:
+        fixes.append('Worker counts do not fit this host - resize them')
+    if not fixes:
+        return result('ok', evidence)
+    command = (f'{sys.executable} "{os.path.abspath(sizing.__file__)}" --bench "{ctx.bench_dir}" --apply'
+               if resize else None)
+    return result('warn', evidence, '; '.join(fixes), command,
+                  {'web_concurrency': web, 'job_concurrency': jobs})
+
+
+@check('ports', 'Network Ports & Conflicts')
+def check_ports(ctx):
+    listeners = {port: entries[0]['process'] for port, entries in probes.listeners().items()}
+
+    expected = [(80, 'HTTP', 'nginx'), (443, 'HTTPS', 'nginx'),
+                (3306, 'MariaDB', 'mariadbd|mysqld'), (6379, 'Redis', 'redis'),
+                (8000, 'Frappe Dev', ''), (9000, 'Socketio', '')]
+    evidence = []
+    status = 'ok'
+    for port, service, owner in expected:
+        proc = listeners.get(port)
+        if proc is None:
+            evidence.append(f'Port {port} ({service}): Not listening')
+            status = 'warn' if status == 'ok' else status
+        elif owner and not re.search(owner, proc, re.I):
+            evidence.append(f'Port {port} CONFLICT: Used by {proc} (expected {owner})')
+            status = 'error'
+        else:
+            evidence.append(f'Port {port} ({service}): Open by {proc}')
+
+    leftovers = [p for p in BENCH_REDIS_PORTS if p in listeners]
+    fix = command = None
+    if leftovers:
+        evidence.append(f'Leftover bench Redis on ports: {", ".join(map(str, leftovers))}')
+        status = 'error'
+        fix = 'Kill leftover "bench start" processes'
+        command = 'pkill -f "bench start"; pkill -f honcho; ' + '; '.join(
+            f'fuser -k {p}/tcp' for p in leftovers)
+    if service_active(ctx, 'apache2'):
+        evidence.append('Apache2 is running and may conflict with Nginx')
+        status = 'warn' if status == 'ok' else status
+        fix = fix or 'sudo systemctl stop apache2 && sudo systemctl disable apache2'
+    return result(status, evidence, fix, command)
+
+
+@check('bench_config', 'Bench Configuration')
+def check_bench_config(ctx):
+    evidence = []
+    status = 'ok'
+    command = None
+    if os.path.isfile(os.path.join(ctx.bench_dir, 'common_site_config.json')):
+        evidence.append('common_site_config.json exists')
+    else:
+        evidence.append('common_site_config.json missing!')
+        status = 'critical'
+    if not os.path.isfile(os.path.join(ctx.bench_dir, 'Procfile')):
+        evidence.append('Procfile missing')
+        status = 'warn' if status == 'ok' else status
+        command = f'cd "{ctx.bench_dir}" && bench setup procfile'
+    for app in ('frappe', 'erpnext'):
+        version = app_version(ctx.bench_dir, app)
+        if version:
+            evidence.append(f'{app} version: {version}')
+        elif app == 'frappe':
+            evidence.append('Frappe app missing!')
+            status = 'critical'
+        else:
+            evidence.append('ERPNext app not installed')
+    return result(status, evidence, 'Regenerate with bench setup procfile' if command else None, command)
+
+
+@check('apps', 'Missing Apps Detection', per_site=True)
+def check_apps(ctx, site):
+    try:
+        with open(os.path.join(ctx.bench_dir, 'sites', site, 'apps.txt')) as f:
+            apps = [a.strip() for a in f if a.strip()]
+    except OSError:
+        return result('skip', 'apps.txt missing')
+    missing = [a for a in apps if not os.path.isdir(os.path.join(ctx.bench_dir, 'apps', a))]
+    if missing:
+        return result('error', [f"App '{a}' is listed but missing from apps/" for a in missing],
+                      f'Remove from site: bench --site {site} --force remove-from-installed-apps <app>')
+    return result('ok', f'All {len(apps)} apps in apps.txt exist')
+
+
+@check('permissions', 'File Permissions')
+def check_permissions(ctx):
+    bench_uid = os.stat(ctx.bench_dir).st_uid
+    wrong = []
+    for site in ctx.sites:
+        path = os.path.join(ctx.bench_dir, 'sites', site)
+        if os.stat(path).st_uid != bench_uid:
+            wrong.append(path)
+    if wrong:
+        return result('error', [f'Not owned by {ctx.owner}: {p}' for p in wrong],
+                      'Give the bench owner its files back',
+                      '; '.join(f'chown -R {ctx.owner}:{ctx.owner} "{p}"' for p in wrong))
+    return result('ok', f'Bench and site directories owned by {ctx.owner}')
+
+
+@check('python_env', 'Python Environment')
+def check_python_env(ctx):
+    env = os.path.join(ctx.bench_dir, 'env')
+    if not os.path.isdir(env):
+        return result('critical', 'Virtual environment missing!', 'Run: bench setup env')
+    dists = {os.path.basename(p).split('-')[0].lower().replace('_', '-')
+             for p in glob.glob(os.path.join(env, 'lib', 'python*', 'site-packages', '*.dist-info'))}
+    missing = [p for p in ('frappe-bench', 'redis', 'pymysql') if p not in dists]
+    if missing:
+        return result('warn', f'Missing in env: {", ".join(missing)}', 'Install into the bench env',
+                      f'"{env}/bin/pip" install {" ".join(missing)}')
+    return result('ok', 'Virtual environment exists with frappe-bench, redis, pymysql')
+
+
+@check('node_env', 'Node.js Environment')
+def check_node_env(ctx):
+    evidence = []
+    status = 'ok'
+    code, out = ctx.run(['node', '--version'])
+    if code == 0:
+        evidence.append(f'Node.js: {out}')
+    else:
+        evidence.append('Node.js not found!')
+        status = 'critical'
+    if os.path.isdir(os.path.join(ctx.bench_dir, 'apps', 'frappe', 'node_modules')):
+        evidence.append('Node modules installed')
+        return result(status, evidence)
+    evidence.append('Node modules missing')
+    return result('warn' if status == 'ok' else status, evidence, 'Install frappe node modules',
+                  f'cd "{ctx.bench_dir}/apps/frappe" && yarn install')
+
+
+@check('error_logs', 'Error Log Analysis', timeout=120)
+def check_error_logs(ctx):
+    summary = log_analyzer.analyze(ctx.bench_dir)
+    evidence = [f"{summary['error_lines']} error lines in {summary['lines']} new log lines"
+                f" ({summary['bytes'] // 1024} KB read in {summary['duration']}s)"]
+    fixes = []
+    commands = []
+    for rule_id, total in sorted(summary['window'].items(), key=lambda item: -item[1]):
+        _, title, _, fix, command = log_analyzer.RULE_INFO[rule_id]
+        new = summary['new'].get(rule_id, 0)
+        evidence.append(f'{title}: {new} new, {total} in last {log_analyzer.ROLLING_DAYS} days')
+        if new and fix and fix not in fixes:
+            fixes.append(fix)
+        if new and command and command not in commands:
+            commands.append(command)
+    if not summary['new']:
+        if summary['error_lines']:
+            return result('warn', evidence + summary['samples'], f'Review {ctx.bench_dir}/logs')
+        return result('ok', evidence)
+    status = 'critical' if 'disk' in summary['new'] else 'error'
+    return result(status, evidence + summary['samples'], '; '.join(fixes) or None,
+                  '; '.join(commands) or None)
+
+
+@check('scheduler', 'Scheduler Status', timeout=90, per_site=True)
+def check_scheduler(ctx, site):
+    code, out = ctx.memo(('doctor', site), lambda: ctx.bench(f'--site {site} doctor'))
+    line = next((l for l in out.splitlines() if 'scheduler' in l.lower()), 'Unknown')
+    if re.search(r'enabled|active', line, re.I) and not re.search(r'disabled|inactive', line, re.I):
+        return result('ok', line.strip())
+    return result('warn', line.strip(), 'Enable the scheduler',
+                  f'cd "{ctx.bench_dir}" && sudo -u {ctx.owner} bench --site {site} scheduler enable && '
+                  f'sudo -u {ctx.owner} bench --site {site} scheduler resume')
+
+
+@check('ssl', 'SSL Certificate', per_site=True)
+def check_ssl(ctx, site):
+    cert = site_cert(ctx, site)
+    if not cert:
+        return result('warn', 'No SSL certificate found', f'sudo bench setup lets-encrypt {site}')
+    code, out = ctx.run(['openssl', 'x509', '-enddate', '-noout', '-in', cert], sudo=True)
+    if code != 0 or '=' not in out:
+        return result('warn', [cert, 'Cannot read expiry date'])
+    expiry = ssl.cert_time_to_seconds(out.split('=', 1)[1].strip())
+    days = int((expiry - time.time()) // 86400)
+    evidence = [cert]
+    conf = nginx_site_conf(site)
+    if conf:
+        with open(conf, errors='replace') as f:
+            evidence.append('Nginx SSL configured' if 'ssl_certificate' in f.read()
+                            else 'Nginx SSL not configured')
+    if days < 0:
+        return result('error', evidence + [f'EXPIRED {-days} days ago!'], 'Force a renewal',
+                      f'certbot renew --cert-name {site} --force-renewal')
+    if days < 30:
+        return result('warn', evidence + [f'Expires in {days} days'], 'Renew the certificate',
+                      f'certbot renew --cert-name {site}')
+    if days < 60:
+        return result('warn', evidence + [f'Valid for {days} days (renewal soon)'])
+    return result('ok', evidence + [f'Valid for {days} days'])
+
+
+@check('http', 'Site Accessibility', timeout=90, per_site=True)
+def check_http(ctx, site):
+    metrics = {'http': probes.probe_site(ctx.http_pool(), site)}
+    if site_cert(ctx, site):
+        metrics['https'] = probes.probe_site(ctx.http_pool(use_ssl=True), site)
+    evidence = []
+    status = 'ok'
+    for scheme, probe in metrics.items():
+        line = f"{scheme.upper()}: {probe['status'] or 'no response'} ({probe['ok']}/{probe['samples']} ok"
+        if probe['p50'] is not None:
+            line += f", p50 {probe['p50']}ms p95 {probe['p95']}ms p99 {probe['p99']}ms"
+        evidence.append(line + ')')
+        if probe['status'] not in probes.HEALTHY_STATUS:
+            status = 'error' if scheme == 'http' else ('warn' if status == 'ok' else status)
+    _, out = ctx.memo(('doctor', site), lambda: ctx.bench(f'--site {site} doctor'))
+    if not re.search(r'active|running', out, re.I):
+        evidence.append('Site may not be properly configured in bench')
+        status = 'warn' if status == 'ok' else status
+    if status == 'error':
+        return result(status, evidence, 'Restart web services',
+                      'systemctl restart nginx; supervisorctl restart all', metrics)
+    return result(status, evidence, metrics=metrics)
+
+
+@check('database', 'Database Health', timeout=300, per_site=True)
+def check_database(ctx, site):
+    db = ctx.db_name(site)
+    try:
+        tables = ctx.db().query(
+            'SELECT table_name, ROUND((data_length + index_length) / 1024 / 1024, 2) '
+            f"FROM information_schema.tables WHERE table_schema='{db}' AND table_type='BASE TABLE'")
+    except (probes.MariaDBError, TimeoutError, OSError):
+        return result('skip', 'Cannot connect to MariaDB as root')
+    size = sum(float(mb) for _, mb in tables if mb != 'NULL')
+    evidence = [f'Database size: {size:.2f} MB ({len(tables)} tables)']
+    status = 'ok'
+    fix = None
+    if size > 5000:
+        status = 'warn'
+        fix = 'Large database - consider archiving old data'
+    return result(status, evidence, fix)
+
+
+@check('db_integrity', 'Database Integrity', timeout=DB_SCAN_SECONDS + 60)
+def check_db_integrity(ctx):
+    databases = [ctx.db_name(site) for site in ctx.sites]
+    # Its own session: long CHECK TABLE runs must not queue the quick
+    # MariaDB checks behind them on the shared one
+    session = probes.MariaDBSession()
+    try:
+        summary = db_scanner.scan(session, databases, max_seconds=DB_SCAN_SECONDS)
+    except (probes.MariaDBError, TimeoutError, OSError) as e:
+        return result('skip', f'Cannot scan databases: {e}')
+    finally:
+        session.close()
+    evidence = [f"Checked {summary['checked']} of {summary['due']} changed tables"
+                f" ({summary['bytes'] // 2**20} MB in {summary['duration']}s),"
+                f" {summary['tables'] - summary['due']} unchanged since their last check"]
+    if summary['paused']:
+        evidence.append(f"Paused {summary['paused']}s for high load")
+    if summary['remaining']:
+        evidence.append(f"{summary['remaining']} tables left for the next run")
+    if summary['unfinished']:
+        evidence.append(f"Check did not finish for {', '.join(summary['unfinished'])} (will be retried after the other due tables next run)")
+    if summary['too_big']:
+        evidence.append(f"{len(summary['too_big'])} tables too large for this run's time budget"
+                        " - run: sudo python3 db_scanner.py --max-seconds 3600")
+    if not summary['failed']:
+        return result('ok', evidence + ['Database integrity OK'], metrics=summary)
+    catalog = db_scanner.load_catalog(log_analyzer.state_file(db_scanner.CATALOG_FILE))
+    statements = []
+    for key in summary['failed']:
+        entry = catalog.get(key, {})
+        evidence.append(f"{key}: {'; '.join(entry.get('messages') or ['corrupt'])}")
+        if entry:
+            statements.append(db_scanner.repair_sql(entry))
+    return result('error', evidence, 'Repair only the failing tables',
+                  "mysql -u root -e '" + '; '.join(statements) + "'" if statements else None, summary)
+
+
+@check('backups', 'Backup Status', per_site=True)
+def check_backups(ctx, site):
+    if not os.path.isdir(backup_engine.backup_dir(ctx.bench_dir, site)):
+        return result('error', 'Backup directory not found')
+    command = (f'sudo -u {ctx.owner} {sys.executable} "{os.path.abspath(backup_engine.__file__)}"'
+               f' --bench "{ctx.bench_dir}" --site {site}')
+    latest, count = backup_engine.latest_backup(ctx.bench_dir, site)
+    if not latest:
+        return result('error', 'No database backup found!', 'Create a backup', command)
+    age = int((time.time() - latest['created']) // 86400)
+    evidence = [f"Latest: {latest['id']} ({', '.join(f['kind'] for f in latest['files'])})",
+                f"Age: {age} days | Size: {latest['size'] // 2**20} MB"
+                + (f" | Took {latest['duration']}s" if latest['duration'] else ''),
+                f'Total backups: {count}',
+                f"Restore with: {backup_engine.restore_command(ctx.bench_dir, site, latest)}"]
+    if age > 7:
+        return result('error', evidence, 'Backup is older than 7 days - create a fresh one', command)
+    if age > 3:
+        return result('warn', evidence, 'Consider creating a fresh backup')
+    return result('ok', evidence)
+
+
+@check('resources', 'System Resources & Limits')
+def check_resources(ctx):
+    evidence = []
+    status = 'ok'
+    fix = None
+    files = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    evidence.append(f'Open files limit: {files}')
+    if 0 <= files < 10000:
+        status = 'warn'
+        fix = 'Increase with: ulimit -n 65535'
+    load = os.getloadavg()[0]
+    cpus = os.cpu_count() or 1
+    evidence.append(f'Load average: {load:.2f} (CPUs: {cpus})')
+    if load > cpus:
+        evidence.append('High system load detected')
+        status = 'warn'
+    info = meminfo()
+    swap_total = info.get('SwapTotal', 0)
+    if swap_total:
+        swap_percent = (swap_total - info.get('SwapFree', 0)) * 100 // swap_total
+        evidence.append(f'Swap usage: {swap_percent}%')
+        if swap_percent > 50:
+            evidence.append('High swap usage - system may be low on RAM')
+            status = 'warn'
+    else:
+        evidence.append('No swap space configured')
+    return result(status, evidence, fix)
+
+
+#
+# ─── ENGINE ────────────────────────────────────────────────────────────────────
+#
+
+def check_units(ctx, only=None):
+    """Expand the registry into runnable units (one per site for per-site checks)"""
+    units = []
+    for spec in CHECKS:
+        if only and spec['id'] not in only:
+            continue
+        if spec['per_site']:
+            for site in ctx.sites:
+                units.append(dict(spec, key=f"{spec['id']}:{site}", site=site))
+        else:
+            units.append(dict(spec, key=spec['id'], site=None))
+    return units
+
+
+def run_unit(ctx, unit, began=None):
+    """Run one unit; its start time goes into began[key] (deadlines count from it)"""
+    started = time.time()
+    if began is not None:
+        began[unit['key']] = started
+    try:
+        with ctx.in_use():
+            if unit['site']:
+                outcome = unit['func'](ctx, unit['site'])
+            else:
+                outcome = unit['func'](ctx)
+    except Exception as e:
+        outcome = result('error', f'Check crashed: {e}')
+    outcome['duration'] = round(time.time() - started, 2)
+    return outcome
+
+
+def run_checks(ctx, emit, only=None, max_workers=MAX_WORKERS, should_stop=None):
+    """Run all check units concurrently and emit() each result as it lands.
+
+    Every unit has its own deadline, counted from when a worker picks it
+    up (units queued behind MAX_WORKERS others are not timed yet); a unit
+    still running past it is reported as 'timeout' and abandoned (its
+    subprocesses carry their own timeouts, so the worker thread ends on
+    its own, and ctx.close() leaves the shared connections open until
+    it does). Returns the results in registry order.
+    """
+    units = check_units(ctx, only)
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='doctor')
+    began = {}
+    pending = {executor.submit(run_unit, ctx, unit, began): unit for unit in units}
+
+    def deadline(future):
+        started = began.get(pending[future]['key'])
+        return started + pending[future]['timeout'] if started is not None else float('inf')
+
+    def record(unit, outcome):
+        outcome.update({'id': unit['key'], 'check': unit['id'], 'title': unit['title'], 'site': unit['site']})
+        results[unit['key']] = outcome
+        emit(outcome)
+
+    try:
+        while pending:
+            if should_stop and should_stop():
+                break
+            next_deadline = min(deadline(f) for f in pending)
+            done, _ = wait(pending, timeout=max(0.05, min(1.0, next_deadline - time.time())),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                record(pending.pop(future), future.result())
+            now = time.time()
+            for future in [f for f in pending if deadline(f) <= now]:
+                unit = pending.pop(future)
+                outcome = result('timeout', f"No result after {unit['timeout']}s",
+                                 'Run doctor.sh for the full interactive check')
+                outcome['duration'] = unit['timeout']
+                record(unit, outcome)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [results[u['key']] for u in units if u['key'] in results]
+
+
+def summarize(results):
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    return counts
+
+
+def format_result(r):
+    """One console line per result, plus indented evidence"""
+    name = f"{r['title']} ({r['site']})" if r['site'] else r['title']
+    lines = [f"{STATUS_ICONS.get(r['status'], '•')} {name} [{r['duration']}s]"]
+    lines += [f'   {e}' for e in r['evidence']]
+    if r['fix'] and r['status'] != 'ok':
+        lines.append(f"   💡 {r['fix']}")
+    return lines
+
+
+if __name__ == '__main__':
+    bench_dir = find_bench()
+    if not bench_dir:
+        raise SystemExit('ERPNext installation not found')
+    context = CheckContext(bench_dir, list_sites(bench_dir))
+
+    def show(r):
+        print('\n'.join(format_result(r)), flush=True)
+
+    began = time.time()
+    try:
+        summary = summarize(run_checks(context, show))
+    finally:
+        context.close()
+    print(f'\n{summary} in {time.time() - began:.1f}s')
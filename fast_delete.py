@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+ERPNext uninstall - fast tree deletion
+Moves a directory out of the way with one rename, so its old path is
+free again at once, then deletes the renamed tree with a parallel
+directory walker that reports files and bytes freed as it goes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import sys
+import threading
+import time
+
+# Directories scanned/emptied at the same time (unlink is I/O bound)
+DELETE_WORKERS = 16
+PROGRESS_SECONDS = 1.0
+TRASH_PREFIX = '.erpnext-trash-'
+
+
+def move_aside(path):
+    """Rename path to a hidden sibling (same filesystem, so atomic); returns the new path"""
+    path = os.path.abspath(path.rstrip('/'))
+    trash = os.path.join(os.path.dirname(path), f'{TRASH_PREFIX}{os.path.basename(path)}-{os.getpid()}')
+    os.rename(path, trash)
+    return trash
+
+
+def delete_tree(path, workers=DELETE_WORKERS, progress=None):
+    """Delete a directory tree, one directory level at a time in parallel.
+
+    Files of every directory on a level are unlinked concurrently; the
+    emptied directories are removed deepest level first. progress(stats)
+    is called at most every PROGRESS_SECONDS. Returns
+    {files, dirs, bytes, errors, duration}.
+    """
+    started = time.time()
+    stats = {'files': 0, 'dirs': 0, 'bytes': 0, 'errors': 0}
+    lock = threading.Lock()
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            size = os.lstat(path).st_blocks * 512
+            os.unlink(path)
+            stats.update(files=1, bytes=size)
+        except OSError:
+            stats['errors'] = 1
+        return dict(stats, duration=round(time.time() - started, 2))
+
+    def clear(directory):
+        """Unlink the files of one directory; returns its subdirectories"""
+        subdirs = []
+        files = freed = errors = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        size = entry.stat(follow_symlinks=False).st_blocks * 512
+                        os.unlink(entry.path)
+                        files += 1
+                        freed += size
+                    except OSError:
+                        errors += 1
+        except OSError:
+            errors += 1
+        with lock:
+            stats['files'] += files
+            stats['bytes'] += freed
+            stats['errors'] += errors
+        return subdirs
+
+    def remove_dir(directory):
+        try:
+            os.rmdir(directory)
+            return 1, 0
+        except OSError:
+            return 0, 1
+
+    last_report = time.time()
+    levels = []
+    level = [path]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while level:
+            levels.append(level)
+            next_level = []
+            for future in as_completed([executor.submit(clear, d) for d in level]):
+                next_level += future.result()
+                if progress and time.time() - last_report >= PROGRESS_SECONDS:
+                    last_report = time.time()
+                    with lock:
+                        progress(dict(stats))
+            level = next_level
+        for level in reversed(levels):
+            for removed, failed in executor.map(remove_dir, level):
+                stats['dirs'] += removed
+                stats['errors'] += failed
+    return dict(stats, duration=round(time.time() - started, 2))
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} TB'
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rename directories aside, then delete them in parallel')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--in-place', action='store_true', help='paths are already moved aside')
+    parser.add_argument('--json', action='store_true', help='progress as JSON lines (for the web installer)')
+    parser.add_argument('--workers', type=int, default=DELETE_WORKERS)
+    args = parser.parse_args()
+
+    failed = False
+    for target in args.paths:
+        if not os.path.lexists(target):
+            continue
+        name = target
+        try:
+            if not args.in_place:
+                target = move_aside(target)
+            elif not os.path.basename(target.rstrip('/')).startswith(TRASH_PREFIX):
+                raise OSError('not a moved-aside path, refusing to delete in place')
+        except OSError as e:
+            print(json.dumps({'path': name, 'error': str(e)}) if args.json else f'❌ {name}: {e}', flush=True)
+            failed = True
+            continue
+
+        def show(stats, name=name, done=False):
+            if args.json:
+                print(json.dumps(dict(stats, path=name, done=done)), flush=True)
+            else:
+                print(f"{'✅' if done else '🧹'} {name}: {stats['files']} files, {format_bytes(stats['bytes'])} freed"
+                      + (f" in {stats['duration']}s" if done else ''), flush=True)
+
+        result = delete_tree(target, args.workers, show)
+        show(result, done=True)
+        failed = failed or bool(result['errors'])
+    sys.exit(1 if failed else 0)
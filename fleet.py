@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+ERPNext fleet installer
+Pushes the generated install script to many hosts over SSH and runs it
+on several of them at once, streaming every output line back tagged
+with its host.
+
+The host "local" (or "local:<name>") is a dry-run stand-in for an SSH
+target, for trying the fleet view without servers: it never runs the
+real install script (several copies on one machine would fight over the
+dpkg lock, the bench directory and MariaDB). It runs a harmless rehearsal
+instead that walks the script's ##STEP markers, as the current user.
+
+Unknown host keys are trusted on first use and their fingerprints logged
+per host; strict_host_keys rejects them instead.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import getpass
+import hashlib
+import os
+import re
+import signal
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+
+try:
+    import paramiko
+except ImportError:  # only needed for real SSH hosts
+    paramiko = None
+
+from log_analyzer import state_file
+
+# Hosts installing at the same time; the rest wait for a free slot
+MAX_FLEET_WORKERS = 10
+SSH_TIMEOUT = 20
+# Host keys are trusted on first use and checked on every later run
+KNOWN_HOSTS_FILE = 'fleet_known_hosts'
+# Hosts connecting in parallel each add their new key to the same file
+known_hosts_lock = threading.Lock()
+REMOTE_SCRIPT = '/tmp/erpnext_fleet_install_{}.sh'
+STOP_POLL_SECONDS = 1
+# Per step of the local rehearsal: output lines and seconds between them
+REHEARSAL_LINES = 3
+REHEARSAL_DELAY = 0.2
+STEP_START = re.compile(r'^echo "##STEP (\d+) start"$', re.M)
+
+
+class FleetError(Exception):
+    pass
+
+
+def parse_hosts(text, default_user='root', default_port=22):
+    """One ``[user@]host[:port]`` per line or comma; # starts a comment"""
+    hosts = []
+    seen = set()
+    for line in text.splitlines():
+        for item in line.split('#', 1)[0].split(','):
+            item = item.strip()
+            if not item or item in seen:
+                continue
+            seen.add(item)
+            if item == 'local' or item.startswith('local:'):
+                hosts.append({'name': item, 'host': 'local', 'port': None, 'user': getpass.getuser()})
+                continue
+            user, _, address = item.rpartition('@')
+            port = default_port
+            if address.startswith('['):  # [ipv6]:port
+                address, _, rest = address[1:].partition(']')
+                if rest.startswith(':'):
+                    port = rest[1:]
+            elif address.count(':') == 1:
+                address, port = address.split(':')
+            try:
+                port = int(port)
+            except ValueError:
+                raise FleetError(f'Bad port in {item!r}')
+            hosts.append({'name': item, 'host': address, 'port': port, 'user': user or default_user})
+    return hosts
+
+
+def rehearsal_script(script):
+    """Stand-in for the install script: the same ##STEP markers, no changes"""
+    lines = ['set -e']
+    for num in dict.fromkeys(STEP_START.findall(script)):
+        lines.append(f'echo "##STEP {num} start"')
+        for i in range(1, REHEARSAL_LINES + 1):
+            lines.append(f'echo "dry run: step {num} line {i}"; sleep {REHEARSAL_DELAY}')
+        lines.append(f'echo "##STEP {num} end"')
+    lines.append('echo "dry run finished; nothing was installed"')
+    return '\n'.join(lines) + '\n'
+
+
+def fingerprint(key):
+    """OpenSSH-style SHA256 fingerprint"""
+    digest = base64.b64encode(hashlib.sha256(key.asbytes()).digest()).decode().rstrip('=')
+    return f'{key.get_name()} SHA256:{digest}'
+
+
+def as_root(command, user, password):
+    if user == 'root':
+        return command
+    if password:
+        return f"sudo -S -p '' {command}"  # password arrives on stdin
+    return f'sudo -n {command}'
+
+
+def remote_command(path, user, password):
+    """Run the script as root in its own process group, then delete it
+    (it contains passwords)"""
+    return f"{as_root('setsid -w bash ' + path, user, password)}; rc=$?; rm -f {path}; exit $rc"
+
+
+def kill_command(path, user, password):
+    """Kill the script's process group: apt/bench children die with it"""
+    find = (f"pgid=$(ps -eo pgid=,args= | awk -v p={path} '$2 == \"bash\" && $3 == p {{print $1; exit}}'); "
+            '[ -n "$pgid" ] && kill -KILL -- -$pgid')
+    return as_root('bash -c ' + shlex.quote(find), user, password)
+
+
+class SSHTransport:
+    """One SSH connection to a fleet host"""
+
+    def __init__(self, spec, password=None, key_filename=None, timeout=SSH_TIMEOUT,
+                 strict_host_keys=False, log=None):
+        if paramiko is None:
+            raise FleetError('paramiko is not installed (pip install -r requirements.txt)')
+        self.spec = spec
+        self.password = password
+        self.key_filename = key_filename
+        self.timeout = timeout
+        self.strict_host_keys = strict_host_keys
+        self.log = log or (lambda line: None)
+        self.client = None
+        self.channel = None
+
+    def host_key_policy(self, known_hosts):
+        if self.strict_host_keys:
+            return paramiko.RejectPolicy()
+        log = self.log
+
+        class TrustOnFirstUse(paramiko.MissingHostKeyPolicy):
+            def missing_host_key(self, client, hostname, key):
+                client.get_host_keys().add(hostname, key.get_name(), key)
+                if known_hosts:
+                    # Merge into the file as it is now: other workers may
+                    # have added their hosts since this client loaded it
+                    with known_hosts_lock:
+                        keys = paramiko.HostKeys(known_hosts)
+                        keys.add(hostname, key.get_name(), key)
+                        keys.save(known_hosts)
+                log(f'🔑 Trusting new host key {fingerprint(key)}')
+
+        return TrustOnFirstUse()
+
+    def connect(self):
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()
+        known_hosts = state_file(KNOWN_HOSTS_FILE)
+        if known_hosts:
+            with known_hosts_lock:
+                open(known_hosts, 'a').close()
+                # Not load_host_keys(): paramiko would rewrite the whole file
+                # from this client's copy whenever it saves
+                client.get_host_keys().load(known_hosts)
+        client.set_missing_host_key_policy(self.host_key_policy(known_hosts))
+        try:
+            client.connect(self.spec['host'], port=self.spec['port'], username=self.spec['user'],
+                           password=self.password, key_filename=self.key_filename or None,
+                           timeout=self.timeout, banner_timeout=self.timeout, auth_timeout=self.timeout)
+        except paramiko.BadHostKeyException:
+            raise FleetError(f'Host key changed; if the server was rebuilt, remove its line from {known_hosts}')
+        except paramiko.SSHException as e:
+            if self.strict_host_keys and 'known_hosts' in str(e):
+                raise FleetError(f'Unknown host key; add it to {known_hosts} or ~/.ssh/known_hosts first')
+            raise
+        client.get_transport().set_keepalive(30)
+        self.client = client
+
+    def put(self, content, path):
+        sftp = self.client.open_sftp()
+        try:
+            with sftp.open(path, 'w') as f:
+                f.chmod(0o700)  # before anything secret is written
+                f.write(content)
+        finally:
+            sftp.close()
+
+    def run(self, command, stdin_data=None):
+        """Yield output lines (stdout and stderr merged); exit_code is set at the end"""
+        self.channel = self.client.get_transport().open_session()
+        self.channel.set_combine_stderr(True)
+        self.channel.exec_command(command)
+        if stdin_data:
+            self.channel.sendall(stdin_data.encode())
+        self.channel.shutdown_write()
+        for raw in self.channel.makefile('rb'):
+            yield raw.decode('utf-8', 'replace').rstrip('\r\n')
+        self.exit_code = self.channel.recv_exit_status()
+
+    def stop(self, path):
+        """Kill the remote script; closing the channel alone leaves it running"""
+        try:
+            channel = self.client.get_transport().open_session()
+            channel.exec_command(kill_command(path, self.spec['user'], self.password))
+            if self.password and self.spec['user'] != 'root':
+                channel.sendall((self.password + '\n').encode())
+            channel.shutdown_write()
+            channel.recv_exit_status()
+            self.channel.close()
+        except Exception:
+            pass  # the connection is going away anyway
+
+    def close(self):
+        if self.client:
+            self.client.close()
+
+
+class LocalTransport:
+    """Dry-run stand-in: same protocol as SSHTransport, but uploads a
+    rehearsal of the script and runs it as the current user, unprivileged"""
+
+    def __init__(self, spec, password=None, key_filename=None, timeout=SSH_TIMEOUT,
+                 strict_host_keys=False, log=None):
+        self.spec = spec
+        self.process = None
+        self.path = None
+
+    def connect(self):
+        pass
+
+    def put(self, content, path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o700)
+        with os.fdopen(fd, 'w') as f:
+            f.write(rehearsal_script(content))
+        self.path = path
+
+    def run(self, command, stdin_data=None):
+        """Ignores the root command built for SSH hosts: no sudo needed"""
+        self.process = subprocess.Popen(['bash', self.path], stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        start_new_session=True)
+        try:
+            for raw in self.process.stdout:
+                yield raw.decode('utf-8', 'replace').rstrip('\r\n')
+            self.exit_code = self.process.wait()
+        finally:
+            os.unlink(self.path)
+
+    def stop(self, path):
+        if self.process and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def close(self):
+        pass
+
+
+def transport_for(spec, password=None, key_filename=None, strict_host_keys=False, log=None):
+    cls = LocalTransport if spec['host'] == 'local' else SSHTransport
+    return cls(spec, password, key_filename, strict_host_keys=strict_host_keys, log=log)
+
+
+def install_host(spec, script, on_line, on_status, should_stop, password=None, key_filename=None,
+                 strict_host_keys=False):
+    """Upload and run the script on one host; returns its result dict"""
+    name = spec['name']
+    path = REMOTE_SCRIPT.format(uuid.uuid4().hex[:12])
+    result = {'status': 'failed', 'exit_code': None, 'error': None, 'started': time.time()}
+    transport = None
+    done = threading.Event()
+    try:
+        transport = transport_for(spec, password, key_filename, strict_host_keys,
+                                  log=lambda line: on_line(name, line))
+        on_status(name, 'connecting', {})
+        transport.connect()
+        on_status(name, 'uploading', {})
+        transport.put(script, path)
+        on_status(name, 'running', {})
+        stdin_data = password + '\n' if password and spec['user'] != 'root' else None
+
+        def watch():
+            # Quiet steps print nothing for minutes: poll for Stop separately
+            while not done.wait(STOP_POLL_SECONDS):
+                if should_stop():
+                    transport.stop(path)
+                    return
+        threading.Thread(target=watch, daemon=True).start()
+
+        for line in transport.run(remote_command(path, spec['user'], password), stdin_data):
+            on_line(name, line)
+        result['exit_code'] = transport.exit_code
+        if should_stop():
+            result['status'] = 'stopped'
+        else:
+            result['status'] = 'success' if transport.exit_code == 0 else 'failed'
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        done.set()
+        if transport:
+            transport.close()
+    result['finished'] = time.time()
+    result['duration'] = round(result['finished'] - result['started'], 2)
+    on_status(name, result['status'], result)
+    return result
+
+
+def run_fleet(hosts, script, on_line, on_status, max_workers=MAX_FLEET_WORKERS, should_stop=None,
+              password=None, key_filename=None, strict_host_keys=False):
+    """Install on every host, at most max_workers at a time.
+
+    on_line(host, line) receives output and on_status(host, state, info)
+    each transition (queued, connecting, uploading, running, success,
+    failed, stopped); both are called from worker threads. Returns
+    {host: result}.
+    """
+    should_stop = should_stop or (lambda: False)
+    lock = threading.Lock()
+
+    def locked_status(name, state, info):
+        with lock:
+            on_status(name, state, info)
+
+    for spec in hosts:
+        locked_status(spec['name'], 'queued', {})
+
+    def work(spec):
+        if should_stop():
+            locked_status(spec['name'], 'stopped', {})
+            return {'status': 'stopped', 'exit_code': None, 'error': None}
+        return install_host(spec, script, on_line, locked_status, should_stop, password, key_filename,
+                            strict_host_keys)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(hosts) or 1))) as executor:
+        futures = {spec['name']: executor.submit(work, spec) for spec in hosts}
+        return {name: future.result() for name, future in futures.items()}
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Run an install script on many hosts over SSH')
+    parser.add_argument('script', help='script to run (e.g. saved from the web installer)')
+    parser.add_argument('hosts', help='file with one [user@]host[:port] per line')
+    parser.add_argument('--user', default='root', help='default SSH user')
+    parser.add_argument('--key', help='private key file')
+    parser.add_argument('--password', action='store_true', help='prompt for the SSH / sudo password')
+    parser.add_argument('--workers', type=int, default=MAX_FLEET_WORKERS, help='hosts installed at once')
+    parser.add_argument('--strict-host-keys', action='store_true',
+                        help='reject hosts whose key is not known yet instead of trusting it')
+    args = parser.parse_args()
+
+    with open(args.script) as f:
+        script_text = f.read()
+    with open(args.hosts) as f:
+        fleet_hosts = parse_hosts(f.read(), args.user)
+    secret = getpass.getpass('SSH password: ') if args.password else None
+    print_lock = threading.Lock()
+
+    def show_line(name, line):
+        with print_lock:
+            print(f'[{name}] {line}', flush=True)
+
+    def show_status(name, state, info):
+        with print_lock:
+            print(f"[{name}] == {state}{' ' + info['error'] if info.get('error') else ''}", flush=True)
+
+    results = run_fleet(fleet_hosts, script_text, show_line, show_status, args.workers,
+                        password=secret, key_filename=args.key, strict_host_keys=args.strict_host_keys)
+    failed = [name for name, r in results.items() if r['status'] != 'success']
+    print(f'{len(results) - len(failed)}/{len(results)} hosts succeeded' + (f"; failed: {', '.join(failed)}" if failed else ''))
+    sys.exit(1 if failed else 0)
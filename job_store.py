@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+ERPNext installer job store
+Keeps every install / doctor / uninstall / fleet run in SQLite: config
+without secrets, timings, exit code, step transitions and the full log.
+Logs are stored as zlib-compressed chunks; each chunk row carries its
+first line number, so a line range of an old job is served by inflating
+only the chunks that overlap it. Lines are also indexed in a contentless
+FTS5 table as they are stored, for searching across all past runs.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+from log_analyzer import state_file
+
+DB_FILE = 'jobs.db'
+# Lines per compressed chunk
+CHUNK_LINES = 1000
+# A running job also writes out a partial chunk this often, so little is
+# lost if the installer dies mid-job
+FLUSH_SECONDS = 5
+# Most lines served by one read_lines() call
+MAX_RANGE_LINES = 5000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    num INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    finished REAL,
+    exit_code INTEGER,
+    message TEXT,
+    lines INTEGER NOT NULL DEFAULT 0,
+    config TEXT,
+    report TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_kind ON jobs (kind, num);
+CREATE TABLE IF NOT EXISTS steps (
+    job_num INTEGER NOT NULL,
+    host TEXT,
+    step INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    ts REAL NOT NULL,
+    line INTEGER NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS steps_job ON steps (job_num, line);
+CREATE TABLE IF NOT EXISTS log_chunks (
+    job_num INTEGER NOT NULL,
+    first_line INTEGER NOT NULL,
+    line_count INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    times BLOB NOT NULL,
+    PRIMARY KEY (job_num, first_line)
+) WITHOUT ROWID;
+'''
+
+# Full-text index over all log lines. Contentless: the text stays only in
+# the compressed chunks; rowid = job num << LINE_BITS | line number.
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(line, content='', columnsize=0)"
+LINE_BITS = 32
+LINE_MASK = (1 << LINE_BITS) - 1
+SEARCH_LIMIT = 50
+# Fleet jobs prefix every output line with its host
+HOST_TAG = re.compile(r'^\[([^\]]+)\] ')
+
+JOB_COLUMNS = ('num', 'id', 'kind', 'created', 'finished', 'exit_code', 'message', 'lines')
+
+
+def pack_lines(lines, times, created):
+    """Chunk blobs: the text, and per-line ms offsets from the job start"""
+    data = zlib.compress('\n'.join(lines).encode('utf-8', 'replace'))
+    offsets = zlib.compress(json.dumps([int((t - created) * 1000) for t in times]).encode())
+    return data, offsets
+
+
+def unpack_lines(data):
+    return zlib.decompress(data).decode('utf-8').split('\n')
+
+
+def fts_query(text, raw=False):
+    """Search text as one FTS5 phrase; raw=True passes FTS5 syntax through"""
+    return text if raw else '"' + text.replace('"', '""') + '"'
+
+
+class JobRecord:
+    """Write side of one job: buffers lines and stores them chunk by chunk.
+
+    Methods are called from the job's worker threads; a store error stops
+    the recording but never the job itself.
+    """
+
+    def __init__(self, store, num, job_id, created):
+        self.store = store
+        self.num = num
+        self.id = job_id
+        self.created = created
+        self.lines = 0  # total, including the buffer
+        self.message = None
+        self._buf = []
+        self._times = []
+        self._flushed = time.time()
+        self._lock = threading.Lock()
+        self.broken = False
+
+    def add_line(self, line):
+        now = time.time()
+        with self._lock:
+            for part in line.split('\n'):
+                self._buf.append(part)
+                self._times.append(now)
+            self.lines += line.count('\n') + 1
+            if len(self._buf) >= CHUNK_LINES or now - self._flushed >= FLUSH_SECONDS:
+                self._flush()
+
+    def step(self, host, step, status, duration=None):
+        with self._lock:
+            self._write(('INSERT INTO steps (job_num, host, step, status, ts, line, duration) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (self.num, host, step, status, time.time(), self.lines, duration)))
+
+    def _flush(self):
+        self._flushed = time.time()
+        while self._buf:
+            lines, self._buf = self._buf[:CHUNK_LINES], self._buf[CHUNK_LINES:]
+            times, self._times = self._times[:CHUNK_LINES], self._times[CHUNK_LINES:]
+            first = self.lines - len(self._buf) - len(lines)
+            data, offsets = pack_lines(lines, times, self.created)
+            statements = [('INSERT OR REPLACE INTO log_chunks (job_num, first_line, line_count, data, times) '
+                           'VALUES (?, ?, ?, ?, ?)', (self.num, first, len(lines), data, offsets))]
+            if self.store.fts:
+                statements.append(('INSERT INTO log_fts (rowid, line) VALUES (?, ?)',
+                                   [((self.num << LINE_BITS) | (first + i), line) for i, line in enumerate(lines)]))
+            self._write(*statements)
+        self._write(('UPDATE jobs SET lines = ? WHERE num = ?', (self.lines, self.num)))
+
+    def _write(self, *statements):
+        if self.broken:
+            return
+        try:
+            self.store.execute_batch(statements)
+        except sqlite3.Error as e:
+            self.broken = True
+            print(f'⚠️ Job store: recording of {self.id} stopped: {e}', file=sys.stderr)
+
+    def pending(self, start, end):
+        """Buffered lines in [start, end) not yet written to a chunk"""
+        with self._lock:
+            first = self.lines - len(self._buf)
+            return first, self._buf[max(0, start - first):max(0, end - first)]
+
+    def finish(self, exit_code=None, report=None):
+        with self._lock:
+            self._flush()
+            self._write(('UPDATE jobs SET finished = ?, exit_code = ?, message = ?, report = ? WHERE num = ?',
+                         (time.time(), exit_code, self.message,
+                          json.dumps(report, default=str) if report is not None else None, self.num)))
+        self.store.live.pop(self.id, None)
+
+
+class JobStore:
+    """SQLite database of past and running jobs"""
+
+    def __init__(self, path=None):
+        self.path = path or state_file(DB_FILE)
+        if not self.path:
+            raise OSError('No writable state directory for the job store')
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        os.chmod(self.path, 0o600)  # logs may echo hostnames, users and paths
+        self.lock = threading.Lock()
+        self.live = {}
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+            try:
+                self.conn.execute(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False  # SQLite built without FTS5: no search
+            # Jobs cut off by a restart of the installer never finished
+            self.conn.execute("UPDATE jobs SET message = 'Interrupted (installer restarted)', finished = "
+                              'COALESCE((SELECT MAX(ts) FROM steps WHERE job_num = jobs.num), created) '
+                              'WHERE finished IS NULL')
+            self.conn.commit()
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
+
+    def execute_batch(self, statements):
+        """(sql, params) pairs in one transaction; a list of params means executemany"""
+        with self.lock:
+            with self.conn:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        self.conn.executemany(sql, params)
+                    else:
+                        self.conn.execute(sql, params)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def start_job(self, job_id, kind, created, config=None):
+        """JobRecord for a new job; None if it can't be recorded"""
+        try:
+            num = self.execute('INSERT INTO jobs (id, kind, created, config) VALUES (?, ?, ?, ?)',
+                               (job_id, kind, created, json.dumps(config or {}))).lastrowid
+        except sqlite3.Error as e:
+            print(f'⚠️ Job store: not recording {job_id}: {e}', file=sys.stderr)
+            return None
+        record = JobRecord(self, num, job_id, created)
+        self.live[job_id] = record
+        return record
+
+    def list_jobs(self, kind=None, limit=50, before=None):
+        """Newest first; pass the last num as before= for the next page"""
+        where, params = [], []
+        if kind:
+            where.append('kind = ?')
+            params.append(kind)
+        if before:
+            where.append('num < ?')
+            params.append(before)
+        rows = self.query(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs "
+                          f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY num DESC LIMIT ?",
+                          params + [limit])
+        return [self._job_dict(row) for row in rows]
+
+    def _job_dict(self, row):
+        job = dict(zip(JOB_COLUMNS, row))
+        record = self.live.get(job['id'])
+        if record:
+            job['lines'] = record.lines
+            job['message'] = record.message
+        job['running'] = job['finished'] is None
+        job['duration'] = round((job['finished'] or time.time()) - job['created'], 2)
+        return job
+
+    def get_job(self, job_id):
+        """Job with its config, report and step transitions"""
+        rows = self.query(f"SELECT {', '.join(JOB_COLUMNS)}, config, report FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = self._job_dict(rows[0][:len(JOB_COLUMNS)])
+        job['config'] = json.loads(rows[0][-2] or '{}')
+        job['report'] = json.loads(rows[0][-1]) if rows[0][-1] else None
+        job['steps'] = [dict(zip(('host', 'step', 'status', 'ts', 'line', 'duration'), row)) for row in self.query(
+            'SELECT host, step, status, ts, line, duration FROM steps WHERE job_num = ? ORDER BY rowid',
+            (job['num'],))]
+        return job
+
+    def read_lines(self, job_id, start=0, end=None):
+        """Lines [start, end) of a job's log, or None for an unknown job"""
+        rows = self.query('SELECT num, lines FROM jobs WHERE id = ?', (job_id,))
+        if not rows:
+            return None
+        num, total = rows[0]
+        record = self.live.get(job_id)
+        if record:
+            total = record.lines
+        start = max(0, start)
+        end = min(total, start + MAX_RANGE_LINES if end is None else end, start + MAX_RANGE_LINES)
+        lines = []
+        if end > start:
+            # Chunks overlapping [start, end): the one holding start, then the ones after it
+            for first, data in self.query(
+                    'SELECT first_line, data FROM log_chunks WHERE job_num = ? AND first_line < ? AND '
+                    'first_line >= (SELECT COALESCE(MAX(first_line), 0) FROM log_chunks '
+                    'WHERE job_num = ? AND first_line <= ?) ORDER BY first_line',
+                    (num, end, num, start)):
+                lines += unpack_lines(data)[max(0, start - first):end - first]
+            if record and start + len(lines) < end:
+                first, more = record.pending(start + len(lines), end)
+                if first > start + len(lines):
+                    return self.read_lines(job_id, start, end)  # flushed meanwhile
+                lines += more
+        return {'start': start, 'end': start + len(lines), 'total': total, 'lines': lines}
+
+    def search(self, text, kind=None, job_id=None, limit=SEARCH_LIMIT, before=None, raw=False):
+        """Newest log lines matching text, with job, step and time context.
+
+        Results come newest first; pass the last result's rowid as before=
+        for the next page.
+        """
+        if not self.fts:
+            raise sqlite3.OperationalError('SQLite was built without FTS5')
+        where, params = ['log_fts MATCH ?'], [fts_query(text, raw)]
+        if job_id:
+            rows = self.query('SELECT num FROM jobs WHERE id = ?', (job_id,))
+            if not rows:
+                return []
+            where.append('rowid BETWEEN ? AND ?')
+            params += [rows[0][0] << LINE_BITS, (rows[0][0] << LINE_BITS) | LINE_MASK]
+        if kind:
+            where.append(f'rowid >> {LINE_BITS} IN (SELECT num FROM jobs WHERE kind = ?)')
+            params.append(kind)
+        if before:
+            where.append('rowid < ?')
+            params.append(before)
+        rowids = self.query(f"SELECT rowid FROM log_fts WHERE {' AND '.join(where)} ORDER BY rowid DESC LIMIT ?",
+                            params + [limit])
+
+        jobs, chunks, results = {}, {}, []
+        for (rowid,) in rowids:
+            num, line = rowid >> LINE_BITS, rowid & LINE_MASK
+            if num not in jobs:
+                job_id, job_kind, created, config = self.query(
+                    'SELECT id, kind, created, config FROM jobs WHERE num = ?', (num,))[0]
+                jobs[num] = {'id': job_id, 'kind': job_kind, 'created': created,
+                             'site': json.loads(config or '{}').get('sitename')}
+            job = jobs[num]
+            first = self.query('SELECT MAX(first_line) FROM log_chunks WHERE job_num = ? AND first_line <= ?',
+                               (num, line))[0][0]
+            if (num, first) not in chunks:
+                data, times = self.query('SELECT data, times FROM log_chunks WHERE job_num = ? AND first_line = ?',
+                                         (num, first))[0]
+                chunks[num, first] = (unpack_lines(data), json.loads(zlib.decompress(times)))
+            lines, offsets = chunks[num, first]
+            text_line = lines[line - first]
+            tag = HOST_TAG.match(text_line) if job['kind'] == 'fleet' else None
+            host = tag.group(1) if tag else None
+            # The step most recently started at or before this line (on this host)
+            step = self.query('SELECT step, ts FROM steps WHERE job_num = ? AND host IS ? AND line <= ? '
+                              "AND status = 'running' ORDER BY line DESC, rowid DESC LIMIT 1", (num, host, line))
+            results.append({
+                'rowid': rowid,
+                'job': job,
+                'line': line,
+                'text': text_line,
+                'time': round(job['created'] + offsets[line - first] / 1000, 3),
+                'host': host,
+                'step': step[0][0] if step else None,
+            })
+        return results
+
+    def reindex(self):
+        """Rebuild the search index from the stored chunks"""
+        if not self.fts:
+            raise sqlite3.OperationalError('SQLite was built without FTS5')
+        self.execute_batch([("INSERT INTO log_fts (log_fts) VALUES ('delete-all')", ())])
+        indexed = 0
+        for num, first in self.query('SELECT job_num, first_line FROM log_chunks ORDER BY job_num, first_line'):
+            data = self.query('SELECT data FROM log_chunks WHERE job_num = ? AND first_line = ?', (num, first))[0][0]
+            lines = unpack_lines(data)
+            self.execute_batch([('INSERT INTO log_fts (rowid, line) VALUES (?, ?)',
+                                 [((num << LINE_BITS) | (first + i), line) for i, line in enumerate(lines)])])
+            indexed += len(lines)
+        return indexed
+
+
+def open_store(path=None):
+    """The job store, or None when SQLite can't be opened (jobs still run)"""
+    try:
+        return JobStore(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f'⚠️ Job store disabled: {e}', file=sys.stderr)
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Past ERPNext installer jobs')
+    parser.add_argument('job_id', nargs='?', help='print this job\'s log (with --search: search only it)')
+    parser.add_argument('--kind', help='only jobs of this kind (install, doctor, uninstall, fleet)')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--search', metavar='TEXT', help='find log lines containing TEXT in all jobs')
+    parser.add_argument('--reindex', action='store_true', help='rebuild the search index')
+    args = parser.parse_args()
+
+    store = JobStore()
+    if args.reindex:
+        print(f'Indexed {store.reindex()} lines')
+    elif args.search:
+        for hit in store.search(args.search, args.kind, args.job_id, args.limit):
+            when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(hit['time']))
+            step = f" step {hit['step']}" if hit['step'] else ''
+            print(f"{hit['job']['id']} {hit['job']['kind']:<9} {when}{step} #{hit['line']}: {hit['text']}")
+    elif args.job_id:
+        position = 0
+        while True:
+            page = store.read_lines(args.job_id, position)
+            if page is None:
+                sys.exit(f'Unknown job {args.job_id}')
+            for text in page['lines']:
+                print(text)
+            if page['end'] >= page['total'] or page['end'] == position:
+                break
+            position = page['end']
+    else:
+        for job in store.list_jobs(args.kind, args.limit):
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(job['created']))
+            print(f"{job['id']}  {job['kind']:<9} {started}  {job['duration']:>8.1f}s  "
+                  f"exit {job['exit_code'] if job['exit_code'] is not None else '-':<4} "
+                  f"{job['lines']:>7} lines  {job['message'] or ''}")
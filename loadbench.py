@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+ERPNext load benchmark
+Drives concurrent keep-alive load at a site's home page, the ping API
+and a logged-in desk page, reports requests/s and latency percentiles,
+and keeps every run in the job store so a tuning change or an upgrade
+can be compared with the runs before it.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+import http.client
+import socket
+import ssl
+import time
+import uuid
+from urllib.parse import urlencode
+
+import job_store
+import probes
+
+ENDPOINTS = [
+    {'name': 'home', 'path': '/'},
+    {'name': 'ping', 'path': '/api/method/ping'},
+    {'name': 'desk', 'path': '/app', 'login': True},
+]
+DEFAULT_CONCURRENCY = 10
+MAX_CONCURRENCY = 200
+DEFAULT_DURATION = 10
+MAX_DURATION = 300
+REQUEST_TIMEOUT = 30
+# Backoff for a client whose connection failed, so a down site is not spun on
+ERROR_PAUSE = 0.1
+
+
+class LoadBenchError(Exception):
+    pass
+
+
+def login(host, site, user, password, use_ssl=False, port=None):
+    """Cookie header of a fresh desk session"""
+    if use_ssl:
+        conn = http.client.HTTPSConnection(host, port, timeout=REQUEST_TIMEOUT,
+                                           context=ssl._create_unverified_context())
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+    try:
+        conn.request('POST', '/api/method/login', body=urlencode({'usr': user, 'pwd': password}),
+                     headers={'Host': site, 'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        cookies = SimpleCookie()
+        for header in response.msg.get_all('Set-Cookie') or []:
+            cookies.load(header)
+    except (OSError, http.client.HTTPException) as e:
+        raise LoadBenchError(f'login failed: {e}')
+    finally:
+        conn.close()
+    if response.status != 200 or 'sid' not in cookies or cookies['sid'].value == 'Guest':
+        raise LoadBenchError(f'login as {user} failed (HTTP {response.status})')
+    return f"sid={cookies['sid'].value}"
+
+
+def drive(pool, site, path, concurrency, duration, headers=None):
+    """Keep `concurrency` requests in flight for `duration` seconds"""
+    deadline = time.time() + duration
+
+    def client():
+        latencies = []
+        statuses = {}
+        while time.time() < deadline:
+            status, latency, _ = pool.request(site, path, headers=headers)
+            statuses[status] = statuses.get(status, 0) + 1
+            if 200 <= status < 400:
+                latencies.append(latency)
+            elif status == 0:
+                time.sleep(ERROR_PAUSE)
+        return latencies, statuses
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: client(), range(concurrency)))
+    elapsed = time.time() - started
+
+    latencies = [value for mine, _ in results for value in mine]
+    statuses = {}
+    for _, codes in results:
+        for status, count in codes.items():
+            statuses[status] = statuses.get(status, 0) + count
+    requests = sum(statuses.values())
+    return dict(
+        probes.latency_summary(latencies),
+        requests=requests,
+        errors=requests - len(latencies),
+        rps=round(len(latencies) / elapsed, 1),
+        mean=round(sum(latencies) / len(latencies), 1) if latencies else None,
+        max=max(latencies) if latencies else None,
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+        duration=round(elapsed, 2),
+    )
+
+
+def benchmark(site, host='localhost', port=None, use_ssl=False, concurrency=DEFAULT_CONCURRENCY,
+              duration=DEFAULT_DURATION, user='Administrator', password=None, emit=print, on_result=None,
+              endpoints=ENDPOINTS):
+    """Run every endpoint in turn; returns the run's result dict.
+
+    emit(line) gets progress text and on_result(endpoint result) each
+    endpoint as soon as it is measured.
+    """
+    concurrency = max(1, min(int(concurrency), MAX_CONCURRENCY))
+    duration = max(1, min(float(duration), MAX_DURATION))
+    run = {
+        'site': site,
+        'target': f"{'https' if use_ssl else 'http'}://{host}{':' + str(port) if port else ''}",
+        'host': socket.gethostname(),
+        'concurrency': concurrency,
+        'duration': duration,
+        'started': time.time(),
+        'endpoints': [],
+    }
+    pool = probes.ConnectionPool(host, use_ssl, port, size=concurrency, timeout=REQUEST_TIMEOUT)
+    try:
+        cookie = None
+        for endpoint in endpoints:
+            result = {'name': endpoint['name'], 'path': endpoint['path']}
+            headers = None
+            if endpoint.get('login'):
+                if not password:
+                    result['skipped'] = 'no password given'
+                else:
+                    try:
+                        cookie = cookie or login(host, site, user, password, use_ssl, port)
+                        headers = {'Cookie': cookie}
+                    except LoadBenchError as e:
+                        result['skipped'] = str(e)
+            if 'skipped' not in result:
+                emit(f"📈 {endpoint['name']} ({endpoint['path']}): {concurrency} connections for {duration:g}s...")
+                # Warm up: open the keep-alive connections and let caches fill
+                drive(pool, site, endpoint['path'], concurrency, min(1, duration), headers)
+                result.update(drive(pool, site, endpoint['path'], concurrency, duration, headers))
+                emit('   ' + format_result(result))
+            else:
+                emit(f"⊘ {endpoint['name']}: skipped ({result['skipped']})")
+            run['endpoints'].append(result)
+            if on_result:
+                on_result(result)
+    finally:
+        pool.close()
+    run['finished'] = time.time()
+    return run
+
+
+def format_result(result):
+    if result.get('skipped'):
+        return f"{result['name']}: skipped"
+    text = (f"{result['rps']:.1f} req/s | p50 {result['p50']} ms, p95 {result['p95']} ms, p99 {result['p99']} ms"
+            if result['p50'] is not None else 'no successful responses')
+    if result['errors']:
+        text += f" | {result['errors']} of {result['requests']} failed ({', '.join(f'{s}: {n}' for s, n in result['statuses'].items() if not s.startswith(('2', '3')))})"
+    return text
+
+
+def history(store, site=None, host=None, limit=20):
+    """Earlier benchmark runs, newest first (matching site and host)"""
+    runs = []
+    if store is None:
+        return runs
+    for job in store.list_jobs('benchmark', limit=limit * 5):
+        stored = store.get_job(job['id'])
+        report = stored and stored['report']
+        if not report or (site and report.get('site') != site) or (host and report.get('host') != host):
+            continue
+        runs.append(dict(report, job_id=job['id']))
+        if len(runs) >= limit:
+            break
+    return runs
+
+
+def compare(run, previous):
+    """Per endpoint: change in req/s and p95 against an earlier run, in percent"""
+    before = {e['name']: e for e in previous['endpoints'] if not e.get('skipped')}
+    changes = {}
+    for endpoint in run['endpoints']:
+        old = before.get(endpoint['name'])
+        if endpoint.get('skipped') or not old or not old['rps'] or not old['p95'] or endpoint['p95'] is None:
+            continue
+        changes[endpoint['name']] = {
+            'rps': round((endpoint['rps'] - old['rps']) * 100 / old['rps'], 1),
+            'p95': round((endpoint['p95'] - old['p95']) * 100 / old['p95'], 1),
+        }
+    return changes
+
+
+def format_changes(changes, previous):
+    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(previous['started']))
+    return [f"   {name}: req/s {c['rps']:+.1f}%, p95 {c['p95']:+.1f}% vs {when} ({previous['job_id']})"
+            for name, c in changes.items()]
+
+
+if __name__ == '__main__':
+    import argparse
+    import getpass
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description='HTTP load benchmark for an ERPNext site')
+    parser.add_argument('site', help='site name (sent as the Host header)')
+    parser.add_argument('--host', default='localhost', help='server to connect to')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--ssl', action='store_true')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('-d', '--duration', type=float, default=DEFAULT_DURATION, help='seconds per endpoint')
+    parser.add_argument('--user', default='Administrator', help='desk user for the logged-in endpoint')
+    parser.add_argument('--password', action='store_true', help='prompt for the desk password')
+    parser.add_argument('--history', action='store_true', help='list earlier runs for the site')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    store = job_store.open_store()
+    if args.history:
+        runs = history(store, args.site)
+        if args.json:
+            print(json.dumps(runs, indent=2))
+        for past in runs:
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(past['started']))}  {past['job_id']}"
+                  f"  {past['host']}  c={past['concurrency']}")
+            for endpoint in past['endpoints']:
+                print(f"   {endpoint['name']:<5} {format_result(endpoint)}")
+        sys.exit(0)
+
+    secret = getpass.getpass(f'{args.user} password: ') if args.password else None
+    job_id = uuid.uuid4().hex[:12]
+    record = store.start_job(job_id, 'benchmark', time.time(), {
+        'site': args.site, 'host': args.host, 'port': args.port, 'ssl': args.ssl,
+        'concurrency': args.concurrency, 'duration': args.duration, 'user': args.user}) if store else None
+
+    def show(line):
+        print(line, flush=True)
+        if record:
+            record.add_line(line)
+
+    previous = history(store, args.site, socket.gethostname(), limit=1)
+    result = benchmark(args.site, args.host, args.port, args.ssl, args.concurrency, args.duration,
+                       args.user, secret, show if not args.json else (record.add_line if record else lambda _: None))
+    if previous:
+        result['compared_to'] = previous[0]['job_id']
+        result['changes'] = compare(result, previous[0])
+    failed = all(e.get('skipped') or e['p50'] is None for e in result['endpoints'])
+    if record:
+        record.finish(1 if failed else 0, result)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif previous and result['changes']:
+        print('Compared with the previous run:')
+        for line in format_changes(result['changes'], previous[0]):
+            print(line)
+    sys.exit(1 if failed else 0)
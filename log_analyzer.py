@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+ERPNext Doctor - incremental log analyzer
+Scans the bench error logs in one pass per new chunk, remembering where
+it stopped in each file, so repeat runs only read bytes written since.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+LOG_FILES = ('web.error.log', 'worker.error.log', 'bench.log')
+# Bytes read per chunk; lines are only counted once their newline arrives
+CHUNK_SIZE = 8 * 1024 * 1024
+# Per-day counter buckets kept in the state file
+ROLLING_DAYS = 7
+MAX_SAMPLES = 3
+STATE_DIRS = ('/var/lib/erpnext-installer', '~/.local/state/erpnext-installer')
+
+# Only lines containing one of these are looked at by the rules (same
+# filter as doctor.sh); matched against a lowercased copy of each chunk,
+# which is several times faster than a case-insensitive search.
+GATE = re.compile(rb'error|exception|failed|critical|traceback')
+
+# (id, title, pattern, suggested fix, fix command) - patterns from doctor.sh Check 12
+RULES = [
+    ('db_access', 'Database access denied', r"access denied|1045", 'Check db_password in site_config.json', None),
+    ('db_connect', 'Database connection refused', r"can't connect|2002|2003", 'Restart MariaDB',
+     'systemctl restart mariadb || systemctl restart mysql'),
+    ('db_lock', 'Database locked / deadlock', r'database.*locked|deadlock', 'Inspect SHOW PROCESSLIST', None),
+    ('db_schema', 'Missing table / column', r"table.*doesn't exist|unknown column", 'Run bench migrate', None),
+    ('database', 'Database errors', r'database|mysql|mariadb|1045|2002|2003|HY000', None, None),
+    ('redis', 'Redis / cache errors', r'redis|cache|connection.*refused.*6379', 'Clear cache and restart Redis',
+     'systemctl restart redis-server'),
+    ('permissions', 'Permission errors', r'permission denied|EACCES|operation not permitted',
+     'Give the bench owner its files back', None),
+    ('modules', 'Python module errors', r'modulenotfounderror|importerror|no module named',
+     'Run bench setup requirements', None),
+    ('assets', 'Node.js / assets build errors', r'node|yarn|npm|webpack|assets.*not.*found|build.*failed',
+     'Run bench build', None),
+    ('workers', 'Worker / queue errors', r'worker.*failed|queue.*stuck|background.*job', 'Restart workers',
+     'supervisorctl restart all'),
+    ('migration', 'Migration / patch errors', r'migration.*failed|patch.*failed|migrate', 'Run bench migrate', None),
+    ('doctype', 'DocType / schema errors', r'doctype.*not.*found|invalid.*doctype|schema.*error',
+     'Run bench migrate and clear-cache', None),
+    ('session', 'CSRF / session errors', r'csrf|session.*expired|invalid.*token', 'Run bench clear-cache', None),
+    ('email', 'Email / SMTP errors', r'smtp|email.*failed|authentication.*failed.*email',
+     'Check Email Account settings in ERPNext', None),
+    ('nginx', 'SSL / Nginx errors', r'ssl|certificate|nginx.*error', 'Test and reload Nginx',
+     'nginx -t && systemctl reload nginx'),
+    ('timeout', 'Timeout errors', r'timeout|timed out|504.*gateway', 'Restart services',
+     'supervisorctl restart all'),
+    ('disk', 'Disk space errors', r'no space|disk.*full|enospc', 'Free up disk space', None),
+    ('recursion', 'Circular reference errors', r'circular.*reference|maximum.*recursion',
+     'Requires a code-level fix', None),
+    ('version', 'Version mismatch errors', r'version.*mismatch|incompatible.*version',
+     'Check app version compatibility (bench version)', None),
+    ('git', 'Git conflict errors', r'git.*conflict|merge.*conflict', 'Check git status in apps/', None),
+    ('upload', 'File upload size errors', r'file.*too.*large|413.*request.*entity',
+     'Raise client_max_body_size / max_file_size', None),
+    ('custom_script', 'Custom script errors', r'custom.*script|client.*script.*error',
+     'Check Custom Scripts in ERPNext', None),
+    ('hooks', 'Hooks errors', r'hooks|hook.*not.*found', 'Check hooks.py in custom apps', None),
+]
+RULE_INFO = {rule[0]: rule for rule in RULES}
+# A sub-rule hit also counts for its category
+RULE_PARENTS = {'db_access': 'database', 'db_connect': 'database', 'db_lock': 'database',
+                'db_schema': 'database'}
+
+# All rules in one zero-width alternation of named groups: finditer() tries
+# every position of a line once and lastgroup names the first rule found
+# there. Other rules starting at the same position are tried one by one
+# (RULE_RES), only at the few positions where something matched.
+RULES_RE = re.compile(b'(?=' + b'|'.join(
+    b'(?P<' + rule_id.encode() + b'>' + pattern.lower().encode() + b')'
+    for rule_id, _, pattern, _, _ in RULES) + b')')
+RULE_RES = [(rule_id, re.compile(pattern.lower().encode())) for rule_id, _, pattern, _, _ in RULES]
+# Error logs repeat the same lines (tracebacks) a lot: remember their hits
+LINE_CACHE_SIZE = 4096
+
+
+def state_file(name='log_analyzer.json'):
+    """Path of a doctor state file; falls back to ~/.local/state when not root"""
+    for directory in STATE_DIRS:
+        directory = os.path.expanduser(directory)
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(directory, os.W_OK):
+            return os.path.join(directory, name)
+    return None
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+def save_state(path, state):
+    if not path:
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def line_hits(line):
+    """Ids of the rules matching one lowercased line"""
+    hits = set()
+    for match in RULES_RE.finditer(line):
+        hits.add(match.lastgroup)
+        hits.update(rule_id for rule_id, pattern in RULE_RES
+                    if rule_id not in hits and pattern.match(line, match.start()))
+    return hits
+
+
+def scan(f, offset, counts, samples):
+    """Count rule hits from offset to the last complete line.
+
+    Returns (new offset, lines scanned, error lines). A trailing line
+    without its newline is left for the next run.
+    """
+    f.seek(offset)
+    lines = errors = 0
+    cache = {}
+    carry = b''
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        data = carry + chunk
+        end = data.rfind(b'\n') + 1
+        carry = data[end:]
+        data = data[:end]
+        lines += data.count(b'\n')
+        offset += end
+        lower = data.lower()
+        tail = []
+        match = GATE.search(lower)
+        while match:
+            start = lower.rfind(b'\n', 0, match.start()) + 1
+            stop = lower.index(b'\n', match.end())
+            line = lower[start:stop]
+            hits = cache.get(line)
+            if hits is None:
+                hits = line_hits(line)
+                hits.update([RULE_PARENTS[h] for h in hits if h in RULE_PARENTS])
+                if len(cache) >= LINE_CACHE_SIZE:
+                    cache.clear()
+                cache[line] = hits
+            for rule_id in hits:
+                counts[rule_id] = counts.get(rule_id, 0) + 1
+            errors += 1
+            tail.append((start, stop))
+            if len(tail) > MAX_SAMPLES:
+                del tail[0]
+            match = GATE.search(lower, stop)
+        for start, stop in tail:
+            samples.append(data[start:stop][:200].decode('utf-8', 'replace'))
+        del samples[:-MAX_SAMPLES]
+    return offset, lines, errors
+
+
+def analyze_file(path, entry, counts, samples):
+    """Read what was appended to one log since the previous run"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}, 0, 0, 0
+    lines = errors = read = 0
+    if entry.get('inode') not in (None, st.st_ino):
+        # Rotated: finish the old file first if it is still next to the log
+        try:
+            old = path + '.1'
+            if os.stat(old).st_ino == entry['inode']:
+                with open(old, 'rb') as f:
+                    end, lines, errors = scan(f, entry['offset'], counts, samples)
+                read = end - entry['offset']
+        except OSError:
+            pass
+        offset = 0
+    elif st.st_size < entry.get('offset', 0):
+        offset = 0  # truncated in place
+    else:
+        offset = entry.get('offset', 0)
+
+    with open(path, 'rb') as f:
+        end, more_lines, more_errors = scan(f, offset, counts, samples)
+    read += end - offset
+    return {'inode': st.st_ino, 'offset': end}, lines + more_lines, errors + more_errors, read
+
+
+def analyze(bench_dir, state_path=None, reset=False):
+    """Analyze the bench logs incrementally.
+
+    Returns new lines/error lines and per-rule hits since the last run,
+    the rolling per-rule totals over ROLLING_DAYS and the newest samples.
+    """
+    state_path = state_path or state_file()
+    state = {} if reset or not state_path else load_state(state_path)
+    state.setdefault('files', {})
+    state.setdefault('days', {})
+    started = time.time()
+    counts = {}
+    samples = []
+    lines = errors = 0
+    read = 0
+    for name in LOG_FILES:
+        path = os.path.join(bench_dir, 'logs', name)
+        entry, file_lines, file_errors, file_read = analyze_file(
+            path, state['files'].get(path, {}), counts, samples)
+        if entry:
+            state['files'][path] = entry
+        lines += file_lines
+        errors += file_errors
+        read += file_read
+
+    today = time.strftime('%Y-%m-%d')
+    bucket = state['days'].setdefault(today, {})
+    for rule_id, n in counts.items():
+        bucket[rule_id] = bucket.get(rule_id, 0) + n
+    for day in sorted(state['days'])[:-ROLLING_DAYS]:
+        del state['days'][day]
+    window = {}
+    for bucket in state['days'].values():
+        for rule_id, n in bucket.items():
+            window[rule_id] = window.get(rule_id, 0) + n
+    if samples:
+        state['samples'] = samples
+    save_state(state_path, state)
+
+    return {
+        'lines': lines,
+        'error_lines': errors,
+        'bytes': read,
+        'new': counts,
+        'window': window,
+        'samples': state.get('samples', []),
+        'duration': round(time.time() - started, 3),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Incremental ERPNext error log analyzer')
+    parser.add_argument('bench_dir', nargs='?', help='frappe-bench directory (default: auto-detect)')
+    parser.add_argument('--reset', action='store_true', help='forget saved offsets and re-read everything')
+    parser.add_argument('--json', action='store_true', help='print the raw result as JSON')
+    args = parser.parse_args()
+
+    bench_dir = args.bench_dir
+    if not bench_dir:
+        import doctor_checks
+        bench_dir = doctor_checks.find_bench()
+    if not bench_dir:
+        sys.exit('ERPNext installation not found')
+
+    summary = analyze(bench_dir, reset=args.reset)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        sys.exit(0)
+    print(f"Scanned {summary['lines']} new lines ({summary['bytes'] // 1024} KB) in {summary['duration']}s,"
+          f" {summary['error_lines']} error lines")
+    for rule_id, n in sorted(summary['window'].items(), key=lambda item: -item[1]):
+        print(f"  {RULE_INFO[rule_id][1]:<32} {summary['new'].get(rule_id, 0):>8} new {n:>10} last {ROLLING_DAYS} days")
+    for line in summary['samples']:
+        print(f'  > {line}')
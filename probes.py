@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+ERPNext Doctor - native probes
+Listener ownership from /proc, TCP/HTTP/Redis probes over plain sockets
+and one long-lived MariaDB session, so the doctor checks do not fork
+ss, curl, redis-cli or mysql for every question they ask.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import math
+import os
+import queue
+import select
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+import time
+
+# Process names (/proc/<pid>/comm) that mean a service is up
+SERVICE_PROCESSES = {
+    'mariadb': ('mariadbd', 'mysqld'),
+    'mysql': ('mariadbd', 'mysqld'),
+    'nginx': ('nginx',),
+    'redis-server': ('redis-server',),
+    'supervisor': ('supervisord',),
+    'apache2': ('apache2',),
+}
+TCP_LISTEN = '0A'
+# Site probing: keep-alive connections per pool, samples per site/protocol
+# and how many of them are in flight at once (nearest-rank p95 needs 20+
+# samples to differ from the slowest one)
+SITE_PROBE_CONCURRENCY = 8
+SITE_PROBE_SAMPLES = 40
+SITE_PROBE_PARALLEL = 4
+HEALTHY_STATUS = (200, 301, 302)
+
+
+def processes():
+    """{pid: command name} for every running process"""
+    procs = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/comm') as f:
+                procs[int(pid)] = f.read().strip()
+        except OSError:
+            pass
+    return procs
+
+
+def service_running(name, procs=None):
+    names = SERVICE_PROCESSES.get(name, (name,))
+    return any(comm in names for comm in (procs or processes()).values())
+
+
+def parse_address(hex_addr):
+    """'0100007F:1F90' -> ('127.0.0.1', 8080); handles the IPv6 form too"""
+    ip_hex, port_hex = hex_addr.split(':')
+    raw = bytes.fromhex(ip_hex)
+    if len(raw) == 4:
+        ip = socket.inet_ntop(socket.AF_INET, raw[::-1])
+    else:
+        # /proc prints IPv6 as four host-order 32-bit words
+        raw = b''.join(raw[i:i + 4][::-1] for i in range(0, 16, 4))
+        ip = socket.inet_ntop(socket.AF_INET6, raw)
+    return ip, int(port_hex, 16)
+
+
+def listening_sockets():
+    """{inode: (ip, port)} of TCP sockets in LISTEN state"""
+    sockets = {}
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == TCP_LISTEN:
+                        sockets[int(fields[9])] = parse_address(fields[1])
+        except (OSError, StopIteration):
+            pass
+    return sockets
+
+
+def socket_owners(inodes):
+    """{inode: (pid, name)} found by walking /proc/<pid>/fd.
+
+    Only processes we may inspect are visible: unprivileged callers see
+    their own; root sees all.
+    """
+    owners = {}
+    wanted = {f'socket:[{inode}]': inode for inode in inodes}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        fd_dir = f'/proc/{pid}/fd'
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f'{fd_dir}/{fd}')
+            except OSError:
+                continue
+            inode = wanted.get(target)
+            if inode is not None and inode not in owners:
+                try:
+                    with open(f'/proc/{pid}/comm') as f:
+                        owners[inode] = (int(pid), f.read().strip())
+                except OSError:
+                    owners[inode] = (int(pid), '?')
+        if len(owners) == len(wanted):
+            break
+    return owners
+
+
+def listeners(privileged=True):
+    """{port: [{'ip', 'pid', 'process'}]} for every listening TCP port.
+
+    When not root and some owners are hidden, one `sudo -n` run of this
+    module fills them in (a single fork instead of one per port).
+    """
+    sockets = listening_sockets()
+    owners = socket_owners(sockets)
+    if privileged and os.geteuid() != 0 and len(owners) < len(sockets):
+        try:
+            out = subprocess.run(['sudo', '-n', sys.executable, os.path.abspath(__file__), 'listeners'],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10).stdout
+            return {int(port): entries for port, entries in json.loads(out).items()}
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass
+    ports = {}
+    for inode, (ip, port) in sockets.items():
+        pid, name = owners.get(inode, (None, '?'))
+        ports.setdefault(port, []).append({'ip': ip, 'pid': pid, 'process': name})
+    return ports
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies):
+    return {
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+    }
+
+
+class ConnectionPool:
+    """Keep-alive connections to one web server, shared by every site.
+
+    All sites of a bench sit behind the same nginx, so one connection can
+    serve requests for any of them (only the Host header differs). At most
+    `size` requests are in flight; further callers wait for a free slot.
+    """
+
+    def __init__(self, host, use_ssl=False, port=None, size=SITE_PROBE_CONCURRENCY, timeout=5):
+        self.host = host
+        self.use_ssl = use_ssl
+        self.port = port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            self.idle.put(None)
+
+    def _connect(self):
+        if self.use_ssl:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                               context=ssl._create_unverified_context())
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, site, path='/', method='GET', headers=None, body=None):
+        """(status, latency in ms, response body); status 0 when unreachable"""
+        conn = self.idle.get()
+        reused = conn is not None
+        try:
+            while True:
+                conn = conn or self._connect()
+                started = time.time()
+                try:
+                    conn.request(method, path, body=body, headers=dict(headers or {}, Host=site))
+                    response = conn.getresponse()
+                    data = response.read()
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = None
+                    if reused:
+                        # The server may have dropped an idle keep-alive: retry once fresh
+                        reused = False
+                        continue
+                    return 0, None, b''
+                if response.will_close:
+                    conn.close()
+                return response.status, round((time.time() - started) * 1000, 1), data
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        while not self.idle.empty():
+            conn = self.idle.get()
+            if conn:
+                conn.close()
+
+
+def probe_site(pool, site, samples=SITE_PROBE_SAMPLES, path='/', parallel=SITE_PROBE_PARALLEL):
+    """Status and latency percentiles of `samples` requests to one site,
+    spread over `parallel` of the pool's connections"""
+    first = pool.request(site, path)
+    results = [first[:2]]
+    if first[0] != 0 and samples > 1:  # unreachable: more samples only add timeouts
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            results += executor.map(lambda _: pool.request(site, path)[:2], range(samples - 1))
+    statuses = [code for code, _ in results]
+    latencies = [latency for code, latency in results if code != 0]
+    summary = {
+        'status': max(set(statuses), key=statuses.count),
+        'samples': len(statuses),
+        'ok': sum(1 for code in statuses if code in HEALTHY_STATUS),
+    }
+    summary.update(latency_summary(latencies))
+    return summary
+
+
+class RedisError(Exception):
+    pass
+
+
+def read_resp(f):
+    """One RESP reply from a socket file"""
+    line = f.readline()
+    if not line:
+        raise RedisError('connection closed')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode()
+    if kind == b'-':
+        raise RedisError(payload.decode())
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        size = int(payload)
+        if size < 0:
+            return None
+        data = f.read(size + 2)
+        return data[:-2].decode('utf-8', 'replace')
+    if kind == b'*':
+        count = int(payload)
+        return None if count < 0 else [read_resp(f) for _ in range(count)]
+    raise RedisError(f'bad reply: {line[:40]!r}')
+
+
+def redis_command(*args, host='127.0.0.1', port=6379, timeout=3):
+    """Send one command over RESP and return the decoded reply"""
+    payload = b'*%d\r\n' % len(args)
+    for arg in args:
+        arg = str(arg).encode()
+        payload += b'$%d\r\n%s\r\n' % (len(arg), arg)
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(payload)
+        with sock.makefile('rb') as f:
+            return read_resp(f)
+
+
+def redis_ping(host='127.0.0.1', port=6379, timeout=3):
+    try:
+        return redis_command('PING', host=host, port=port, timeout=timeout) == 'PONG'
+    except (OSError, RedisError):
+        return False
+
+
+def redis_info(section='', host='127.0.0.1', port=6379, timeout=3):
+    """INFO as a dict"""
+    args = ('INFO', section) if section else ('INFO',)
+    text = redis_command(*args, host=host, port=port, timeout=timeout) or ''
+    return dict(line.split(':', 1) for line in text.splitlines() if ':' in line and not line.startswith('#'))
+
+
+class MariaDBError(Exception):
+    pass
+
+
+class MariaDBSession:
+    """One `mysql` client kept running for all queries of a doctor run.
+
+    Queries are written to its stdin in batch mode; each is followed by a
+    marker SELECT so the reader knows where the result ends. --force keeps
+    the client alive after SQL errors, which come back as ERROR lines.
+    Access is serialized; a query that times out is killed on the server
+    (KILL QUERY from a second client, or it would keep running there),
+    then the session is dropped and the next query starts a fresh client.
+    """
+
+    def __init__(self, user='root', sudo=None):
+        self.user = user
+        self.sudo = os.geteuid() != 0 if sudo is None else sudo
+        self.process = None
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def _command(self, *args):
+        cmd = ['mysql', '-u', self.user, '--batch', '--skip-column-names'] + list(args)
+        return ['sudo', '-n'] + cmd if self.sudo else cmd
+
+    def _start(self):
+        self.process = subprocess.Popen(self._command('--force', '--unbuffered'), stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+        self.buffer = b''
+        self.connection_id = None
+        try:
+            self.process.stdin.write(b'SELECT CONNECTION_ID();\n')
+            line = self._readline(time.time() + 10)
+        except (OSError, TimeoutError, MariaDBError):
+            return  # the next query reports what is wrong
+        if line.isdigit():
+            self.connection_id = int(line)
+        else:
+            self.buffer = line.encode() + b'\n' + self.buffer
+
+    def _kill_query(self):
+        """Stop the running statement on the server; killing the client alone leaves it running"""
+        if self.connection_id is None:
+            return
+        try:
+            subprocess.run(self._command('-e', f'KILL QUERY {self.connection_id}'),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    def _readline(self, deadline):
+        while b'\n' not in self.buffer:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError('MariaDB query timed out')
+            ready, _, _ = select.select([self.process.stdout], [], [], remaining)
+            if ready:
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+                if not chunk:
+                    raise MariaDBError(self.buffer.decode('utf-8', 'replace').strip() or 'mysql exited')
+                self.buffer += chunk
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode('utf-8', 'replace')
+
+    def query(self, sql, timeout=30):
+        """Rows of one statement as lists of strings ('NULL' for NULL)"""
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            self.counter += 1
+            marker = f'--end-{os.getpid()}-{self.counter}--'
+            try:
+                self.process.stdin.write(f"{sql.rstrip().rstrip(';')};\nSELECT '{marker}';\n".encode())
+                rows = []
+                errors = []
+                deadline = time.time() + timeout
+                while True:
+                    line = self._readline(deadline)
+                    if line == marker:
+                        break
+                    if line.startswith('ERROR ') and not rows:
+                        errors.append(line)
+                    else:
+                        rows.append(line.split('\t'))
+            except TimeoutError:
+                self._kill_query()
+                self._kill()
+                raise
+            except (OSError, MariaDBError):
+                self._kill()
+                raise
+            if errors:
+                raise MariaDBError(errors[0])
+            return rows
+
+    def _kill(self):
+        if self.process:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def close(self):
+        with self.lock:
+            if self.process and self.process.poll() is None:
+                try:
+                    self.process.stdin.close()
+                    self.process.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+            self._kill()
+
+
+if __name__ == '__main__':
+    # `probes.py listeners` prints listener ownership as JSON (used via sudo)
+    if sys.argv[1:] == ['listeners']:
+        print(json.dumps(listeners(privileged=False)))
+    else:
+        sys.exit('usage: probes.py listeners')
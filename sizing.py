@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+ERPNext bench process sizing
+Works out gunicorn workers/threads and the short/default/long RQ worker
+counts from the host's cores and RAM (what is left after MariaDB and
+Redis take their tuning.py share) and the job backlog waiting in the
+bench queue Redis, then rewrites the bench supervisor config to match.
+"""
+
+import difflib
+import json
+import os
+import re
+from urllib.parse import urlparse
+
+import probes
+import tuning
+
+# Typical resident size of one process with frappe + erpnext loaded
+WEB_WORKER_MB = 150
+RQ_WORKER_MB = 200
+OS_RESERVE_MB = 512
+MAX_THREADS = 4
+# One extra RQ worker per this many queued jobs, up to the queue's cap
+BACKLOG_PER_WORKER = 100
+QUEUES = ('short', 'default', 'long')
+
+
+def supervisor_conf(bench_dir):
+    """bench setup supervisor writes here; /etc/supervisor/conf.d links to it"""
+    return os.path.join(bench_dir, 'config', 'supervisor.conf')
+
+
+def common_site_config(bench_dir):
+    try:
+        with open(os.path.join(bench_dir, 'sites', 'common_site_config.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def queue_backlog(bench_dir):
+    """Jobs waiting per queue type in the bench queue Redis, None if unreachable"""
+    url = urlparse(common_site_config(bench_dir).get('redis_queue') or 'redis://127.0.0.1:11000')
+    host, port = url.hostname or '127.0.0.1', url.port or 11000
+    backlog = dict.fromkeys(QUEUES, 0)
+    try:
+        cursor = '0'
+        while True:
+            cursor, keys = probes.redis_command('SCAN', cursor, 'MATCH', 'rq:queue:*', 'COUNT', 1000,
+                                                host=host, port=port)
+            for key in keys:
+                # v15 prefixes queue names with the bench id: rq:queue:<bench>:short
+                qtype = key.rsplit(':', 1)[-1]
+                if qtype in backlog:
+                    backlog[qtype] += probes.redis_command('LLEN', key, host=host, port=port) or 0
+            if cursor == '0':
+                return backlog
+    except (OSError, probes.RedisError, ValueError, TypeError):
+        return None
+
+
+def recommend(facts, backlog=None):
+    """Process counts for this host and the memory they are expected to use"""
+    cpus = facts['cpus']
+    tuned = tuning.profile(facts)
+    reserved = (int(tuned['mariadb']['innodb_buffer_pool_size'][:-1])
+                + int(tuned['redis']['maxmemory'][:-2]) + OS_RESERVE_MB)
+    # What is really left; the minimum processes below may not fit in it
+    budget = max(0, facts['mem_mb'] - reserved)
+
+    # The usual 2 x cores + 1, with threads making up for workers RAM cannot
+    # hold once one RQ worker per queue has its share
+    target = 2 * cpus + 1
+    web_budget = min(int(budget * 0.6), budget - len(QUEUES) * RQ_WORKER_MB)
+    workers = max(2, min(target, web_budget // WEB_WORKER_MB))
+    threads = 1 if workers >= target else min(MAX_THREADS, -(-target // workers))
+
+    backlog = backlog or {}
+    base = {'short': max(1, cpus // 2), 'default': max(1, cpus // 4), 'long': 1 + cpus // 8}
+    caps = {'short': 2 * cpus, 'default': cpus, 'long': cpus}
+    rq = {q: max(base[q], min(caps[q], base[q] + backlog.get(q, 0) // BACKLOG_PER_WORKER)) for q in QUEUES}
+    # One worker per queue even when the memory for it is not there
+    fits = max(len(QUEUES), (budget - workers * WEB_WORKER_MB) // RQ_WORKER_MB)
+    while sum(rq.values()) > fits:
+        biggest = max(QUEUES, key=lambda q: (rq[q], QUEUES.index(q)))  # long gives way first
+        rq[biggest] -= 1
+
+    memory = workers * WEB_WORKER_MB + sum(rq.values()) * RQ_WORKER_MB
+    return {
+        'gunicorn_workers': workers,
+        'gunicorn_threads': threads,
+        'rq_workers': rq,
+        'web_concurrency': workers * threads,
+        'job_concurrency': sum(rq.values()),
+        'memory_mb': memory,
+        'budget_mb': budget,
+        'overcommit_mb': max(0, memory - budget),
+    }
+
+
+def program_spans(text):
+    """{program name: (start, end)} of the [program:...] sections"""
+    heads = list(re.finditer(r'^\[([^\]]+)\]\s*$', text, re.M))
+    spans = {}
+    for i, head in enumerate(heads):
+        if head.group(1).startswith('program:'):
+            end = heads[i + 1].start() if i + 1 < len(heads) else len(text)
+            spans[head.group(1)[len('program:'):]] = (head.start(), end)
+    return spans
+
+
+def program_role(name):
+    if name.endswith('-frappe-web'):
+        return 'web'
+    for queue in QUEUES:
+        if name.endswith(f'-frappe-{queue}-worker'):
+            return queue
+    return None
+
+
+def current(text):
+    """Counts in an existing supervisor config, same keys as recommend()"""
+    found = {'gunicorn_workers': None, 'gunicorn_threads': 1, 'rq_workers': {}}
+    for name, (start, end) in program_spans(text).items():
+        role = program_role(name)
+        section = text[start:end]
+        if role == 'web':
+            match = re.search(r'(?:-w|--workers)[ =](\d+)', section)
+            found['gunicorn_workers'] = int(match.group(1)) if match else None
+            match = re.search(r'--threads[ =](\d+)', section)
+            found['gunicorn_threads'] = int(match.group(1)) if match else 1
+        elif role:
+            match = re.search(r'^numprocs\s*=\s*(\d+)', section, re.M)
+            found['rq_workers'][role] = int(match.group(1)) if match else 1
+    return found
+
+
+def worker_counts(text, rq):
+    """numprocs per worker program: without a default-worker program the
+    short worker (which also listens on default) takes both shares"""
+    roles = {program_role(name) for name in program_spans(text)}
+    counts = dict(rq)
+    if 'default' not in roles:
+        counts['short'] += counts.pop('default')
+    return counts
+
+
+def render(text, plan):
+    """The supervisor config with the planned counts, everything else untouched"""
+    counts = worker_counts(text, plan['rq_workers'])
+    for name, (start, end) in sorted(program_spans(text).items(), key=lambda item: -item[1][0]):
+        role = program_role(name)
+        section = text[start:end]
+        if role == 'web':
+            section = re.sub(r'(-w|--workers)([ =])\d+', rf"\g<1>\g<2>{plan['gunicorn_workers']}", section, count=1)
+            if re.search(r'--threads[ =]\d+', section):
+                section = re.sub(r'--threads([ =])\d+', rf"--threads\g<1>{plan['gunicorn_threads']}", section, count=1)
+            elif plan['gunicorn_threads'] > 1:
+                section = re.sub(r'((?:-w|--workers)[ =]\d+)', rf"\1 --threads {plan['gunicorn_threads']}",
+                                 section, count=1)
+        elif role in counts:
+            numprocs = f'numprocs={counts[role]}'
+            if re.search(r'^numprocs\s*=', section, re.M):
+                section = re.sub(r'^numprocs\s*=\s*\d+', numprocs, section, count=1, flags=re.M)
+            elif counts[role] > 1:
+                lines = section.rstrip('\n').split('\n')
+                extra = [numprocs]
+                if not re.search(r'^process_name\s*=', section, re.M):
+                    extra.append('process_name=%(program_name)s-%(process_num)d')
+                section = '\n'.join(lines[:1] + extra + lines[1:]) + section[len(section.rstrip('\n')):]
+        text = text[:start] + section + text[end:]
+    return text
+
+
+def plan_changes(bench_dir, facts=None, backlog=None):
+    """(recommendation, current counts, diff) for the bench's supervisor config"""
+    facts = facts or tuning.host_facts()
+    if backlog is None:
+        backlog = queue_backlog(bench_dir)
+    recommended = dict(recommend(facts, backlog), backlog=backlog)
+    path = supervisor_conf(bench_dir)
+    old = tuning.read_text(path)
+    if old is None:
+        return recommended, None, ''
+    new = render(old, recommended)
+    diff = ''.join(difflib.unified_diff(old.splitlines(True), new.splitlines(True), path, path))
+    return recommended, current(old), diff
+
+
+def apply(bench_dir, facts=None, backlog=None):
+    """Rewrite the supervisor config and let supervisor restart what changed;
+    returns (recommendation, diff, log lines)"""
+    recommended, found, diff = plan_changes(bench_dir, facts, backlog)
+    if found is None:
+        return recommended, '', [f'⊘ {supervisor_conf(bench_dir)} not found - run bench setup production first']
+    if not diff:
+        return recommended, '', ['✓ Supervisor config already matches']
+    path = supervisor_conf(bench_dir)
+    tuning.write_file(path, render(tuning.read_text(path), recommended))
+    messages = [f'✓ Updated {path}']
+    # bench setup supervisor reads gunicorn_workers from here on the next regenerate
+    config_path = os.path.join(bench_dir, 'sites', 'common_site_config.json')
+    config = common_site_config(bench_dir)
+    if config and config.get('gunicorn_workers') != recommended['gunicorn_workers']:
+        config['gunicorn_workers'] = recommended['gunicorn_workers']
+        tuning.write_file(config_path, json.dumps(config, indent=1, sort_keys=True))
+        messages.append(f'✓ gunicorn_workers = {recommended["gunicorn_workers"]} in common_site_config.json')
+    for command in (['supervisorctl', 'reread'], ['supervisorctl', 'update']):
+        ok = tuning.run(command)
+        messages.append(f"{'✓' if ok else '✗'} {' '.join(command)}")
+    return recommended, diff, messages
+
+
+def summary(recommended):
+    rq = recommended['rq_workers']
+    lines = [f"gunicorn: {recommended['gunicorn_workers']} workers x {recommended['gunicorn_threads']} threads"
+             f" = {recommended['web_concurrency']} requests at once",
+             f"RQ workers: short {rq['short']}, default {rq['default']}, long {rq['long']}"
+             f" = {recommended['job_concurrency']} jobs at once",
+             f"Expected memory: ~{recommended['memory_mb']} MB of {recommended['budget_mb']} MB"
+             ' left after MariaDB, Redis and the OS']
+    if recommended['overcommit_mb']:
+        lines.append(f"⚠️ Overcommitted by ~{recommended['overcommit_mb']} MB: even the minimum processes"
+                     ' do not fit - add RAM or swap')
+    return lines
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Size gunicorn and RQ workers for this host')
+    parser.add_argument('--bench', help='bench directory (default: auto-detect)')
+    parser.add_argument('--apply', action='store_true', help='rewrite the supervisor config and reload')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    if not args.bench:
+        from doctor_checks import find_bench
+        args.bench = find_bench()
+    if not args.bench:
+        sys.exit('No bench found; pass --bench')
+
+    host = tuning.host_facts()
+    if args.apply:
+        result, changes, log = apply(args.bench, host)
+    else:
+        result, found, changes = plan_changes(args.bench, host)
+        log = [] if found is not None else [f'⊘ {supervisor_conf(args.bench)} not found']
+    if args.json:
+        print(json.dumps(dict(result, facts=host, diff=changes, log=log), indent=2))
+        sys.exit(0)
+    print(f'⚙️  Host: {tuning.describe(host)}')
+    waiting = result['backlog']
+    print('📬 Queue backlog: ' + (', '.join(f'{q} {waiting[q]}' for q in QUEUES) if waiting is not None
+                                  else 'queue Redis not reachable, sizing from cores and RAM only'))
+    for line in summary(result):
+        print(f'   {line}')
+    print(changes, end='')
+    if changes and not args.apply:
+        print('\nRun with --apply to rewrite the supervisor config')
+    for line in log:
+        print(line)
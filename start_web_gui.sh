@@ -17,6 +17,6 @@ fi
 echo "🚀 Starting web server..."
 echo ""
 
-# Run web installer
+# Run web installer (log streams on an asyncio loop, see async_server.py)
 cd "$(dirname "$0")"
-python3 web_installer.py
+python3 web_installer.py --async
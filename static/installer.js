@@ -0,0 +1,484 @@
+// One stream per console so a Doctor run does not cut off the install stream
+const eventSources = {};
+
+function switchTab(tabName) {
+    // Hide all tabs
+    document.querySelectorAll('.tab-content').forEach(t => t.classList.remove('active'));
+    document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
+
+    // Show selected tab
+    document.getElementById(tabName + '-tab').classList.add('active');
+    event.target.classList.add('active');
+}
+
+// INSTALL FUNCTIONS
+// Installer tab settings, shared by single and fleet installs (null if invalid)
+function installConfig() {
+    const username = document.getElementById('username').value;
+    const sitename = document.getElementById('sitename').value;
+    const mysql_pass = document.getElementById('mysql_pass').value;
+    const admin_pass = document.getElementById('admin_pass').value;
+
+    if (!username || !sitename) {
+        alert('Username and Site Name are required!');
+        return null;
+    }
+
+    if (mysql_pass.length < 6 || admin_pass.length < 6) {
+        alert('Passwords must be at least 6 characters!');
+        return null;
+    }
+
+    return {
+        username: username,
+        sitename: sitename,
+        version: document.getElementById('version').value,
+        mysql_pass: mysql_pass,
+        admin_pass: admin_pass,
+        prod_mode: document.getElementById('prod_mode').checked,
+        install_erpnext: document.getElementById('install_erpnext').checked,
+        system_upgrade: document.getElementById('system_upgrade').checked,
+        apt_cache_dir: document.getElementById('apt_cache_dir').value,
+        apt_offline: document.getElementById('apt_offline').checked,
+        bench_cache: document.getElementById('bench_cache').checked,
+        parallel: document.getElementById('parallel').checked,
+        resume: document.getElementById('resume').checked,
+        benchmark_after: document.getElementById('benchmark_after').checked
+    };
+}
+
+// The post-install benchmark needs nginx: without production mode nothing serves the site
+function syncBenchmarkAfter() {
+    const benchmarkAfter = document.getElementById('benchmark_after');
+    benchmarkAfter.disabled = !document.getElementById('prod_mode').checked;
+    if (benchmarkAfter.disabled) benchmarkAfter.checked = false;
+}
+
+function startInstallation() {
+    const data = installConfig();
+    if (!data) return;
+
+    if (!confirm('Start ERPNext installation?\n\n⏱ This will take 15-45 minutes.')) {
+        return;
+    }
+
+    fetch('/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            document.getElementById('startBtn').disabled = true;
+            document.getElementById('stopBtn').disabled = false;
+            connectEventStream('/stream', data.job_id);
+        }
+    });
+}
+
+function stopInstallation() {
+    if (confirm('Stop installation?')) {
+        fetch('/stop', {method: 'POST'});
+        if (eventSources['/stream']) eventSources['/stream'].close();
+        document.getElementById('startBtn').disabled = false;
+        document.getElementById('stopBtn').disabled = true;
+    }
+}
+
+// FLEET FUNCTIONS
+function startFleet() {
+    const data = installConfig();
+    if (!data) return;
+    data.hosts = document.getElementById('fleet_hosts').value;
+    data.ssh_user = document.getElementById('ssh_user').value;
+    data.ssh_password = document.getElementById('ssh_password').value;
+    data.ssh_key = document.getElementById('ssh_key').value;
+    data.concurrency = parseInt(document.getElementById('fleet_concurrency').value) || 1;
+    data.strict_host_keys = document.getElementById('strict_host_keys').checked;
+
+    if (!data.hosts.trim()) {
+        alert('Add at least one host!');
+        return;
+    }
+    if (!confirm('Install ERPNext on all listed hosts?')) {
+        return;
+    }
+
+    fetch('/fleet/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            document.getElementById('fleetHosts').innerHTML = '';
+            document.getElementById('fleetConsole').innerHTML = '';
+            document.getElementById('fleetBtn').disabled = true;
+            document.getElementById('fleetStopBtn').disabled = false;
+            connectEventStream('/fleet/stream', data.job_id);
+        } else {
+            alert(data.message);
+        }
+    });
+}
+
+function stopFleet() {
+    if (confirm('Stop the fleet install on all hosts?')) {
+        fetch('/fleet/stop', {method: 'POST'});
+    }
+}
+
+const HOST_ICONS = {queued: '⏳', connecting: '🔌', uploading: '📤', running: '🔄',
+                    success: '✅', failed: '❌', stopped: '⏹'};
+const fleetRows = {};
+
+// One row per host: state, step progress and the running steps or error
+function renderHost(data) {
+    let row = fleetRows[data.host];
+    if (!row) {
+        row = document.createElement('div');
+        row.className = 'host-row';
+        const name = document.createElement('span');
+        name.className = 'host-name';
+        name.textContent = data.host;
+        const state = document.createElement('span');
+        state.className = 'host-state';
+        const track = document.createElement('span');
+        track.className = 'report-track';
+        const bar = document.createElement('span');
+        bar.className = 'report-bar';
+        bar.style.width = '0%';
+        track.appendChild(bar);
+        const detail = document.createElement('span');
+        detail.className = 'host-detail';
+        row.append(name, state, track, detail);
+        document.getElementById('fleetHosts').appendChild(row);
+        fleetRows[data.host] = row;
+    }
+    const [, state, track, detail] = row.children;
+    if (data.total) {
+        track.firstChild.style.width = Math.round(data.step / data.total * 100) + '%';
+        detail.textContent = data.running && data.running.length ?
+            'Step ' + data.running.join(', ') : data.step + '/' + data.total + ' steps';
+    } else if (data.status) {
+        state.textContent = (HOST_ICONS[data.status] || '•') + ' ' + data.status;
+        track.firstChild.classList.toggle('error', data.status === 'failed');
+        if (data.error) detail.textContent = data.error;
+        else if (data.duration != null) detail.textContent = data.duration + 's';
+    }
+}
+
+// DOCTOR FUNCTIONS
+function runDoctor() {
+    document.getElementById('doctorBtn').disabled = true;
+    document.getElementById('doctorConsole').innerHTML = '<div>Running diagnostics...</div>';
+
+    document.getElementById('doctorChecks').innerHTML = '';
+
+    const data = {
+        auto_fix: document.getElementById('auto_fix').checked,
+        legacy: document.getElementById('legacy_doctor').checked
+    };
+
+    fetch('/doctor/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            connectEventStream('/doctor/stream', data.job_id);
+        }
+    });
+}
+
+const CHECK_ICONS = {ok: '✅', warn: '⚠️', error: '❌', critical: '🛑', skip: '⏭️', timeout: '⏱'};
+
+function renderCheck(r) {
+    const list = document.getElementById('doctorChecks');
+    let row = document.getElementById('check-' + r.id);
+    if (!row) {
+        row = document.createElement('div');
+        row.className = 'check-row';
+        row.id = 'check-' + r.id;
+        list.appendChild(row);
+    }
+    const cell = (cls, text) => {
+        const el = document.createElement('span');
+        el.className = cls;
+        el.textContent = text;
+        return el;
+    };
+    const evidence = cell('check-evidence', r.evidence.join('\n'));
+    if (r.fix && r.status !== 'ok') {
+        evidence.appendChild(cell('check-fix', '\n💡 ' + r.fix));
+    }
+    row.replaceChildren(
+        cell('check-icon', CHECK_ICONS[r.status] || '•'),
+        cell('check-name', r.site ? r.title + ' (' + r.site + ')' : r.title),
+        evidence,
+        cell('check-time', r.duration + 's'));
+}
+
+function clearDoctorOutput() {
+    document.getElementById('doctorChecks').innerHTML = '';
+    document.getElementById('doctorConsole').innerHTML = '<div>Output cleared. Ready for next diagnostic run...</div>';
+}
+
+// BENCHMARK FUNCTIONS
+function runBenchmark() {
+    const data = {
+        site: document.getElementById('bench_site').value || document.getElementById('sitename').value,
+        concurrency: parseInt(document.getElementById('bench_concurrency').value, 10),
+        duration: parseFloat(document.getElementById('bench_duration').value),
+        password: document.getElementById('bench_password').value
+    };
+    if (!data.site) {
+        alert('Site name is required!');
+        return;
+    }
+    document.getElementById('benchBtn').disabled = true;
+    document.getElementById('benchResults').innerHTML = '';
+    document.getElementById('benchConsole').innerHTML = '<div>Starting benchmark...</div>';
+
+    fetch('/benchmark/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            connectEventStream('/benchmark/stream', data.job_id);
+        } else {
+            alert(data.message);
+            document.getElementById('benchBtn').disabled = false;
+        }
+    });
+}
+
+function renderBenchmark(r) {
+    const row = document.createElement('div');
+    row.className = 'check-row';
+    const cell = (cls, text) => {
+        const el = document.createElement('span');
+        el.className = cls;
+        el.textContent = text;
+        return el;
+    };
+    let text = 'skipped: ' + r.skipped;
+    if (!r.skipped) {
+        text = r.p50 == null ? 'no successful responses' :
+            r.rps.toFixed(1) + ' req/s | p50 ' + r.p50 + ' ms, p95 ' + r.p95 + ' ms, p99 ' + r.p99 + ' ms';
+        if (r.errors) text += ' | ' + r.errors + ' of ' + r.requests + ' failed';
+        if (r.change) {
+            const sign = v => (v >= 0 ? '+' : '') + v + '%';
+            text += '\nvs previous run: req/s ' + sign(r.change.rps) + ', p95 ' + sign(r.change.p95);
+        }
+    }
+    row.append(
+        cell('check-icon', r.skipped ? '⏭️' : (r.p50 == null ? '❌' : '📈')),
+        cell('check-name', r.name + ' (' + r.path + ')'),
+        cell('check-evidence', text));
+    document.getElementById('benchResults').appendChild(row);
+}
+
+// UNINSTALL FUNCTIONS
+function confirmUninstall() {
+    const confirmed = prompt('Type "YES" to confirm uninstallation (all caps):');
+    if (confirmed !== 'YES') {
+        alert('Uninstallation cancelled.');
+        return;
+    }
+
+    const data = {
+        remove_packages: document.getElementById('remove_packages').checked,
+        backup_before: document.getElementById('backup_before').checked
+    };
+
+    document.getElementById('uninstallConsole').innerHTML = '<div>Starting uninstallation...</div>';
+
+    fetch('/uninstall/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(data)
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            connectEventStream('/uninstall/stream', data.job_id);
+        }
+    });
+}
+
+// CONSOLE
+// Consoles keep only the newest lines; a whole batch is added in one DOM update
+const MAX_CONSOLE_LINES = 2000;
+
+function appendLines(console, lines) {
+    const fragment = document.createDocumentFragment();
+    lines.slice(-MAX_CONSOLE_LINES).forEach(line => {
+        const div = document.createElement('div');
+        div.textContent = line;
+        fragment.appendChild(div);
+    });
+    console.appendChild(fragment);
+    let excess = console.childElementCount - MAX_CONSOLE_LINES;
+    while (excess-- > 0) console.removeChild(console.firstElementChild);
+    console.scrollTop = console.scrollHeight;
+}
+
+// PERFORMANCE REPORT
+// Waterfall of step start offsets and wall-clock durations
+function renderReport(report) {
+    const view = document.getElementById('reportView');
+    const total = Math.max(report.duration, 1);
+    view.innerHTML = '';
+    report.steps.filter(s => s.wall != null).forEach(s => {
+        const row = document.createElement('div');
+        row.className = 'report-row';
+        const label = document.createElement('span');
+        label.className = 'report-label';
+        label.textContent = 'Step ' + s.num + ': ' + s.title;
+        const track = document.createElement('span');
+        track.className = 'report-track';
+        const bar = document.createElement('span');
+        bar.className = 'report-bar' + (s.status === 'error' ? ' error' : '');
+        bar.style.left = ((s.started - report.started) / total * 100) + '%';
+        bar.style.width = (s.wall / total * 100) + '%';
+        track.appendChild(bar);
+        const value = document.createElement('span');
+        value.className = 'report-value';
+        value.textContent = s.wall.toFixed(1) + 's, CPU ' + (s.cpu_user + s.cpu_sys).toFixed(1) +
+            's, ' + Math.round(s.max_rss_kb / 1024) + ' MB';
+        row.append(label, track, value);
+        view.appendChild(row);
+    });
+    document.getElementById('reportSection').style.display = 'block';
+}
+
+// EVENT STREAM
+function connectEventStream(url, jobId) {
+    if (eventSources[url]) eventSources[url].close();
+    const eventSource = new EventSource(jobId ? url + '?job=' + jobId : url);
+    eventSources[url] = eventSource;
+
+    eventSource.addEventListener('log', function(e) {
+        const consoles = {
+            '/stream': 'console',
+            '/doctor/stream': 'doctorConsole',
+            '/fleet/stream': 'fleetConsole',
+            '/benchmark/stream': 'benchConsole',
+            '/uninstall/stream': 'uninstallConsole'
+        };
+        appendLines(document.getElementById(consoles[url] || 'console'), e.data.split('\n'));
+    });
+
+    eventSource.addEventListener('progress', function(e) {
+        const data = JSON.parse(e.data);
+        if (data.host) return renderHost(data);
+        const percent = Math.round((data.step / data.total) * 100);
+        const progressBar = document.getElementById('progressBar');
+        progressBar.style.width = percent + '%';
+        let text = percent + '% - ' + data.step + '/' + data.total + ' steps';
+        if (data.running && data.running.length) {
+            text += ' | running: Step ' + data.running.join(', Step ');
+        }
+        progressBar.textContent = text;
+    });
+
+    eventSource.addEventListener('package', function(e) {
+        const data = JSON.parse(e.data);
+        if (data.host) return;
+        const items = document.querySelectorAll('#packageList .package-item');
+        if (items[data.step]) {
+            const icon = items[data.step].querySelector('.package-icon');
+            if (data.status === 'running') {
+                icon.textContent = '🔄';
+                icon.classList.add('spinning');
+            } else if (data.status === 'success') {
+                icon.textContent = '✅';
+                icon.classList.remove('spinning');
+            } else if (data.status === 'error') {
+                icon.textContent = '❌';
+                icon.classList.remove('spinning');
+            } else if (data.status === 'skipped') {
+                icon.textContent = '⏭️';
+                icon.classList.remove('spinning');
+            } else if (data.status === 'verified') {
+                icon.textContent = '☑️';
+                icon.classList.remove('spinning');
+            }
+            if (data.duration != null) {
+                items[data.step].querySelector('.package-time').textContent = data.duration + 's';
+            }
+        }
+    });
+
+    eventSource.addEventListener('host', function(e) {
+        renderHost(JSON.parse(e.data));
+    });
+
+    eventSource.addEventListener('check', function(e) {
+        renderCheck(JSON.parse(e.data));
+    });
+
+    eventSource.addEventListener('benchmark', function(e) {
+        renderBenchmark(JSON.parse(e.data));
+    });
+
+    eventSource.addEventListener('report', function(e) {
+        const data = JSON.parse(e.data);
+        fetch('/report/' + data.job_id)
+        .then(res => res.json())
+        .then(renderReport);
+    });
+
+    // Job finished and fully delivered: stop the browser from reconnecting
+    eventSource.addEventListener('eof', function(e) {
+        eventSource.close();
+    });
+
+    eventSource.addEventListener('complete', function(e) {
+        const data = JSON.parse(e.data);
+        alert(data.message);
+        document.getElementById('startBtn').disabled = false;
+        document.getElementById('stopBtn').disabled = true;
+        document.getElementById('doctorBtn').disabled = false;
+        document.getElementById('fleetBtn').disabled = false;
+        document.getElementById('fleetStopBtn').disabled = true;
+        document.getElementById('benchBtn').disabled = false;
+        // No close() here: the report and step timings follow 'complete';
+        // the stream is closed on 'eof' once everything has arrived
+    });
+}
+
+// Follow jobs that are already running (e.g. started from another tab)
+fetch('/status')
+.then(res => res.json())
+.then(data => {
+    if (data.install_running) {
+        document.getElementById('startBtn').disabled = true;
+        document.getElementById('stopBtn').disabled = false;
+        connectEventStream('/stream', data.install_job);
+    }
+    if (data.doctor_running) {
+        document.getElementById('doctorBtn').disabled = true;
+        connectEventStream('/doctor/stream', data.doctor_job);
+    }
+    if (data.fleet_running) {
+        document.getElementById('fleetBtn').disabled = true;
+        document.getElementById('fleetStopBtn').disabled = false;
+        connectEventStream('/fleet/stream', data.fleet_job);
+    }
+    if (data.benchmark_running) {
+        document.getElementById('benchBtn').disabled = true;
+        connectEventStream('/benchmark/stream', data.benchmark_job);
+    }
+    if (data.uninstall_running) {
+        connectEventStream('/uninstall/stream', data.uninstall_job);
+    }
+});
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+ERPNext Web Installer - streaming benchmark
+Floods run_installation() with synthetic step output (install_step_bodies()
+swapped for emitters printing timestamped lines at a set rate and width),
+attaches N SSE clients to /stream and reports the lines/s they receive,
+emit-to-client latency and the server process's CPU time and RSS. Every
+run is kept in the job store and compared with the last run of the same
+shape, so a slower streaming path shows up before a customer install does.
+
+    python3 streambench.py --lines 100000 --clients 10
+    python3 streambench.py --suite --max-regression 30
+
+Exits 1 when a client missed lines or lines/s fell past --max-regression.
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import re
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import job_store
+import probes
+
+MODES = ('threaded', 'async')
+DEFAULT_LINES = 100000
+DEFAULT_WIDTH = 120
+DEFAULT_CLIENTS = 10
+# Each run of --suite; rate 0 means as fast as the server takes the lines
+SUITE = [
+    {'lines': 10000, 'rate': 0, 'width': DEFAULT_WIDTH, 'clients': 1},
+    {'lines': 100000, 'rate': 0, 'width': DEFAULT_WIDTH, 'clients': 10},
+    {'lines': 100000, 'rate': 20000, 'width': 400, 'clients': 100},
+    {'lines': 1000000, 'rate': 0, 'width': DEFAULT_WIDTH, 'clients': 10},
+]
+STARTUP_TIMEOUT = 20
+RUN_TIMEOUT = 900
+READ_BYTES = 64 * 1024
+DROPPED = re.compile(rb'\.\.\. (\d+) earlier events no longer buffered')
+# A flood line on the stream; parallel installs tag each line with "[step] "
+FLOOD_LINE = re.compile(rb'data: (?:\[\d+\] )?T=([\d.]+) ')
+
+# Runs as each step's body: `lines` lines of `width` characters, every line
+# starting with the wall-clock time it was written (T=<epoch seconds>)
+EMITTER = r'''
+import sys, time
+lines, rate, width, tag = int(sys.argv[1]), float(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+batch = max(1, min(1000, int(rate / 100))) if rate else 1000
+started = time.time()
+sent = 0
+while sent < lines:
+    n = min(batch, lines - sent)
+    now = time.time()
+    head = f"T={now:.6f} {tag} "
+    sys.stdout.write("".join(f"{head}{i:<8}".ljust(width) + "\n" for i in range(sent, sent + n)))
+    sys.stdout.flush()
+    sent += n
+    if rate:
+        delay = started + sent / rate - time.time()
+        if delay > 0:
+            time.sleep(delay)
+'''
+
+
+class StreamBenchError(Exception):
+    pass
+
+
+def flood_bodies(steps, lines, rate, width):
+    """Replacement for install_step_bodies(): the lines split over the steps
+    that run without optional config flags"""
+    flooded = [step['num'] for step in steps if 'when' not in step]
+    share, extra = divmod(lines, len(flooded))
+    emitter = f'{shlex.quote(sys.executable)} -c {shlex.quote(EMITTER)}'
+    bodies = {step['num']: 'true' for step in steps}
+    for i, num in enumerate(flooded):
+        bodies[num] = f'{emitter} {share + (i < extra)} {rate} {width} step{num}'
+    return lambda config: bodies
+
+
+def serve(port, mode, lines, rate, width, store_path):
+    """The installer with flood steps, no sudo and no saved install state"""
+    import web_installer
+    web_installer.STEP_COMMAND = ['bash']
+    web_installer.install_step_bodies = flood_bodies(web_installer.INSTALL_STEPS, lines, rate, width)
+    web_installer.load_install_state = dict
+    web_installer.save_install_state = lambda job, state: None
+    web_installer.broker.store = job_store.open_store(store_path) if store_path else None
+    if mode == 'async':
+        import async_server
+        async_server.run(host='127.0.0.1', port=port)
+    else:
+        web_installer.app.run(host='127.0.0.1', port=port, debug=False, threaded=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_cpu(pid):
+    """User + system CPU seconds of a process (all its threads)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def process_memory(pid):
+    """(current, peak) resident size of a process in KB"""
+    found = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                found[line[:5]] = int(line.split()[1])
+    return found.get('VmRSS', 0), found.get('VmHWM', 0)
+
+
+def request_json(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=STARTUP_TIMEOUT)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+    finally:
+        conn.close()
+
+
+def wait_ready(server, port):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise StreamBenchError(f'server exited with {server.returncode}')
+        try:
+            if request_json(port, 'GET', '/status')[0] == 200:
+                return
+        except (OSError, ValueError, http.client.HTTPException):
+            time.sleep(0.1)
+    raise StreamBenchError(f'server not answering on port {port} after {STARTUP_TIMEOUT}s')
+
+
+async def watch(port, job_id, query):
+    """One SSE client reading the job to its eof event.
+
+    Counts the flood lines it receives and, for each read, the latency of
+    the oldest line in it (time received minus the T= time it was written).
+    """
+    stats = {'lines': 0, 'dropped': 0, 'latencies': [], 'first': None, 'last': None, 'eof': False}
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET /stream?job={job_id}{query} HTTP/1.0\r\nHost: localhost\r\n'
+                     'Accept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        tail = b''
+        while True:
+            chunk = await reader.read(READ_BYTES)
+            if not chunk:
+                break
+            now = time.time()
+            data = tail + chunk
+            cut = data.rfind(b'\n') + 1
+            data, tail = data[:cut], data[cut:]
+            status_line = data[:data.find(b'\n')] if data.startswith(b'HTTP/') else None
+            if status_line and b' 200 ' not in status_line:
+                raise StreamBenchError(f'stream refused: {status_line.decode().strip()}')
+            first = FLOOD_LINE.search(data)
+            if first:
+                count = len(FLOOD_LINE.findall(data, first.start()))
+                written = float(first.group(1))
+                stats['latencies'].append((now - written) * 1000)
+                stats['first'] = stats['first'] or written
+                stats['last'] = now
+                stats['lines'] += count
+            for match in DROPPED.finditer(data):
+                stats['dropped'] += int(match.group(1))
+            if b'event: eof' in data:
+                stats['eof'] = True
+                break
+    finally:
+        writer.close()
+    return stats
+
+
+async def watch_all(port, job_id, query, clients):
+    return await asyncio.wait_for(asyncio.gather(*[watch(port, job_id, query) for _ in range(clients)]),
+                                  RUN_TIMEOUT)
+
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def flood(lines=DEFAULT_LINES, rate=0, width=DEFAULT_WIDTH, clients=DEFAULT_CLIENTS, mode='threaded',
+          parallel=False, batch_ms=None, store=True, emit=print):
+    """Start a flooded installer, watch it with `clients` streams; returns the result dict"""
+    params = {'lines': int(lines), 'rate': rate, 'width': int(width), 'clients': int(clients), 'mode': mode,
+              'parallel': bool(parallel), 'batch_ms': batch_ms, 'store': bool(store)}
+    work_dir = tempfile.mkdtemp(prefix='erpnext_streambench_')
+    port = free_port()
+    log_path = os.path.join(work_dir, 'server.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', str(port), '--mode', mode,
+             '--lines', str(lines), '--rate', str(rate), '--width', str(width)]
+            + (['--store-path', os.path.join(work_dir, 'jobs.db')] if store else []),
+            stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        wait_ready(server, port)
+        rss_idle, _ = process_memory(server.pid)
+        cpu_before = process_cpu(server.pid)
+        emit(f"🌊 {lines} lines x {width} chars"
+             f"{f' at {rate:g} lines/s per step' if rate else ''} → {clients} {mode} clients...")
+        started = time.time()
+        code, reply = request_json(port, 'POST', '/start', {
+            'username': 'bench', 'sitename': 'bench.local', 'version': '15', 'mysql_pass': 'bench',
+            'admin_pass': 'bench', 'parallel': bool(parallel)})
+        if code != 200 or not reply.get('success'):
+            raise StreamBenchError(f'/start failed: {reply}')
+        query = f'&batch_ms={batch_ms}' if batch_ms is not None else ''
+        watched = asyncio.run(watch_all(port, reply['job_id'], query, clients))
+        elapsed = time.time() - started
+        cpu = process_cpu(server.pid) - cpu_before
+        rss, rss_peak = process_memory(server.pid)
+    except (asyncio.TimeoutError, OSError) as e:
+        raise StreamBenchError(f'{type(e).__name__}: {e}')
+    except StreamBenchError:
+        with open(log_path, errors='replace') as f:
+            emit(f.read()[-2000:])
+        raise
+    finally:
+        server.terminate()
+        try:
+            server.wait(5)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = [value for stats in watched for value in stats['latencies']]
+    received = [stats['lines'] for stats in watched]
+    rates = [stats['lines'] / (stats['last'] - stats['first']) for stats in watched
+             if stats['lines'] and stats['last'] > stats['first']]
+    summary = probes.latency_summary(latencies)
+    return {
+        'params': params,
+        'host': socket.gethostname(),
+        'started': started,
+        'duration': round(elapsed, 2),
+        'lines_min': min(received),
+        'lines_max': max(received),
+        'incomplete': sum(1 for stats in watched if not stats['eof']),
+        'dropped': sum(stats['dropped'] for stats in watched),
+        'lines_per_s': round(sum(rates) / len(rates)) if rates else 0,
+        'total_lines_per_s': round(sum(received) / elapsed),
+        'p50': round(summary['p50'], 1) if latencies else None,
+        'p95': round(summary['p95'], 1) if latencies else None,
+        'p99': round(summary['p99'], 1) if latencies else None,
+        'max': round(max(latencies), 1) if latencies else None,
+        'cpu_seconds': round(cpu, 2),
+        'cpu_percent': round(cpu * 100 / elapsed, 1),
+        'rss_idle_mb': round(rss_idle / 1024, 1),
+        'rss_mb': round(rss / 1024, 1),
+        'rss_peak_mb': round(rss_peak / 1024, 1),
+    }
+
+
+def format_result(result):
+    p = result['params']
+    lines = [f"{p['lines']} lines, {p['clients']} {p['mode']} clients: "
+             f"{result['lines_per_s']:,} lines/s per client ({result['total_lines_per_s']:,} delivered/s in all)",
+             f"   latency p50 {result['p50']} ms, p95 {result['p95']} ms, p99 {result['p99']} ms, max {result['max']} ms",
+             f"   server CPU {result['cpu_seconds']}s ({result['cpu_percent']}%),"
+             f" RSS {result['rss_idle_mb']} → {result['rss_peak_mb']} MB peak"]
+    if result['lines_min'] < p['lines'] or result['dropped'] or result['incomplete']:
+        lines.append(f"   ⚠️ {result['lines_min']}/{p['lines']} lines reached the slowest client"
+                     f" ({result['dropped']} reported dropped, {result['incomplete']} streams cut short)")
+    return lines
+
+
+def previous_run(store, params):
+    """The last stored run with the same parameters on this host"""
+    if store is None:
+        return None
+    for job in store.list_jobs('streambench', limit=100):
+        stored = store.get_job(job['id'])
+        report = stored and stored['report']
+        if report and report.get('params') == params and report.get('host') == socket.gethostname():
+            return dict(report, job_id=job['id'])
+    return None
+
+
+def compare(result, previous):
+    """Change in lines/s and p95 against an earlier run, in percent"""
+    changes = {}
+    if previous.get('lines_per_s'):
+        changes['lines_per_s'] = round((result['lines_per_s'] - previous['lines_per_s']) * 100
+                                       / previous['lines_per_s'], 1)
+    if previous.get('p95') and result['p95'] is not None:
+        changes['p95'] = round((result['p95'] - previous['p95']) * 100 / previous['p95'], 1)
+    return changes
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure how fast installer output reaches SSE clients')
+    parser.add_argument('--lines', type=int, default=DEFAULT_LINES, help='lines over the whole install')
+    parser.add_argument('--rate', type=float, default=0, help='lines/s per running step (0: unthrottled)')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help='characters per line')
+    parser.add_argument('-c', '--clients', type=int, default=DEFAULT_CLIENTS, help='SSE clients watching')
+    parser.add_argument('--mode', choices=MODES, default='threaded', help='Flask threads or async_server.py')
+    parser.add_argument('--parallel', action='store_true', help='run independent steps in parallel')
+    parser.add_argument('--batch-ms', type=int, help='?batch_ms= for the streams (default: server default)')
+    parser.add_argument('--no-store', action='store_true', help='server without the SQLite job store')
+    parser.add_argument('--suite', action='store_true', help='run the preset matrix (10k to 1M lines)')
+    parser.add_argument('--max-regression', type=float,
+                        help='exit 1 when lines/s fell more than this many percent since the last same run')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--store-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.mode, args.lines, args.rate, args.width, args.store_path)
+        sys.exit(0)
+
+    raise_fd_limit()
+    runs = ([dict(run, mode=args.mode) for run in SUITE] if args.suite else
+            [{'lines': args.lines, 'rate': args.rate, 'width': args.width, 'clients': args.clients,
+              'mode': args.mode}])
+    show = (lambda line: None) if args.json else (lambda line: print(line, flush=True))
+    store = job_store.open_store()
+    results = []
+    failed = False
+    for run in runs:
+        try:
+            result = flood(parallel=args.parallel, batch_ms=args.batch_ms, store=not args.no_store,
+                           emit=show, **run)
+        except StreamBenchError as e:
+            show(f'❌ {e}')
+            failed = True
+            continue
+        previous = previous_run(store, result['params'])
+        if previous:
+            result['compared_to'] = previous['job_id']
+            result['changes'] = compare(result, previous)
+        record = store.start_job(uuid.uuid4().hex[:12], 'streambench', result['started'],
+                                 result['params']) if store else None
+        if record:
+            for line in format_result(result):
+                record.add_line(line)
+            record.finish(0, result)
+        for line in format_result(result):
+            show(line)
+        failed = failed or result['lines_min'] < result['params']['lines']
+        changes = result.get('changes')
+        if changes:
+            show(f"   vs {time.strftime('%Y-%m-%d %H:%M', time.localtime(previous['started']))}: "
+                 + ', '.join(f'{name} {change:+.1f}%' for name, change in changes.items()))
+            if args.max_regression is not None and changes.get('lines_per_s', 0) < -args.max_regression:
+                show(f"   ❌ lines/s fell more than {args.max_regression:g}%")
+                failed = True
+        results.append(result)
+    if args.json:
+        print(json.dumps(results if args.suite else (results[0] if results else None), indent=2))
+    sys.exit(1 if failed else 0)
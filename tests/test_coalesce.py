@@ -0,0 +1,41 @@
+from web_installer import LOG_PREFIX, coalesce
+
+
+def log(line):
+    return LOG_PREFIX + line
+
+
+def test_log_lines_become_one_multiline_frame():
+    frames = coalesce(10, [log('a'), log('b'), log('c')], 50)
+    assert frames == ['id: 12\nevent: log\ndata: a\ndata: b\ndata: c\n\n']
+
+
+def test_frames_split_at_max_lines_and_carry_last_id():
+    frames = coalesce(0, [log(str(i)) for i in range(5)], 2)
+    assert frames == [
+        'id: 1\nevent: log\ndata: 0\ndata: 1\n\n',
+        'id: 3\nevent: log\ndata: 2\ndata: 3\n\n',
+        'id: 4\nevent: log\ndata: 4\n\n',
+    ]
+
+
+def test_other_events_flush_pending_lines_and_keep_order():
+    status = 'event: status\ndata: {"state": "done"}'
+    frames = coalesce(5, [log('a'), log('b'), status, log('c')], 50)
+    assert frames == [
+        'id: 6\nevent: log\ndata: a\ndata: b\n\n',
+        f'id: 7\n{status}\n\n',
+        'id: 8\nevent: log\ndata: c\n\n',
+    ]
+
+
+def test_every_id_is_covered_once():
+    msgs = [log('x')] * 7 + ['event: ping\ndata: '] + [log('y')] * 3
+    frames = coalesce(100, msgs, 3)
+    ids = [int(f.split('\n', 1)[0][len('id: '):]) for f in frames]
+    assert ids == sorted(ids) and ids[-1] == 100 + len(msgs) - 1
+    assert sum(f.count('data: x') + f.count('data: y') for f in frames) == 10
+
+
+def test_empty_buffer_yields_nothing():
+    assert coalesce(0, [], 50) == []
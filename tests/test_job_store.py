@@ -0,0 +1,100 @@
+import pytest
+
+import job_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, 'CHUNK_LINES', 4)
+    monkeypatch.setattr(job_store, 'FLUSH_SECONDS', 3600)
+    return job_store.JobStore(str(tmp_path / 'jobs.db'))
+
+
+def record_job(store, job_id, lines, kind='install', config=None, finish=True):
+    record = store.start_job(job_id, kind, 1000.0, config)
+    for line in lines:
+        record.add_line(line)
+    if finish:
+        record.finish(0)
+    return record
+
+
+def test_read_lines_across_chunks(store):
+    lines = [f'line {i}' for i in range(10)]
+    record_job(store, 'a', lines)
+    assert store.read_lines('a')['lines'] == lines
+    page = store.read_lines('a', 3, 9)
+    assert page == {'start': 3, 'end': 9, 'total': 10, 'lines': lines[3:9]}
+    assert store.read_lines('a', 8, 50)['lines'] == lines[8:]
+    assert store.read_lines('a', 20)['lines'] == []
+    assert store.read_lines('missing') is None
+
+
+def test_read_lines_includes_unflushed_lines_of_a_running_job(store):
+    lines = [f'line {i}' for i in range(6)]  # one chunk of 4 written, 2 buffered
+    record_job(store, 'a', lines, finish=False)
+    assert store.read_lines('a', 2)['lines'] == lines[2:]
+
+
+def test_multi_line_entries_count_as_several_lines(store):
+    record_job(store, 'a', ['one\ntwo', 'three'])
+    assert store.read_lines('a')['lines'] == ['one', 'two', 'three']
+
+
+def test_read_lines_caps_the_range(store, monkeypatch):
+    monkeypatch.setattr(job_store, 'MAX_RANGE_LINES', 3)
+    record_job(store, 'a', [str(i) for i in range(10)])
+    assert store.read_lines('a', 2)['lines'] == ['2', '3', '4']
+
+
+def test_rowid_packs_job_and_line():
+    rowid = (7 << job_store.LINE_BITS) | 123
+    assert rowid >> job_store.LINE_BITS == 7
+    assert rowid & job_store.LINE_MASK == 123
+
+
+def test_search_newest_first_with_job_and_line(store):
+    if not store.fts:
+        pytest.skip('SQLite without FTS5')
+    record_job(store, 'a', ['start', 'ERROR disk full', 'ok', 'ok', 'ok', 'ERROR disk full again'],
+               config={'sitename': 'a.local'})
+    record_job(store, 'b', ['ERROR disk full'], kind='doctor')
+    hits = store.search('disk full')
+    assert [(h['job']['id'], h['line'], h['text']) for h in hits] == [
+        ('b', 0, 'ERROR disk full'),
+        ('a', 5, 'ERROR disk full again'),
+        ('a', 1, 'ERROR disk full'),
+    ]
+    assert hits[1]['job']['site'] == 'a.local'
+    assert [h['line'] for h in store.search('disk', job_id='a')] == [5, 1]
+    assert [h['job']['id'] for h in store.search('disk', kind='doctor')] == ['b']
+    assert store.search('disk', job_id='missing') == []
+
+
+def test_search_pages_with_before(store):
+    if not store.fts:
+        pytest.skip('SQLite without FTS5')
+    record_job(store, 'a', [f'match {i}' for i in range(5)])
+    first = store.search('match', limit=2)
+    second = store.search('match', limit=2, before=first[-1]['rowid'])
+    assert [h['line'] for h in first + second] == [4, 3, 2, 1]
+
+
+def test_search_reports_step_and_fleet_host(store):
+    if not store.fts:
+        pytest.skip('SQLite without FTS5')
+    record = store.start_job('f', 'fleet', 1000.0)
+    record.add_line('[web1] preparing')
+    record.step('web1', 3, 'running')
+    record.add_line('[web1] apt failed')
+    record.finish(1)
+    hit, = store.search('apt failed')
+    assert (hit['host'], hit['step'], hit['line']) == ('web1', 3, 1)
+
+
+def test_reindex_rebuilds_the_search_index(store):
+    if not store.fts:
+        pytest.skip('SQLite without FTS5')
+    record_job(store, 'a', ['alpha', 'beta'])
+    assert store.reindex() == 2
+    assert [h['text'] for h in store.search('beta')] == ['beta']
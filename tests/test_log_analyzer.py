@@ -0,0 +1,76 @@
+import io
+
+import log_analyzer
+
+
+def scan(data, offset=0):
+    counts, samples = {}, []
+    end, lines, errors = log_analyzer.scan(io.BytesIO(data), offset, counts, samples)
+    return end, lines, errors, counts, samples
+
+
+def test_counts_each_rule_once_per_line():
+    _, lines, errors, counts, _ = scan(b'Redis cache error: redis connection refused\n')
+    assert (lines, errors) == (1, 1)
+    assert counts == {'redis': 1}
+
+
+def test_sub_rule_also_counts_for_its_category():
+    _, _, _, counts, _ = scan(b'Error: database is locked\n')
+    assert counts == {'db_lock': 1, 'database': 1}
+
+
+def test_rules_starting_at_the_same_position_all_count():
+    # 'doctype' (invalid.*doctype) and 'session' (invalid.*token) both start at "invalid"
+    _, _, _, counts, _ = scan(b'Error: invalid doctype in token\n')
+    assert counts == {'doctype': 1, 'session': 1}
+
+
+def test_rules_at_different_positions_all_count():
+    _, _, _, counts, _ = scan(b'Error: worker failed after timeout, no space left\n')
+    assert counts == {'workers': 1, 'timeout': 1, 'disk': 1}
+
+
+def test_only_gated_lines_are_matched():
+    _, lines, errors, counts, _ = scan(b'redis cache warmed\nnginx reloaded\n')
+    assert (lines, errors, counts) == (2, 0, {})
+
+
+def test_trailing_partial_line_is_left_for_next_run():
+    data = b'Error: deadlock found\nError: no space'
+    end, lines, errors, counts, _ = scan(data)
+    assert end == data.index(b'\n') + 1
+    assert (lines, errors) == (1, 1)
+    assert 'disk' not in counts
+    end, lines, _, counts, _ = scan(data + b' left\n', end)
+    assert lines == 1
+    assert counts == {'disk': 1}
+
+
+def test_keeps_the_newest_samples():
+    data = b''.join(b'Error %d: traceback\n' % i for i in range(10))
+    _, _, errors, _, samples = scan(data)
+    assert errors == 10
+    assert samples == [f'Error {i}: traceback' for i in range(7, 10)]
+
+
+def test_chunk_boundary_inside_a_line(monkeypatch):
+    monkeypatch.setattr(log_analyzer, 'CHUNK_SIZE', 7)
+    _, lines, errors, counts, _ = scan(b'ok line\nError: smtp auth\nfine\n')
+    assert (lines, errors) == (3, 1)
+    assert counts == {'email': 1}
+
+
+def test_analyze_reads_only_new_bytes(tmp_path):
+    logs = tmp_path / 'logs'
+    logs.mkdir()
+    log = logs / 'web.error.log'
+    log.write_bytes(b'Error: deadlock found\n')
+    state = tmp_path / 'state.json'
+    first = log_analyzer.analyze(str(tmp_path), str(state))
+    assert (first['lines'], first['new']) == (1, {'db_lock': 1, 'database': 1})
+    with open(log, 'ab') as f:
+        f.write(b'Error: redis down\n')
+    second = log_analyzer.analyze(str(tmp_path), str(state))
+    assert (second['lines'], second['new']) == (1, {'redis': 1})
+    assert second['window'] == {'db_lock': 1, 'database': 1, 'redis': 1}
@@ -0,0 +1,143 @@
+import sizing
+
+# As written by `bench setup supervisor` (v15: short and long workers only)
+SUPERVISOR_CONF = """; Notes:
+; priority=1 --> Lower priorities indicate programs that start first and shut down last
+; killasgroup=true --> send kill signal to child processes too
+
+[program:frappe-bench-frappe-web]
+command=/home/frappe/frappe-bench/env/bin/gunicorn -b 127.0.0.1:8000 -w 5 --max-requests 5000 --max-requests-jitter 500 -t 120 frappe.app:application --preload
+priority=4
+autostart=true
+autorestart=true
+stdout_logfile=/home/frappe/frappe-bench/logs/web.log
+stderr_logfile=/home/frappe/frappe-bench/logs/web.error.log
+stopwaitsecs=40
+killasgroup=true
+user=frappe
+directory=/home/frappe/frappe-bench/sites
+startretries=10
+
+[program:frappe-bench-frappe-schedule]
+command=/usr/local/bin/bench schedule
+priority=3
+autostart=true
+autorestart=true
+stdout_logfile=/home/frappe/frappe-bench/logs/schedule.log
+stderr_logfile=/home/frappe/frappe-bench/logs/schedule.error.log
+user=frappe
+directory=/home/frappe/frappe-bench
+startretries=10
+
+[program:frappe-bench-frappe-short-worker]
+command=/usr/local/bin/bench worker --queue short,default
+priority=4
+autostart=true
+autorestart=true
+stdout_logfile=/home/frappe/frappe-bench/logs/worker.log
+stderr_logfile=/home/frappe/frappe-bench/logs/worker.error.log
+user=frappe
+stopwaitsecs=360
+directory=/home/frappe/frappe-bench
+killasgroup=true
+numprocs=1
+process_name=%(program_name)s-%(process_num)d
+startretries=10
+
+[program:frappe-bench-frappe-long-worker]
+command=/usr/local/bin/bench worker --queue long,default,short
+priority=4
+autostart=true
+autorestart=true
+stdout_logfile=/home/frappe/frappe-bench/logs/worker.log
+stderr_logfile=/home/frappe/frappe-bench/logs/worker.error.log
+user=frappe
+stopwaitsecs=1560
+directory=/home/frappe/frappe-bench
+killasgroup=true
+numprocs=1
+process_name=%(program_name)s-%(process_num)d
+startretries=10
+
+[program:frappe-bench-redis-cache]
+command=/usr/bin/redis-server /home/frappe/frappe-bench/config/redis_cache.conf
+priority=1
+autostart=true
+autorestart=true
+stdout_logfile=/home/frappe/frappe-bench/logs/redis-cache.log
+stderr_logfile=/home/frappe/frappe-bench/logs/redis-cache.error.log
+user=frappe
+directory=/home/frappe/frappe-bench/sites
+
+[group:frappe-bench-web]
+programs=frappe-bench-frappe-web
+
+[group:frappe-bench-workers]
+programs=frappe-bench-frappe-schedule,frappe-bench-frappe-short-worker,frappe-bench-frappe-long-worker
+
+[group:frappe-bench-redis]
+programs=frappe-bench-redis-cache
+"""
+
+PLAN = {'gunicorn_workers': 9, 'gunicorn_threads': 2, 'rq_workers': {'short': 3, 'default': 2, 'long': 1}}
+
+
+def test_current_reads_bench_config():
+    assert sizing.current(SUPERVISOR_CONF) == {
+        'gunicorn_workers': 5, 'gunicorn_threads': 1, 'rq_workers': {'short': 1, 'long': 1}}
+
+
+def test_render_round_trips_through_current():
+    rendered = sizing.render(SUPERVISOR_CONF, PLAN)
+    # No default-worker program: the short worker takes the default share
+    assert sizing.current(rendered) == {
+        'gunicorn_workers': 9, 'gunicorn_threads': 2, 'rq_workers': {'short': 5, 'long': 1}}
+    assert '-w 9 --threads 2 --max-requests 5000' in rendered
+
+
+def test_render_only_touches_the_counts():
+    rendered = sizing.render(SUPERVISOR_CONF, PLAN)
+    changed = [(old, new) for old, new in zip(SUPERVISOR_CONF.splitlines(), rendered.splitlines()) if old != new]
+    assert len(rendered.splitlines()) == len(SUPERVISOR_CONF.splitlines())
+    assert [new for _, new in changed] == [
+        'command=/home/frappe/frappe-bench/env/bin/gunicorn -b 127.0.0.1:8000 -w 9 --threads 2 --max-requests 5000'
+        ' --max-requests-jitter 500 -t 120 frappe.app:application --preload',
+        'numprocs=5',
+    ]
+
+
+def test_render_is_idempotent():
+    rendered = sizing.render(SUPERVISOR_CONF, PLAN)
+    assert sizing.render(rendered, PLAN) == rendered
+    back = dict(PLAN, gunicorn_workers=5, gunicorn_threads=1, rq_workers={'short': 1, 'default': 0, 'long': 1})
+    assert sizing.current(sizing.render(rendered, back)) == sizing.current(SUPERVISOR_CONF)
+
+
+def test_render_adds_numprocs_where_missing():
+    text = ('[program:frappe-bench-frappe-default-worker]\n'
+            'command=/usr/local/bin/bench worker --queue default\n'
+            'autostart=true\n')
+    rendered = sizing.render(text, PLAN)
+    assert rendered.splitlines()[1:3] == ['numprocs=2', 'process_name=%(program_name)s-%(process_num)d']
+    assert sizing.current(rendered)['rq_workers'] == {'default': 2}
+
+
+def test_recommend_fits_budget_on_a_large_host():
+    plan = sizing.recommend({'mem_mb': 16384, 'cpus': 4, 'rotational': False})
+    assert plan['gunicorn_workers'] == 9
+    assert plan['overcommit_mb'] == 0
+    assert plan['memory_mb'] <= plan['budget_mb']
+
+
+def test_recommend_reports_overcommit_on_a_small_host():
+    plan = sizing.recommend({'mem_mb': 1024, 'cpus': 2, 'rotational': False})
+    assert plan['gunicorn_workers'] == 2
+    assert plan['rq_workers'] == {'short': 1, 'default': 1, 'long': 1}
+    assert plan['overcommit_mb'] == plan['memory_mb'] - plan['budget_mb'] > 0
+    assert 'Overcommitted' in sizing.summary(plan)[-1]
+
+
+def test_recommend_adds_workers_for_a_backlog():
+    quiet = sizing.recommend({'mem_mb': 16384, 'cpus': 4, 'rotational': False})
+    busy = sizing.recommend({'mem_mb': 16384, 'cpus': 4, 'rotational': False}, {'long': 250})
+    assert busy['rq_workers']['long'] == quiet['rq_workers']['long'] + 2
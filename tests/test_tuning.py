@@ -0,0 +1,40 @@
+import tuning
+
+FACTS = {'mem_mb': 8192, 'cpus': 4, 'rotational': False}
+
+
+def test_render_redis_replaces_directives_in_place():
+    current = ('bind 127.0.0.1\n'
+               '# maxmemory <bytes>\n'
+               'maxmemory 0\n'
+               'maxmemory-policy noeviction\n'
+               'port 13000\n')
+    text = tuning.render_redis({'maxmemory': '819mb', 'maxmemory-policy': 'allkeys-lru'}, FACTS, current)
+    assert text == ('bind 127.0.0.1\n'
+                    '# maxmemory <bytes>\n'
+                    'maxmemory 819mb\n'
+                    'maxmemory-policy allkeys-lru\n'
+                    'port 13000\n')
+
+
+def test_render_redis_appends_missing_directives():
+    text = tuning.render_redis({'maxmemory': '819mb', 'maxmemory-policy': 'allkeys-lru'}, FACTS, 'port 13000')
+    assert text == 'port 13000\n\n# erpnext tuning.py\nmaxmemory 819mb\nmaxmemory-policy allkeys-lru\n'
+
+
+def test_render_redis_is_idempotent():
+    settings = tuning.profile(FACTS)['redis']
+    once = tuning.render_redis(settings, FACTS, 'port 13000\nmaxmemory 0\n')
+    assert tuning.render_redis(settings, FACTS, once) == once
+
+
+def test_profile_uses_hdd_values_for_an_unknown_disk():
+    unknown = tuning.profile(dict(FACTS, rotational=None))['mariadb']
+    hdd = tuning.profile(dict(FACTS, rotational=True))['mariadb']
+    ssd = tuning.profile(FACTS)['mariadb']
+    for key in ('innodb_io_capacity', 'innodb_io_capacity_max', 'innodb_flush_neighbors'):
+        assert unknown[key] == hdd[key] != ssd[key]
+
+
+def test_profile_has_no_settings_removed_from_current_mariadb():
+    assert 'innodb_buffer_pool_instances' not in tuning.profile(FACTS)['mariadb']
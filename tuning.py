@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+ERPNext host performance profile
+Derives MariaDB, Redis and kernel settings from this host's RAM, cores
+and disk type, shows them as a diff against the current config files
+and applies them idempotently, keeping the originals for a rollback.
+
+Standard library only: the install script runs it inline on hosts that
+do not have this repository.
+"""
+
+import difflib
+import glob
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+
+SECTIONS = ('mariadb', 'redis', 'sysctl')
+MARIADB_CONF = '/etc/mysql/mariadb.conf.d/99-erpnext-tuning.cnf'
+SYSCTL_CONF = '/etc/sysctl.d/99-erpnext-tuning.conf'
+# Cache instances only: the bench queue Redis must never evict jobs
+REDIS_CONFS = ['/etc/redis/redis.conf', '/home/*/frappe-bench/config/redis_cache.conf']
+MYSQL_DATA_DIR = '/var/lib/mysql'
+# Originals of every file touched since the last rollback
+BACKUP_FILE = '/var/lib/erpnext-installer/tuning-backup.json'
+MANAGED_HEADER = '# Managed by tuning.py ({}) - python3 tuning.py --rollback restores the original\n'
+
+
+def meminfo():
+    info = {}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                info[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return info
+
+
+def disk_rotational(path):
+    """True for a spinning disk under path, False for SSD/NVMe, None if unknown"""
+    while not os.path.exists(path) and path != '/':
+        path = os.path.dirname(path)
+    dev = os.stat(path).st_dev
+    block = os.path.realpath(f'/sys/dev/block/{os.major(dev)}:{os.minor(dev)}')
+    if os.path.exists(os.path.join(block, 'partition')):
+        block = os.path.dirname(block)
+    try:
+        with open(os.path.join(block, 'queue', 'rotational')) as f:
+            return f.read().strip() == '1'
+    except OSError:
+        return None
+
+
+def host_facts():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return {
+        'mem_mb': meminfo().get('MemTotal', 0) // 1024,
+        'cpus': cpus,
+        'rotational': disk_rotational(MYSQL_DATA_DIR),
+    }
+
+
+def describe(facts):
+    disk = {True: 'HDD', False: 'SSD', None: 'disk type unknown'}[facts['rotational']]
+    return f"{facts['mem_mb']} MB RAM, {facts['cpus']} CPUs, {disk}"
+
+
+def profile(facts):
+    """{section: {setting: value}} for a host running the whole stack"""
+    mem = max(facts['mem_mb'], 512)
+    cpus = facts['cpus']
+    # An unknown disk gets the conservative spinning-disk values
+    ssd = facts['rotational'] is False
+    # MariaDB shares the machine with Redis, gunicorn and the RQ workers
+    pool = max(128, int(mem * (0.4 if mem >= 4096 else 0.25)) // 128 * 128)
+    io_threads = min(16, max(4, cpus))
+    return {
+        'mariadb': {
+            'innodb_buffer_pool_size': f'{pool}M',
+            'innodb_log_file_size': f'{min(2048, max(64, pool // 4))}M',
+            'innodb_log_buffer_size': '32M' if pool >= 1024 else '16M',
+            'innodb_flush_method': 'O_DIRECT',
+            'innodb_io_capacity': 2000 if ssd else 200,
+            'innodb_io_capacity_max': 4000 if ssd else 400,
+            'innodb_flush_neighbors': 0 if ssd else 1,
+            'innodb_read_io_threads': io_threads,
+            'innodb_write_io_threads': io_threads,
+            'max_connections': min(500, 100 + 25 * cpus),
+            'table_open_cache': 4000,
+            'tmp_table_size': '64M',
+            'max_heap_table_size': '64M',
+        },
+        'redis': {
+            'maxmemory': f'{max(64, mem // 10)}mb',
+            'maxmemory-policy': 'allkeys-lru',
+        },
+        'sysctl': {
+            'net.core.somaxconn': 65535,
+            'net.ipv4.tcp_max_syn_backlog': 8192,
+            'vm.swappiness': 10,
+            'vm.overcommit_memory': 1,  # Redis background saves
+        },
+    }
+
+
+def read_text(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def render_mariadb(settings, facts, current):
+    lines = [MANAGED_HEADER.format(describe(facts)), '[mysqld]\n']
+    lines += [f'{key} = {value}\n' for key, value in settings.items()]
+    return ''.join(lines)
+
+
+def render_sysctl(settings, facts, current):
+    lines = [MANAGED_HEADER.format(describe(facts))]
+    lines += [f'{key} = {value}\n' for key, value in settings.items()]
+    return ''.join(lines)
+
+
+def render_redis(settings, facts, current):
+    """Set the directives in place; ones the file lacks are appended"""
+    text = current if current.endswith('\n') or not current else current + '\n'
+    missing = []
+    for key, value in settings.items():
+        pattern = re.compile(rf'^{re.escape(key)}\s.*$', re.M)
+        if pattern.search(text):
+            text = pattern.sub(f'{key} {value}', text)
+        else:
+            missing.append(f'{key} {value}\n')
+    if missing:
+        text += '\n# erpnext tuning.py\n' + ''.join(missing)
+    return text
+
+
+def targets(sections):
+    """(section, path, render) of every config file the sections manage"""
+    found = []
+    if 'mariadb' in sections and os.path.isdir(os.path.dirname(MARIADB_CONF)):
+        found.append(('mariadb', MARIADB_CONF, render_mariadb))
+    if 'redis' in sections:
+        for pattern in REDIS_CONFS:
+            found += [('redis', path, render_redis) for path in sorted(glob.glob(pattern))]
+    if 'sysctl' in sections and os.path.isdir(os.path.dirname(SYSCTL_CONF)):
+        found.append(('sysctl', SYSCTL_CONF, render_sysctl))
+    return found
+
+
+def plan(sections=SECTIONS, facts=None):
+    """Files that differ from the profile: [{section, path, old, new, diff}]"""
+    facts = facts or host_facts()
+    settings = profile(facts)
+    changes = []
+    for section, path, render in targets(sections):
+        old = read_text(path)
+        if old is None and render is render_redis:
+            continue
+        new = render(settings[section], facts, old or '')
+        if new == old or (old and old.startswith('# Managed by tuning.py')
+                          and old.split('\n', 1)[1] == new.split('\n', 1)[1]):
+            continue  # the header only names the host facts
+        diff = ''.join(difflib.unified_diff((old or '').splitlines(True), new.splitlines(True),
+                                            path if old is not None else '/dev/null', path))
+        changes.append({'section': section, 'path': path, 'old': old, 'new': new, 'diff': diff})
+    return changes
+
+
+def load_backup():
+    try:
+        with open(BACKUP_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}}
+
+
+def save_backup(backup):
+    os.makedirs(os.path.dirname(BACKUP_FILE), exist_ok=True)
+    fd = os.open(BACKUP_FILE + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(backup, f, indent=2)
+    os.replace(BACKUP_FILE + '.tmp', BACKUP_FILE)
+
+
+def write_file(path, text):
+    """Atomic replace, keeping the owner and mode of the file it replaces"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    tmp = f'{path}.erpnext-tuning.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.chmod(tmp, st.st_mode & 0o7777 if st else 0o644)
+    if st:
+        os.chown(tmp, st.st_uid, st.st_gid)  # bench's redis_cache.conf belongs to the bench user
+    os.replace(tmp, path)
+
+
+def run(command):
+    try:
+        done = subprocess.run(command, capture_output=True, text=True, timeout=120)
+        return done.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def live_sysctl(keys):
+    values = {}
+    for key in keys:
+        try:
+            with open('/proc/sys/' + key.replace('.', '/')) as f:
+                values[key] = ' '.join(f.read().split())
+        except OSError:
+            pass
+    return values
+
+
+def redis_port(path):
+    match = re.search(r'^port\s+(\d+)', read_text(path) or '', re.M)
+    return match.group(1) if match else '6379'
+
+
+def reload(changed, settings, restart=True):
+    """Make running services pick up the changed files; returns log lines"""
+    messages = []
+    for section, path in changed:
+        if section == 'sysctl':
+            ok = run(['sysctl', '-p', path])
+            messages.append(f"{'✓' if ok else '✗'} sysctl -p {path}")
+        elif section == 'redis':
+            # CONFIG SET applies maxmemory live, no restart needed
+            port = redis_port(path)
+            ok = all(run(['redis-cli', '-p', port, 'CONFIG', 'SET', key, str(value)])
+                     for key, value in settings['redis'].items())
+            messages.append(f"{'✓' if ok else '⊘'} Redis on port {port}: "
+                            + ('applied live' if ok else 'not running, takes effect on next start'))
+        elif section == 'mariadb':
+            if restart:
+                ok = run(['systemctl', 'restart', 'mariadb']) or run(['systemctl', 'restart', 'mysql'])
+                messages.append(f"{'✓' if ok else '✗'} MariaDB restarted")
+            else:
+                messages.append('⊘ MariaDB takes the new settings on its next restart')
+    return messages
+
+
+def apply(sections=SECTIONS, restart=True, facts=None):
+    """Write every file that differs from the profile; returns (changes, messages).
+
+    Originals are saved once: after several applies a rollback still
+    returns to the files as they were before the first one.
+    """
+    facts = facts or host_facts()
+    changes = plan(sections, facts)
+    if not changes:
+        return [], []
+    backup = load_backup()
+    for change in changes:
+        backup['files'].setdefault(change['path'], {'section': change['section'], 'text': change['old']})
+    if any(c['section'] == 'sysctl' for c in changes) and 'sysctl' not in backup:
+        backup['sysctl'] = live_sysctl(profile(facts)['sysctl'])  # a removed file does not reset the kernel
+    backup.setdefault('created', time.time())
+    save_backup(backup)
+    for change in changes:
+        write_file(change['path'], change['new'])
+    messages = reload([(c['section'], c['path']) for c in changes], profile(facts), restart)
+    return changes, messages
+
+
+def rollback(restart=True):
+    """Restore the original files; returns log lines"""
+    backup = load_backup()
+    if not backup['files']:
+        return ['Nothing to roll back']
+    changed = []
+    messages = []
+    for path, saved in backup['files'].items():
+        if saved['text'] is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            write_file(path, saved['text'])
+        changed.append((saved['section'], path))
+        messages.append(f'↩ Restored {path}' if saved['text'] is not None else f'↩ Removed {path}')
+    # Running Redis keeps its live values; reread them from the restored files
+    settings = {'redis': {}}
+    for section, path in changed:
+        if section == 'redis':
+            text = read_text(path) or ''
+            for key in ('maxmemory', 'maxmemory-policy'):
+                match = re.search(rf'^{key}\s+(\S+)', text, re.M)
+                settings['redis'][key] = match.group(1) if match else {'maxmemory': '0',
+                                                                        'maxmemory-policy': 'noeviction'}[key]
+    for key, value in backup.get('sysctl', {}).items():
+        run(['sysctl', '-w', f'{key}={value}'])
+    if backup.get('sysctl'):
+        messages.append(f"✓ Kernel settings reset: {', '.join(backup['sysctl'])}")
+    messages += reload([c for c in changed if c[0] != 'sysctl'], settings, restart)
+    os.remove(BACKUP_FILE)
+    return messages
+
+
+def inline_command(args, fallback=None):
+    """Shell running this module with args on a host that lacks the file;
+    fallback runs when it fails"""
+    with open(os.path.abspath(__file__)) as f:
+        source = f.read()
+    on_error = f' || {fallback}' if fallback else ''
+    return f"python3 - {args} <<'ERPNEXT_TUNING'{on_error}\n{source}ERPNEXT_TUNING"
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Host-aware MariaDB / Redis / sysctl profile')
+    parser.add_argument('sections', nargs='*', help=f"any of {', '.join(SECTIONS)} (default: all)")
+    parser.add_argument('--apply', action='store_true', help='write the changed files and reload services')
+    parser.add_argument('--rollback', action='store_true', help='restore the files saved by --apply')
+    parser.add_argument('--no-restart', action='store_true', help='do not restart MariaDB')
+    parser.add_argument('--json', action='store_true', help='facts, profile and planned changes as JSON')
+    args = parser.parse_args()
+    unknown = set(args.sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(sorted(unknown))}")
+    chosen = tuple(args.sections) or SECTIONS
+
+    if args.rollback:
+        for message in rollback(not args.no_restart):
+            print(message)
+        sys.exit(0)
+
+    host = host_facts()
+    if args.json:
+        print(json.dumps({'facts': host, 'profile': profile(host),
+                          'changes': [{k: c[k] for k in ('section', 'path', 'diff')} for c in plan(chosen, host)]},
+                         indent=2))
+        sys.exit(0)
+
+    print(f'⚙️  Host: {describe(host)}')
+    if args.apply:
+        applied, log = apply(chosen, not args.no_restart, host)
+    else:
+        applied, log = plan(chosen, host), []
+    for change in applied:
+        print(change['diff'], end='')
+    if not applied:
+        print('✓ Already tuned, nothing to change')
+    elif not args.apply:
+        print(f"\n{len(applied)} file(s) would change; run with --apply "
+              f"{' '.join(shlex.quote(s) for s in args.sections)}".rstrip())
+    for message in log:
+        print(message)
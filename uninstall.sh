@@ -16,6 +16,37 @@ BLUE='\033[0;34m'
 CYAN='\033[0;36m'
 NC='\033[0m' # No Color
 
+#
+# ─── LARGE TREES ───────────────────────────────────────────────────────────────
+#
+# With ERPNEXT_DEFER_DELETE=1 (set by the web installer) a big directory is
+# only renamed aside - atomic, same directory - and its "##TRASH <path>" line
+# tells the caller to delete it in the background with fast_delete.py
+remove_tree() {
+    local target="$1"
+    if [ -n "$ERPNEXT_DEFER_DELETE" ]; then
+        local trash="$(dirname "$target")/.erpnext-trash-$(basename "$target")-$$"
+        if mv -T "$target" "$trash" 2>/dev/null; then
+            echo "##TRASH $trash"
+            return
+        fi
+    fi
+    rm -rf "$target"
+}
+
+# Trees an interrupted run moved aside but never got to delete
+sweep_trash() {
+    local trash
+    while IFS= read -r trash; do
+        echo -e "${YELLOW}   • Leftover from an earlier uninstall: $trash${NC}"
+        if [ -n "$ERPNEXT_DEFER_DELETE" ]; then
+            echo "##TRASH $trash"
+        else
+            rm -rf "$trash"
+        fi
+    done < <(find /opt /home "$HOME" -maxdepth 3 -name '.erpnext-trash-*' -prune 2>/dev/null | sort -u)
+}
+
 #
 # ─── HEADER ────────────────────────────────────────────────────────────────────
 #
@@ -61,6 +92,8 @@ sleep 2
 #
 echo -e "${BLUE}[1/12] Finding ERPNext installations...${NC}"
 
+sweep_trash
+
 BENCH_DIRS=()
 
 # Search common locations
@@ -124,7 +157,7 @@ echo -e "${BLUE}[3/12] Removing bench directories...${NC}"
 for dir in "${BENCH_DIRS[@]}"; do
     if [ -d "$dir" ]; then
         echo -e "${YELLOW}   • Removing: $dir${NC}"
-        rm -rf "$dir"
+        remove_tree "$dir"
     fi
 done
 
@@ -205,7 +238,7 @@ echo -e "${BLUE}[7/12] Removing NVM & Node.js...${NC}"
 
 if [ -d "$HOME/.nvm" ]; then
     echo -e "${YELLOW}   • Removing NVM directory${NC}"
-    rm -rf "$HOME/.nvm"
+    remove_tree "$HOME/.nvm"
 
     # Remove NVM from bashrc
     if [ -f "$HOME/.bashrc" ]; then
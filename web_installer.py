@@ -5,35 +5,248 @@ Complete installation toolkit with Doctor, Uninstall, and Remote Access
 Developer: Umair Wali | +92 308 2614004
 """
 
-from flask import Flask, render_template_string, request, jsonify, Response
+from flask import Flask, request, jsonify, Response
+from collections import OrderedDict
 import subprocess
 import threading
 import queue
+import json
+import uuid
 import os
 import time
 import socket
-
-app = Flask(__name__)
+import re
+import shutil
+import tempfile
+import hashlib
+import sys
+import gzip
+import mimetypes
+import struct
+import fcntl
+import doctor_checks
+import fast_delete
+import fleet
+import job_store
+import loadbench
+import sizing
+import tuning
+
+try:
+    import brotli
+except ImportError:  # optional: assets are always served gzip-compressed too
+    brotli = None
+
+app = Flask(__name__, static_folder=None)  # static/ is served by static_asset()
 
 # Global state
 status = {
     'install_running': False,
     'doctor_running': False,
-    'uninstall_running': False
+    'uninstall_running': False,
+    'fleet_running': False,
+    'benchmark_running': False,
+    'install_job': None,
+    'doctor_job': None,
+    'uninstall_job': None,
+    'fleet_job': None,
+    'benchmark_job': None
 }
 
-log_queue = queue.Queue()
+# Moved-aside trees a finished uninstall is still deleting
+deleting_trash = set()
+
+# Per-job event buffer size; a 45 minute install stays within this many
+# events, older ones are overwritten once the ring is full.
+LOG_BUFFER_EVENTS = 20000
+# Finished jobs kept around so late subscribers can still replay them
+MAX_FINISHED_JOBS = 10
+# Reconnect delay suggested to EventSource clients after a dropped stream
+SSE_RETRY_MS = 3000
+# Streams coalesce log lines into one frame per STREAM_BATCH_MS, or
+# earlier once STREAM_BATCH_LINES events are pending
+STREAM_BATCH_MS = 250
+STREAM_BATCH_LINES = 500
+LOG_PREFIX = 'event: log\ndata: '
+# Command the install step scripts run under (streambench.py drops sudo)
+STEP_COMMAND = ['sudo', 'bash']
+# Per-install performance reports (JSON, one file per job)
+REPORT_DIR = '/tmp/erpnext-installer/reports'
+# Persistent installer state (step checkpoints); see state_path()
+STATE_DIR = '/var/lib/erpnext-installer'
+# CSS/JS of the page, read and compressed once at startup
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# Asset URLs carry their content hash (?v=), so they can be cached for a year
+STATIC_MAX_AGE = 365 * 86400
+# The server address shown on the page is looked up at most this often
+SERVER_IP_TTL = 300
+SIOCGIFADDR = 0x8915
+
+
+class LogJob:
+    """Event log of one install / doctor / uninstall run.
+
+    Events live in a fixed-size ring buffer addressed by a sequence number.
+    Subscribers only keep their own cursor into it, so any number of
+    streams can follow the same job without copying events per client.
+    """
+
+    def __init__(self, kind, capacity=LOG_BUFFER_EVENTS, record=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.capacity = capacity
+        self.created = time.time()
+        self.done = False
+        self.report = None
+        self.record = record  # job_store.JobRecord, if the store is available
+        self._buf = [None] * capacity
+        self._next = 0
+        self._cond = threading.Condition()
+        self._waiters = []  # (event loop, future) of async subscribers
+
+    def publish(self, msg):
+        """Append a pre-formatted SSE message (``event: ...\ndata: ...``)"""
+        with self._cond:
+            self._buf[self._next % self.capacity] = msg
+            self._next += 1
+            self._cond.notify_all()
+            self._wake()
+
+    def _wake(self):
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(resolve_future, future)
+        self._waiters = []
+
+    def waiter(self, loop, cursor):
+        """Future on loop, resolved once events at or after cursor exist
+        or the job is done (see async_server.py)"""
+        future = loop.create_future()
+        with self._cond:
+            if cursor < self._next or self.done:
+                future.set_result(None)
+            else:
+                self._waiters.append((loop, future))
+        return future
+
+    def log(self, line):
+        self.publish(LOG_PREFIX + line)
+        if self.record:
+            self.record.add_line(line)
+
+    def event(self, name, payload):
+        self.publish(f'event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}')
+        if self.record:
+            if name == 'package':
+                self.record.step(payload.get('host'), payload['step'] + 1, payload['status'],
+                                 payload.get('duration'))
+            elif name == 'complete':
+                self.record.message = payload.get('message')
+
+    def finish(self, exit_code=None):
+        if self.record:
+            self.record.finish(exit_code, self.report)
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+            self._wake()
+
+    def read(self, cursor, timeout=1.0):
+        """Return (first_seq, messages) published at or after cursor.
+
+        Blocks up to timeout when nothing new is available. A cursor that
+        fell behind the ring is moved forward to the oldest kept event.
+        """
+        with self._cond:
+            if cursor >= self._next and not self.done:
+                self._cond.wait(timeout)
+            start = max(cursor, self._next - self.capacity)
+            msgs = [self._buf[i % self.capacity] for i in range(start, self._next)]
+            return start, msgs
+
+
+def resolve_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LogBroker:
+    """Registry of running and recently finished jobs"""
+
+    def __init__(self, keep=MAX_FINISHED_JOBS, store=None):
+        self.keep = keep
+        self.store = store
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, kind, config=None):
+        job = LogJob(kind)
+        if self.store:
+            job.record = self.store.start_job(job.id, kind, job.created, public_config(config or {}))
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.done]
+            for old in finished[:max(0, len(finished) - self.keep)]:
+                del self._jobs[old.id]
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self, kind):
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.kind == kind:
+                    return job
+        return None
+
+
+# Every job is also recorded in SQLite (see job_store.py) for /jobs
+broker = LogBroker(store=job_store.open_store())
+
+server_ip_cache = {'ip': None, 'expires': 0}
+
+def default_interface():
+    """Interface of the IPv4 default route with the lowest metric"""
+    best = None
+    with open('/proc/net/route') as f:
+        next(f)
+        for line in f:
+            fields = line.split()
+            if fields[1] == '00000000' and int(fields[3], 16) & 1:  # destination 0.0.0.0, RTF_UP
+                if best is None or int(fields[6]) < best[1]:
+                    best = (fields[0], int(fields[6]))
+    return best[0] if best else None
+
+def interface_address(name):
+    """IPv4 address of a network interface (SIOCGIFADDR ioctl)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        data = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', name[:15].encode()))
+    return socket.inet_ntoa(data[20:24])
 
 def get_server_ip():
-    """Get server IP address"""
+    """Get server IP address (cached for SERVER_IP_TTL seconds)"""
+    now = time.monotonic()
+    if server_ip_cache['ip'] and now < server_ip_cache['expires']:
+        return server_ip_cache['ip']
+    ip = None
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return "localhost"
+        name = default_interface()
+        if name:
+            ip = interface_address(name)
+    except (OSError, StopIteration, ValueError, IndexError):
+        pass
+    if not ip:
+        # No readable default route: let the kernel pick the source address
+        # (connect() on UDP sends nothing)
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect(("8.8.8.8", 80))
+                ip = s.getsockname()[0]
+        except OSError:
+            ip = "localhost"
+    server_ip_cache.update(ip=ip, expires=now + SERVER_IP_TTL)
+    return ip
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -42,235 +255,7 @@ HTML_TEMPLATE = '''
     <title>ERPNext Installer v4.1</title>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: 'Segoe UI', Arial, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        .container {
-            max-width: 1400px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 10px;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.3);
-            overflow: hidden;
-        }
-        .header {
-            background: #2c3e50;
-            color: white;
-            padding: 20px;
-            text-align: center;
-        }
-        .header h1 { font-size: 26px; margin-bottom: 5px; }
-        .header p { color: #bdc3c7; font-size: 13px; }
-        .server-info {
-            background: #34495e;
-            color: #ecf0f1;
-            padding: 10px 20px;
-            display: flex;
-            justify-content: space-between;
-            font-size: 13px;
-        }
-        .tabs {
-            display: flex;
-            background: #ecf0f1;
-            border-bottom: 2px solid #bdc3c7;
-        }
-        .tab {
-            padding: 15px 30px;
-            cursor: pointer;
-            border: none;
-            background: transparent;
-            font-size: 15px;
-            font-weight: 600;
-            color: #7f8c8d;
-            transition: all 0.3s;
-        }
-        .tab:hover { background: #d5dbdb; }
-        .tab.active {
-            background: white;
-            color: #2c3e50;
-            border-bottom: 3px solid #667eea;
-        }
-        .tab-content { display: none; }
-        .tab-content.active { display: block; }
-
-        /* Install Tab */
-        .install-grid {
-            display: grid;
-            grid-template-columns: 450px 1fr;
-            min-height: 600px;
-        }
-        .sidebar {
-            background: #f8f9fa;
-            padding: 25px;
-            border-right: 1px solid #dee2e6;
-        }
-        .content { padding: 25px; }
-
-        .form-group { margin-bottom: 15px; }
-        .form-group label {
-            display: block;
-            margin-bottom: 5px;
-            font-weight: 600;
-            color: #2c3e50;
-            font-size: 14px;
-        }
-        .form-group input, .form-group select {
-            width: 100%;
-            padding: 10px;
-            border: 2px solid #e0e0e0;
-            border-radius: 5px;
-            font-size: 14px;
-        }
-        .form-group input:focus, .form-group select:focus {
-            outline: none;
-            border-color: #667eea;
-        }
-        .form-group input[type="checkbox"] {
-            width: auto;
-            margin-right: 8px;
-        }
-        .checkbox-label {
-            display: flex;
-            align-items: center;
-            cursor: pointer;
-        }
-        .info-box {
-            background: #e3f2fd;
-            border-left: 4px solid #2196f3;
-            padding: 12px;
-            margin: 15px 0;
-            font-size: 13px;
-            border-radius: 4px;
-        }
-        .btn {
-            padding: 12px 25px;
-            border: none;
-            border-radius: 5px;
-            font-size: 14px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.3s;
-            margin-right: 10px;
-        }
-        .btn-primary { background: #4CAF50; color: white; }
-        .btn-primary:hover { background: #45a049; }
-        .btn-danger { background: #f44336; color: white; }
-        .btn-danger:hover { background: #da190b; }
-        .btn-info { background: #2196F3; color: white; }
-        .btn-info:hover { background: #0b7dda; }
-        .btn-warning { background: #ff9800; color: white; }
-        .btn-warning:hover { background: #e68900; }
-        .btn:disabled {
-            background: #ccc;
-            cursor: not-allowed;
-        }
-
-        .package-list {
-            background: white;
-            border: 1px solid #e0e0e0;
-            border-radius: 5px;
-            max-height: 300px;
-            overflow-y: auto;
-            margin-bottom: 20px;
-        }
-        .package-item {
-            padding: 10px 15px;
-            border-bottom: 1px solid #f0f0f0;
-            font-size: 13px;
-            display: flex;
-            align-items: center;
-        }
-        .package-item:last-child { border-bottom: none; }
-        .package-icon {
-            font-size: 18px;
-            margin-right: 10px;
-            min-width: 25px;
-        }
-        .console {
-            background: #1e1e1e;
-            color: #00ff00;
-            padding: 15px;
-            border-radius: 5px;
-            height: 350px;
-            overflow-y: auto;
-            font-family: 'Courier New', monospace;
-            font-size: 13px;
-            line-height: 1.5;
-        }
-        .progress-container { margin: 20px 0; }
-        .progress-bar {
-            background: #e0e0e0;
-            height: 30px;
-            border-radius: 15px;
-            overflow: hidden;
-            position: relative;
-        }
-        .progress-fill {
-            background: linear-gradient(90deg, #4CAF50, #8BC34A);
-            height: 100%;
-            width: 0%;
-            transition: width 0.5s;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-            font-weight: 600;
-            font-size: 14px;
-        }
-        .section-title {
-            font-size: 18px;
-            font-weight: 600;
-            color: #2c3e50;
-            margin-bottom: 15px;
-            padding-bottom: 10px;
-            border-bottom: 2px solid #667eea;
-        }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        .spinning { animation: spin 1s linear infinite; }
-
-        /* Doctor Tab */
-        .doctor-container {
-            padding: 30px;
-            max-width: 1000px;
-            margin: 0 auto;
-        }
-        .doctor-options {
-            background: #f8f9fa;
-            padding: 20px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-        }
-
-        /* Uninstall Tab */
-        .uninstall-container {
-            padding: 30px;
-            max-width: 800px;
-            margin: 0 auto;
-        }
-        .warning-box {
-            background: #fff3cd;
-            border: 2px solid #ffc107;
-            border-radius: 5px;
-            padding: 20px;
-            margin: 20px 0;
-        }
-        .warning-box h3 {
-            color: #856404;
-            margin-bottom: 10px;
-        }
-        .warning-list {
-            color: #721c24;
-            margin-left: 20px;
-        }
-    </style>
+    <link rel="stylesheet" href="/static/installer.css?v={{ assets['installer.css'] }}">
 </head>
 <body>
     <div class="container">
@@ -287,6 +272,7 @@ HTML_TEMPLATE = '''
 
         <div class="tabs">
             <button class="tab active" onclick="switchTab('install')">⚙️ Installer</button>
+            <button class="tab" onclick="switchTab('fleet')">🌐 Fleet</button>
             <button class="tab" onclick="switchTab('doctor')">🏥 Doctor</button>
             <button class="tab" onclick="switchTab('uninstall')">🗑️ Uninstall</button>
         </div>
@@ -329,7 +315,7 @@ HTML_TEMPLATE = '''
 
                     <div class="form-group">
                         <label class="checkbox-label">
-                            <input type="checkbox" id="prod_mode" checked>
+                            <input type="checkbox" id="prod_mode" checked onchange="syncBenchmarkAfter()">
                             Production Mode (Nginx + Supervisor)
                         </label>
                     </div>
@@ -341,6 +327,50 @@ HTML_TEMPLATE = '''
                         </label>
                     </div>
 
+                    <div class="form-group">
+                        <label class="checkbox-label">
+                            <input type="checkbox" id="system_upgrade" checked>
+                            Upgrade installed system packages (apt upgrade)
+                        </label>
+                    </div>
+
+                    <div class="form-group">
+                        <label>Package Cache Directory (optional)</label>
+                        <input type="text" id="apt_cache_dir" placeholder="/var/cache/erpnext-installer/debs">
+                        <label class="checkbox-label" style="margin-top: 5px; font-weight: normal;">
+                            <input type="checkbox" id="apt_offline">
+                            Offline: install only from the cache
+                        </label>
+                    </div>
+
+                    <div class="form-group">
+                        <label class="checkbox-label">
+                            <input type="checkbox" id="bench_cache">
+                            Reuse pre-built bench from cache (skips bench init / get-app)
+                        </label>
+                    </div>
+
+                    <div class="form-group">
+                        <label class="checkbox-label">
+                            <input type="checkbox" id="parallel" checked>
+                            Parallel install (run independent steps together)
+                        </label>
+                    </div>
+
+                    <div class="form-group">
+                        <label class="checkbox-label">
+                            <input type="checkbox" id="resume">
+                            Resume previous install (skip verified steps)
+                        </label>
+                    </div>
+
+                    <div class="form-group">
+                        <label class="checkbox-label">
+                            <input type="checkbox" id="benchmark_after">
+                            Run a load benchmark when done (baseline req/s, needs Production Mode)
+                        </label>
+                    </div>
+
                     <div class="info-box">
                         <strong>📋 Requirements:</strong><br>
                         • Min: 2GB RAM, 15GB Disk<br>
@@ -368,21 +398,9 @@ HTML_TEMPLATE = '''
                     </div>
 
                     <div class="package-list" id="packageList">
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 1: System Update</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 2: Python & Dependencies</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 3: MariaDB Database</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 4: Redis Cache</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 5: Nginx Web Server</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 6: wkhtmltopdf</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 7: Node.js & Yarn</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 8: Frappe Bench</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 9: Bench Initialization</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 10: MariaDB Config</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 11: Create Site</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 12: Install ERPNext</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 13: Production Setup</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 14: Security Setup</div>
-                        <div class="package-item"><span class="package-icon">⏳</span> Step 15: Optimization</div>
+                        {% for step in steps %}
+                        <div class="package-item"><span class="package-icon">⏳</span> Step {{ step.num }}: {{ step.title }}<span class="package-time"></span></div>
+                        {% endfor %}
                     </div>
 
                     <div class="section-title">📋 Console Output</div>
@@ -390,6 +408,78 @@ HTML_TEMPLATE = '''
                         <div>Ready to install ERPNext...</div>
                         <div>Configure settings and click "Start Installation"</div>
                     </div>
+
+                    <div id="reportSection" style="display: none; margin-top: 20px;">
+                        <div class="section-title">⏱ Performance Report</div>
+                        <div id="reportView"></div>
+                    </div>
+                </div>
+            </div>
+        </div>
+
+        <!-- FLEET TAB -->
+        <div id="fleet-tab" class="tab-content">
+            <div class="install-grid">
+                <div class="sidebar">
+                    <div class="section-title">🌐 Fleet Hosts</div>
+
+                    <div class="form-group">
+                        <label>Hosts (one [user@]host[:port] per line)</label>
+                        <textarea id="fleet_hosts" rows="6" placeholder="203.0.113.10&#10;ubuntu@203.0.113.11:2222"></textarea>
+                    </div>
+
+                    <div class="form-group">
+                        <label>SSH User (default)</label>
+                        <input type="text" id="ssh_user" value="root">
+                    </div>
+
+                    <div class="form-group">
+                        <label>SSH / sudo Password</label>
+                        <input type="password" id="ssh_password" placeholder="Leave empty for key login">
+                    </div>
+
+                    <div class="form-group">
+                        <label>Private Key File (optional)</label>
+                        <input type="text" id="ssh_key" placeholder="/root/.ssh/id_ed25519">
+                    </div>
+
+                    <div class="form-group">
+                        <label>Hosts at a time</label>
+                        <input type="number" id="fleet_concurrency" value="5" min="1" max="10">
+                    </div>
+
+                    <div class="form-group">
+                        <label class="checkbox-label">
+                            <input type="checkbox" id="strict_host_keys">
+                            Reject unknown host keys (otherwise trusted on first use)
+                        </label>
+                    </div>
+
+                    <div class="info-box">
+                        <strong>📋 Note:</strong><br>
+                        • Uses the settings from the Installer tab<br>
+                        • Non-root users need sudo rights<br>
+                        • "local" is a dry run on this server (nothing installed)
+                    </div>
+
+                    <div style="margin-top: 20px;">
+                        <button class="btn btn-primary" id="fleetBtn" onclick="startFleet()">
+                            🚀 Install on Fleet
+                        </button>
+                        <button class="btn btn-danger" id="fleetStopBtn" onclick="stopFleet()" disabled>
+                            ⏹ Stop
+                        </button>
+                    </div>
+                </div>
+
+                <div class="content">
+                    <div class="section-title">📊 Hosts</div>
+                    <div id="fleetHosts"></div>
+
+                    <div class="section-title" style="margin-top: 20px;">📋 Console Output</div>
+                    <div class="console" id="fleetConsole">
+                        <div>Add hosts and click "Install on Fleet"</div>
+                    </div>
                 </div>
             </div>
         </div>
@@ -405,6 +495,10 @@ HTML_TEMPLATE = '''
                         <input type="checkbox" id="auto_fix" checked>
                         Automatically fix detected issues
                     </label>
+                    <label class="checkbox-label" style="margin: 10px 0;">
+                        <input type="checkbox" id="legacy_doctor">
+                        Run legacy doctor.sh (sequential, interactive fixes)
+                    </label>
                 </div>
 
                 <div style="margin-bottom: 20px;">
@@ -417,9 +511,40 @@ HTML_TEMPLATE = '''
                 </div>
 
                 <div class="section-title">📋 Diagnostic Results</div>
+                <div id="doctorChecks" style="margin-bottom: 20px;"></div>
                 <div class="console" id="doctorConsole">
                     <div>Click "Run Diagnostics" to start health check...</div>
                 </div>
+
+                <div class="section-title" style="margin-top: 30px;">📈 Load Benchmark</div>
+                <div class="doctor-options">
+                    <div class="form-group">
+                        <label>Site</label>
+                        <input type="text" id="bench_site" placeholder="Site name from the Installer tab">
+                    </div>
+                    <div class="form-group">
+                        <label>Connections</label>
+                        <input type="number" id="bench_concurrency" value="10" min="1" max="200">
+                    </div>
+                    <div class="form-group">
+                        <label>Seconds per endpoint</label>
+                        <input type="number" id="bench_duration" value="10" min="1" max="300">
+                    </div>
+                    <div class="form-group">
+                        <label>Administrator Password (for the desk page)</label>
+                        <input type="password" id="bench_password" placeholder="Leave empty to skip /app">
+                    </div>
+                </div>
+
+                <div style="margin-bottom: 20px;">
+                    <button class="btn btn-info" id="benchBtn" onclick="runBenchmark()">
+                        📈 Run Benchmark
+                    </button>
+                </div>
+                <div id="benchResults" style="margin-bottom: 20px;"></div>
+                <div class="console" id="benchConsole">
+                    <div>Measures req/s and p50/p95/p99 latency of /, /api/method/ping and /app...</div>
+                </div>
             </div>
         </div>
 
@@ -468,189 +593,305 @@ HTML_TEMPLATE = '''
         </div>
     </div>
 
-    <script>
-        let eventSource = null;
-
-        function switchTab(tabName) {
-            // Hide all tabs
-            document.querySelectorAll('.tab-content').forEach(t => t.classList.remove('active'));
-            document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
-
-            // Show selected tab
-            document.getElementById(tabName + '-tab').classList.add('active');
-            event.target.classList.add('active');
-        }
-
-        // INSTALL FUNCTIONS
-        function startInstallation() {
-            const username = document.getElementById('username').value;
-            const sitename = document.getElementById('sitename').value;
-            const mysql_pass = document.getElementById('mysql_pass').value;
-            const admin_pass = document.getElementById('admin_pass').value;
-
-            if (!username || !sitename) {
-                alert('Username and Site Name are required!');
-                return;
-            }
-
-            if (mysql_pass.length < 6 || admin_pass.length < 6) {
-                alert('Passwords must be at least 6 characters!');
-                return;
-            }
-
-            if (!confirm('Start ERPNext installation?\\n\\n⏱ This will take 15-45 minutes.')) {
-                return;
-            }
-
-            const data = {
-                username: username,
-                sitename: sitename,
-                version: document.getElementById('version').value,
-                mysql_pass: mysql_pass,
-                admin_pass: admin_pass,
-                prod_mode: document.getElementById('prod_mode').checked,
-                install_erpnext: document.getElementById('install_erpnext').checked
-            };
-
-            fetch('/start', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify(data)
-            })
-            .then(res => res.json())
-            .then(data => {
-                if (data.success) {
-                    document.getElementById('startBtn').disabled = true;
-                    document.getElementById('stopBtn').disabled = false;
-                    connectEventStream('/stream');
-                }
-            });
-        }
-
-        function stopInstallation() {
-            if (confirm('Stop installation?')) {
-                fetch('/stop', {method: 'POST'});
-                if (eventSource) eventSource.close();
-                document.getElementById('startBtn').disabled = false;
-                document.getElementById('stopBtn').disabled = true;
-            }
-        }
-
-        // DOCTOR FUNCTIONS
-        function runDoctor() {
-            document.getElementById('doctorBtn').disabled = true;
-            document.getElementById('doctorConsole').innerHTML = '<div>Running diagnostics...</div>';
-
-            const data = {
-                auto_fix: document.getElementById('auto_fix').checked
-            };
-
-            fetch('/doctor/start', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify(data)
-            })
-            .then(res => res.json())
-            .then(data => {
-                if (data.success) {
-                    connectEventStream('/doctor/stream');
-                }
-            });
-        }
-
-        function clearDoctorOutput() {
-            document.getElementById('doctorConsole').innerHTML = '<div>Output cleared. Ready for next diagnostic run...</div>';
-        }
-
-        // UNINSTALL FUNCTIONS
-        function confirmUninstall() {
-            const confirmed = prompt('Type "YES" to confirm uninstallation (all caps):');
-            if (confirmed !== 'YES') {
-                alert('Uninstallation cancelled.');
-                return;
-            }
-
-            const data = {
-                remove_packages: document.getElementById('remove_packages').checked,
-                backup_before: document.getElementById('backup_before').checked
-            };
-
-            document.getElementById('uninstallConsole').innerHTML = '<div>Starting uninstallation...</div>';
-
-            fetch('/uninstall/start', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify(data)
-            })
-            .then(res => res.json())
-            .then(data => {
-                if (data.success) {
-                    connectEventStream('/uninstall/stream');
-                }
-            });
-        }
-
-        // EVENT STREAM
-        function connectEventStream(url) {
-            if (eventSource) eventSource.close();
-            eventSource = new EventSource(url);
-
-            eventSource.addEventListener('log', function(e) {
-                const consoles = {
-                    '/stream': 'console',
-                    '/doctor/stream': 'doctorConsole',
-                    '/uninstall/stream': 'uninstallConsole'
-                };
-                const consoleId = consoles[url] || 'console';
-                const console = document.getElementById(consoleId);
-                console.innerHTML += '<div>' + e.data + '</div>';
-                console.scrollTop = console.scrollHeight;
-            });
-
-            eventSource.addEventListener('progress', function(e) {
-                const data = JSON.parse(e.data);
-                const percent = Math.round((data.step / data.total) * 100);
-                const progressBar = document.getElementById('progressBar');
-                progressBar.style.width = percent + '%';
-                progressBar.textContent = percent + '% - Step ' + data.step + '/' + data.total;
-            });
-
-            eventSource.addEventListener('package', function(e) {
-                const data = JSON.parse(e.data);
-                const items = document.querySelectorAll('#packageList .package-item');
-                if (items[data.step]) {
-                    const icon = items[data.step].querySelector('.package-icon');
-                    if (data.status === 'running') {
-                        icon.textContent = '🔄';
-                        icon.classList.add('spinning');
-                    } else if (data.status === 'success') {
-                        icon.textContent = '✅';
-                        icon.classList.remove('spinning');
-                    } else if (data.status === 'error') {
-                        icon.textContent = '❌';
-                        icon.classList.remove('spinning');
-                    }
-                }
-            });
-
-            eventSource.addEventListener('complete', function(e) {
-                const data = JSON.parse(e.data);
-                alert(data.message);
-                document.getElementById('startBtn').disabled = false;
-                document.getElementById('stopBtn').disabled = true;
-                document.getElementById('doctorBtn').disabled = false;
-                eventSource.close();
-            });
-        }
-    </script>
+    <script src="/static/installer.js?v={{ assets['installer.js'] }}"></script>
 </body>
 </html>
 '''
 
+def compress_variants(data):
+    """Body of a response in every encoding we offer"""
+    variants = {'identity': data, 'gzip': gzip.compress(data, 9, mtime=0)}
+    if brotli:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+def load_static_assets():
+    """{name: {'etag', 'type', 'variants'}} for every file in static/"""
+    assets = {}
+    for name in sorted(os.listdir(STATIC_DIR)):
+        path = os.path.join(STATIC_DIR, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        assets[name] = {
+            'etag': hashlib.sha256(data).hexdigest()[:16],
+            'type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'variants': compress_variants(data),
+        }
+    return assets
+
+def cached_response(variants, etag, mimetype, cache_control):
+    """304 if the client has this version, else the best encoding it accepts"""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    accepted = {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+    encoding = next((e for e in ('br', 'gzip') if e in variants and e in accepted), 'identity')
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(variants[encoding], mimetype=mimetype, headers=headers)
+
+STATIC_ASSETS = load_static_assets()
+# Compiled once; the rendered page is kept until the server address changes
+INDEX_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+index_page = {'ip': None}
+
 @app.route('/')
 def index():
     server_ip = get_server_ip()
-    return render_template_string(HTML_TEMPLATE, server_ip=server_ip)
+    if index_page['ip'] != server_ip:
+        html = INDEX_TEMPLATE.render(server_ip=server_ip, steps=INSTALL_STEPS,
+                                     assets={name: a['etag'] for name, a in STATIC_ASSETS.items()})
+        data = html.encode('utf-8')
+        index_page.update(ip=server_ip, etag=hashlib.sha256(data).hexdigest()[:16],
+                          variants=compress_variants(data))
+    return cached_response(index_page['variants'], index_page['etag'], 'text/html', 'no-cache')
+
+@app.route('/static/<path:name>')
+def static_asset(name):
+    asset = STATIC_ASSETS.get(name)
+    if asset is None:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    if request.args.get('v') == asset['etag']:
+        cache_control = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    else:
+        cache_control = 'no-cache'  # unversioned URL: revalidate with the ETag
+    return cached_response(asset['variants'], asset['etag'], asset['type'], cache_control)
+
+@app.route('/status')
+def get_status():
+    return jsonify(status)
+
+@app.route('/report/<job_id>')
+def get_report(job_id):
+    """Per-step timing report of an install job"""
+    job = broker.get(job_id)
+    if job is not None and job.report is not None:
+        return jsonify(job.report)
+    path = os.path.join(REPORT_DIR, f'{os.path.basename(job_id)}.json')
+    if not os.path.exists(path):
+        stored = broker.store.get_job(job_id) if broker.store else None
+        if stored and stored['report']:
+            return jsonify(stored['report'])
+        return jsonify({'success': False, 'message': 'Report not found'}), 404
+    with open(path) as f:
+        return jsonify(json.load(f))
+
+# JOB HISTORY ROUTES
+@app.route('/jobs')
+def list_jobs():
+    """Past and running jobs, newest first (``?kind=``, ``?limit=``, ``?before=<num>``)"""
+    if not broker.store:
+        return jsonify({'success': False, 'message': 'Job store not available'}), 503
+    limit = min(int_arg('limit', 50), 500)
+    return jsonify(broker.store.list_jobs(request.args.get('kind'), limit, int_arg('before', 0)))
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """One job with its config (no passwords), report and step transitions"""
+    job = broker.store.get_job(job_id) if broker.store else None
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/search')
+def search_logs():
+    """Log lines of past jobs matching ``?q=`` (a phrase; ``?raw=1`` for FTS5 syntax)
+
+    Filters: ``?kind=``, ``?job=``; newest first, ``?limit=`` per page and
+    ``?before=<rowid>`` for the next one.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'success': False, 'message': 'Missing ?q='}), 400
+    if not broker.store or not broker.store.fts:
+        return jsonify({'success': False, 'message': 'Log search not available'}), 503
+    started = time.time()
+    try:
+        results = broker.store.search(text, request.args.get('kind'), request.args.get('job'),
+                                      min(int_arg('limit', job_store.SEARCH_LIMIT), 500),
+                                      int_arg('before', 0), request.args.get('raw') == '1')
+    except job_store.sqlite3.OperationalError as e:  # bad FTS5 syntax with raw=1
+        return jsonify({'success': False, 'message': str(e)}), 400
+    titles = {step['num']: step['title'] for step in INSTALL_STEPS}
+    for hit in results:
+        if hit['job']['kind'] in ('install', 'fleet'):
+            hit['step_title'] = titles.get(hit['step'])
+    return jsonify({'query': text, 'results': results, 'took_ms': round((time.time() - started) * 1000, 1),
+                    'next_before': results[-1]['rowid'] if results else None})
+
+@app.route('/jobs/<job_id>/log')
+def get_job_log(job_id):
+    """Lines ``?start=`` to ``?end=`` (exclusive) of a job's log"""
+    page = broker.store.read_lines(job_id, int_arg('start', 0), int_arg('end', 0) or None) if broker.store else None
+    if page is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(page)
+
+def resume_cursor(headers, args):
+    """First sequence number the client has not seen yet.
+
+    Browsers send ``Last-Event-ID`` automatically when an EventSource
+    reconnects; ``?last_event_id=`` allows the same from a fresh page.
+    """
+    last_id = headers.get('Last-Event-ID') or args.get('last_event_id')
+    try:
+        return int(last_id) + 1
+    except (TypeError, ValueError):
+        return 0
+
+def stream_batching(args):
+    """(batch_ms, batch_lines) asked for by a stream client"""
+    def number(name, default):
+        try:
+            return max(0, int(args.get(name, default)))
+        except (TypeError, ValueError):
+            return default
+    return number('batch_ms', STREAM_BATCH_MS), number('batch_lines', STREAM_BATCH_LINES) or 1
+
+def int_arg(name, default):
+    try:
+        return max(0, int(request.args.get(name, default)))
+    except ValueError:
+        return default
+
+def coalesce(start, msgs, max_lines):
+    """Turn buffered messages into SSE frames, one frame per run of log lines.
+
+    Up to max_lines consecutive ``log`` events become a single multi-line
+    ``data:`` frame (the browser joins them with newlines); other events
+    pass through. Each frame carries the id of the last message in it.
+    """
+    frames = []
+    lines = []
+    for seq, msg in enumerate(msgs, start):
+        if msg.startswith(LOG_PREFIX):
+            lines.append('data: ' + msg[len(LOG_PREFIX):])
+            if len(lines) < max_lines:
+                continue
+            msg = None
+        if lines:
+            last = seq if msg is None else seq - 1
+            frames.append(f"id: {last}\nevent: log\n" + "\n".join(lines) + "\n\n")
+            lines = []
+        if msg is not None:
+            frames.append(f"id: {seq}\n{msg}\n\n")
+    if lines:
+        frames.append(f"id: {start + len(msgs) - 1}\nevent: log\n" + "\n".join(lines) + "\n\n")
+    return frames
+
+# BENCH CACHE ROUTES
+def list_bench_cache():
+    """Entries of the pre-built bench cache, most recently used first"""
+    entries = []
+    if not os.path.isdir(BENCH_CACHE_DIR):
+        return entries
+    for name in os.listdir(BENCH_CACHE_DIR):
+        if not name.endswith('.json'):
+            continue
+        meta_path = os.path.join(BENCH_CACHE_DIR, name)
+        try:
+            with open(meta_path) as f:
+                entry = json.load(f)
+            archive = os.path.join(BENCH_CACHE_DIR, entry['archive'])
+            entry['size'] = os.path.getsize(archive)
+        except (OSError, ValueError, KeyError):
+            continue
+        entry['last_used'] = os.path.getmtime(meta_path)
+        entries.append(entry)
+    return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+def prune_bench_cache(key=None, max_age_days=None, keep=None):
+    """Delete cache entries by key, by days since last use, or beyond the newest keep"""
+    now = time.time()
+    removed = []
+    for index, entry in enumerate(list_bench_cache()):
+        expired = max_age_days is not None and now - entry['last_used'] > max_age_days * 86400
+        surplus = keep is not None and index >= keep
+        if entry['key'] == key or expired or surplus:
+            os.remove(os.path.join(BENCH_CACHE_DIR, entry['archive']))
+            os.remove(os.path.join(BENCH_CACHE_DIR, f"{entry['key']}.json"))
+            removed.append(entry['key'])
+    return removed
+
+@app.route('/cache/bench')
+def bench_cache():
+    entries = list_bench_cache()
+    return jsonify({'entries': entries, 'total_size': sum(e['size'] for e in entries)})
+
+def optional_int(options, name):
+    """Non-negative integer option from a JSON body, None when absent;
+    ValueError for anything else"""
+    value = options.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'{name} must be a whole number')
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a whole number')
+    if number < 0:
+        raise ValueError(f'{name} must not be negative')
+    return number
+
+@app.route('/cache/bench/prune', methods=['POST'])
+def bench_cache_prune():
+    options = request.get_json(silent=True) or {}
+    if not isinstance(options, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object'}), 400
+    try:
+        max_age_days = optional_int(options, 'max_age_days')
+        keep = optional_int(options, 'keep')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    try:
+        removed = prune_bench_cache(options.get('key'), max_age_days, keep)
+    except OSError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    return jsonify({'success': True, 'removed': removed})
+
+def stream_job(kind):
+    """SSE response following one job (``?job=<id>``, default: latest of kind)
+
+    Output is flushed at most every ``?batch_ms=`` milliseconds or once
+    ``?batch_lines=`` events are pending; ``batch_ms=0`` sends every
+    event as soon as it is published.
+    """
+    job = broker.get(request.args.get('job')) or broker.latest(kind)
+    if job is None:
+        return jsonify({'success': False, 'message': f'No {kind} job found'}), 404
+    cursor = resume_cursor(request.headers, request.args)
+    batch_ms, batch_lines = stream_batching(request.args)
+
+    def generate():
+        nonlocal cursor
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            start, msgs = job.read(cursor)
+            if start > cursor:
+                yield f"event: log\ndata: ... {start - cursor} earlier events no longer buffered\n\n"
+            if not msgs:
+                if job.done:
+                    yield "event: eof\ndata: {}\n\n"
+                    break
+                yield "data: heartbeat\n\n"
+                continue
+            if batch_ms:
+                deadline = time.monotonic() + batch_ms / 1000
+                while len(msgs) < batch_lines and not job.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    more_start, more = job.read(start + len(msgs), timeout=remaining)
+                    if more_start != start + len(msgs):
+                        break
+                    msgs.extend(more)
+            yield "".join(coalesce(start, msgs, batch_lines))
+            cursor = start + len(msgs)
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # INSTALL ROUTES
 @app.route('/start', methods=['POST'])
@@ -659,13 +900,15 @@ def start_install():
         return jsonify({'success': False, 'message': 'Installation already running'})
 
     config = request.json
+    job = broker.create('install', config)
     status['install_running'] = True
+    status['install_job'] = job.id
 
-    thread = threading.Thread(target=run_installation, args=(config,))
+    thread = threading.Thread(target=run_installation, args=(config, job))
     thread.daemon = True
     thread.start()
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'job_id': job.id})
 
 @app.route('/stop', methods=['POST'])
 def stop_install():
@@ -675,14 +918,42 @@ def stop_install():
 
 @app.route('/stream')
 def stream():
-    def generate():
-        while status['install_running'] or not log_queue.empty():
-            try:
-                msg = log_queue.get(timeout=1)
-                yield f"{msg}\n\n"
-            except queue.Empty:
-                yield f"data: heartbeat\n\n"
-    return Response(generate(), mimetype='text/event-stream')
+    return stream_job('install')
+
+# FLEET ROUTES
+@app.route('/fleet/start', methods=['POST'])
+def start_fleet():
+    if status['fleet_running']:
+        return jsonify({'success': False, 'message': 'Fleet install already running'})
+
+    config = request.json
+    try:
+        hosts = fleet.parse_hosts(config.get('hosts', ''), config.get('ssh_user') or 'root')
+    except fleet.FleetError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    if not hosts:
+        return jsonify({'success': False, 'message': 'No hosts given'})
+    if fleet.paramiko is None and any(h['host'] != 'local' for h in hosts):
+        return jsonify({'success': False, 'message': 'paramiko is not installed'})
+
+    job = broker.create('fleet', config)
+    status['fleet_running'] = True
+    status['fleet_job'] = job.id
+
+    thread = threading.Thread(target=run_fleet_install, args=(config, hosts, job))
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({'success': True, 'job_id': job.id, 'hosts': [h['name'] for h in hosts]})
+
+@app.route('/fleet/stop', methods=['POST'])
+def stop_fleet():
+    status['fleet_running'] = False
+    return jsonify({'success': True})
+
+@app.route('/fleet/stream')
+def fleet_stream():
+    return stream_job('fleet')
 
 # DOCTOR ROUTES
 @app.route('/doctor/start', methods=['POST'])
@@ -691,24 +962,41 @@ def start_doctor():
         return jsonify({'success': False, 'message': 'Doctor already running'})
 
     config = request.json
+    job = broker.create('doctor', config)
     status['doctor_running'] = True
+    status['doctor_job'] = job.id
 
-    thread = threading.Thread(target=run_doctor, args=(config,))
+    thread = threading.Thread(target=run_doctor, args=(config, job))
     thread.daemon = True
     thread.start()
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'job_id': job.id})
 
 @app.route('/doctor/stream')
 def doctor_stream():
-    def generate():
-        while status['doctor_running'] or not log_queue.empty():
-            try:
-                msg = log_queue.get(timeout=1)
-                yield f"{msg}\n\n"
-            except queue.Empty:
-                yield f"data: heartbeat\n\n"
-    return Response(generate(), mimetype='text/event-stream')
+    return stream_job('doctor')
+
+# BENCHMARK ROUTES
+@app.route('/benchmark/start', methods=['POST'])
+def start_benchmark():
+    config = request.json or {}
+    if not config.get('site'):
+        return jsonify({'success': False, 'message': 'Site name is required'})
+    job = launch_benchmark(config)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Benchmark already running'})
+    return jsonify({'success': True, 'job_id': job.id})
+
+@app.route('/benchmark/stream')
+def benchmark_stream():
+    return stream_job('benchmark')
+
+@app.route('/benchmark/history')
+def benchmark_history():
+    """Earlier runs for a site, newest first"""
+    runs = loadbench.history(broker.store, request.args.get('site'), request.args.get('host'),
+                             limit=max(1, min(int_arg('limit', 20), 100)))
+    return jsonify({'runs': runs})
 
 # UNINSTALL ROUTES
 @app.route('/uninstall/start', methods=['POST'])
@@ -717,95 +1005,470 @@ def start_uninstall():
         return jsonify({'success': False, 'message': 'Uninstall already running'})
 
     config = request.json
+    job = broker.create('uninstall', config)
     status['uninstall_running'] = True
+    status['uninstall_job'] = job.id
 
-    thread = threading.Thread(target=run_uninstall, args=(config,))
+    thread = threading.Thread(target=run_uninstall, args=(config, job))
     thread.daemon = True
     thread.start()
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'job_id': job.id})
 
 @app.route('/uninstall/stream')
 def uninstall_stream():
-    def generate():
-        while status['uninstall_running'] or not log_queue.empty():
-            try:
-                msg = log_queue.get(timeout=1)
-                yield f"{msg}\n\n"
-            except queue.Empty:
-                yield f"data: heartbeat\n\n"
-    return Response(generate(), mimetype='text/event-stream')
+    return stream_job('uninstall')
+
+# INSTALL STEPS
+# Single source for the generated script, the step matcher and the package
+# list on the page. 'when' names the config flag a step depends on, 'after'
+# the steps it needs and 'resources' what it must hold exclusively (only
+# one step at a time may run apt/dpkg). Dependencies on disabled steps
+# count as met. 'packages' of all enabled steps are installed together by
+# Step 2; the owning steps only verify and report them.
+INSTALL_STEPS = [
+    {'num': 1, 'title': 'System Update', 'message': 'System update...',
+     'after': [], 'resources': ['dpkg']},
+    {'num': 2, 'title': 'System Packages', 'message': 'Installing system packages (single apt transaction)...',
+     'after': [1, 6], 'resources': ['dpkg'],
+     'packages': ['git', 'curl', 'wget', 'python3-dev', 'python3-pip', 'python3-venv',
+                  'python3-setuptools', 'software-properties-common', 'pkg-config']},
+    {'num': 3, 'title': 'MariaDB Database', 'message': 'MariaDB...',
+     'after': [2],
+     'packages': ['mariadb-server', 'mariadb-client', 'default-libmysqlclient-dev']},
+    {'num': 4, 'title': 'Redis Cache', 'message': 'Redis...',
+     'after': [2],
+     'packages': ['redis-server']},
+    {'num': 5, 'title': 'Nginx Web Server', 'message': 'Nginx...', 'when': 'prod_mode',
+     'after': [2],
+     'packages': ['nginx', 'supervisor', 'fail2ban', 'certbot', 'python3-certbot-nginx']},
+    {'num': 6, 'title': 'wkhtmltopdf', 'message': 'Fetching wkhtmltopdf package...',
+     'after': []},
+    {'num': 7, 'title': 'Node.js & Yarn', 'message': 'Node.js & Yarn...',
+     'after': [2]},
+    {'num': 8, 'title': 'Frappe Bench', 'message': 'Frappe Bench...',
+     'after': [2]},
+    {'num': 9, 'title': 'Bench Initialization', 'message': 'Bench initialization...',
+     'after': [4, 7, 8]},
+    {'num': 10, 'title': 'MariaDB Config', 'message': 'MariaDB configuration...',
+     'after': [3]},
+    {'num': 11, 'title': 'Create Site', 'message': 'Creating site...',
+     'after': [9, 10]},
+    {'num': 12, 'title': 'Install ERPNext', 'message': 'Installing ERPNext...', 'when': 'install_erpnext',
+     'after': [11]},
+    {'num': 13, 'title': 'Production Setup', 'message': 'Production setup...', 'when': 'prod_mode',
+     'after': [5, 11, 12]},
+    {'num': 14, 'title': 'Security Setup', 'message': 'Security setup...',
+     'after': [11, 12, 13]},
+    {'num': 15, 'title': 'Optimization', 'message': 'Optimization...',
+     'after': [1, 4, 9, 10]},
+]
+
+# Steps running at once in parallel mode
+MAX_PARALLEL_STEPS = 4
+
+# Packed benches reused by Steps 9 and 12 (see bench_cache_functions)
+BENCH_CACHE_DIR = '/var/cache/erpnext-installer/bench'
+
+# Where the wkhtmltopdf .deb is fetched to when no package cache is used
+DEB_DOWNLOAD_DIR = '/tmp/erpnext-installer-debs'
+WKHTMLTOPDF_DEB = '''arch=$(uname -m); [[ "$arch" == "x86_64" ]] && arch="amd64"; [[ "$arch" == "aarch64" ]] && arch="arm64"
+url="https://github.com/wkhtmltopdf/packaging/releases/download/0.12.6.1-2/wkhtmltox_0.12.6.1-2.jammy_${{arch}}.deb"
+deb="{dir}/wkhtmltox_0.12.6.1-2.jammy_${{arch}}.deb"'''
+
+# Machine-readable step transitions printed by the generated script
+STEP_MARKER = re.compile(r'^##STEP (\d+) (start|end|skip)$')
+# Result lines of the resume probes
+PROBE_MARKER = re.compile(r'^##PROBE (\d+) (ok|fail)$', re.M)
+
+def step_enabled(step, config):
+    return 'when' not in step or bool(config.get(step['when']))
+
+
+class StepTracker:
+    """Turns ``##STEP n start|end|skip`` markers into step events.
+
+    Records start/end timestamps per step and publishes ``package`` and
+    ``progress`` events to the job as transitions happen. Fleet installs
+    run one tracker per host and tag its events with ``host``. Parallel
+    steps feed one tracker from several threads, so ``steps`` is only
+    touched under ``lock``.
+    """
+
+    def __init__(self, job, host=None):
+        self.job = job
+        self.host = host
+        self.total = len(INSTALL_STEPS)
+        self.steps = {}
+        self.lock = threading.Lock()
+
+    def feed(self, line):
+        """Handle a marker line; returns False for ordinary output"""
+        if not line.startswith('##STEP'):
+            return False
+        match = STEP_MARKER.match(line)
+        if not match:
+            return False
+        num, action = int(match.group(1)), match.group(2)
+        if action == 'start':
+            self.start(num)
+        elif action == 'end':
+            self.finish(num, 'success')
+        else:
+            self.finish(num, 'skipped')
+        return True
+
+    def emit(self, name, payload):
+        if self.host:
+            payload['host'] = self.host
+        self.job.event(name, payload)
+
+    def start(self, num):
+        with self.lock:
+            self.steps[num] = {'status': 'running', 'started': time.time()}
+        self.emit('package', {'step': num - 1, 'status': 'running'})
+        self.progress()
+
+    def finish(self, num, result):
+        with self.lock:
+            state = self.steps.setdefault(num, {})
+            state['status'] = result
+            if 'started' in state:
+                state['finished'] = time.time()
+                state['duration'] = round(state['finished'] - state['started'], 2)
+            duration = state.get('duration')
+        self.emit('package', {'step': num - 1, 'status': result, 'duration': duration})
+        self.progress()
+
+    def progress(self):
+        """Finished step count plus the steps currently running"""
+        with self.lock:
+            done = sum(1 for s in self.steps.values() if s.get('status') in ('success', 'skipped', 'verified'))
+            running = sorted(n for n, s in self.steps.items() if s.get('status') == 'running')
+        self.emit('progress', {'step': done, 'total': self.total, 'running': running})
+
+    def fail(self, num):
+        with self.lock:
+            running = self.steps.get(num, {}).get('status') == 'running'
+        if running:
+            self.finish(num, 'error')
+
+    def fail_running(self):
+        with self.lock:
+            nums = list(self.steps)
+        for num in nums:
+            self.fail(num)
+
+    def record(self, num, metrics):
+        """Attach resource usage measured for a step"""
+        with self.lock:
+            self.steps.setdefault(num, {}).update(metrics)
+
+    def complete(self):
+        self.emit('progress', {'step': self.total, 'total': self.total, 'running': []})
+
+    def report(self):
+        rows = []
+        with self.lock:
+            steps = {num: dict(state) for num, state in self.steps.items()}
+        for step in INSTALL_STEPS:
+            state = steps.get(step['num'], {})
+            rows.append({
+                'num': step['num'],
+                'title': step['title'],
+                'status': state.get('status', 'pending'),
+                'started': state.get('started'),
+                'finished': state.get('finished'),
+                'wall': state.get('duration'),
+                'cpu_user': state.get('cpu_user', 0.0),
+                'cpu_sys': state.get('cpu_sys', 0.0),
+                'max_rss_kb': state.get('max_rss_kb', 0),
+                'output_bytes': state.get('output_bytes', 0),
+                'output_lines': state.get('output_lines', 0),
+            })
+        return rows
+
 
 # WORKER FUNCTIONS
-def run_installation(config):
+def run_step(job, tracker, script_path, prefix=''):
+    """Run one step script, streaming its output into the job.
+
+    Returns (exit_code, metrics) where metrics holds the CPU time and peak
+    RSS reported by wait4() for the step's whole process tree, plus the
+    amount of output it produced.
+    """
+    process = subprocess.Popen(
+        STEP_COMMAND + [script_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+
+    out_bytes = 0
+    out_lines = 0
     try:
-        script = generate_install_script(config)
-        script_path = "/tmp/erpnext_web_install.sh"
-
-        with open(script_path, 'w') as f:
-            f.write(script)
-        os.chmod(script_path, 0o755)
-
-        log_queue.put('event: log\ndata: ═══════════════════════════════════════')
-        log_queue.put('event: log\ndata: 🚀 ERPNext Installation Started')
-        log_queue.put('event: log\ndata: ═══════════════════════════════════════')
-
-        process = subprocess.Popen(
-            ['sudo', 'bash', script_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-
-        step = 0
         for line in process.stdout:
             if not status['install_running']:
                 process.terminate()
                 break
 
+            out_bytes += len(line.encode())
+            out_lines += 1
             line = line.rstrip()
-            log_queue.put(f'event: log\ndata: {line}')
-
-            if 'Step' in line:
-                for i in range(1, 16):
-                    if f'Step {i}' in line:
-                        if step < i:
-                            if step > 0:
-                                log_queue.put(f'event: package\ndata: {{"step": {step-1}, "status": "success"}}')
-                            step = i
-                            log_queue.put(f'event: package\ndata: {{"step": {step-1}, "status": "running"}}')
-                            log_queue.put(f'event: progress\ndata: {{"step": {step}, "total": 15}}')
-                        break
-
-        process.wait()
-
-        if process.returncode == 0:
-            for i in range(15):
-                log_queue.put(f'event: package\ndata: {{"step": {i}, "status": "success"}}')
-            log_queue.put('event: log\ndata: ✅ INSTALLATION COMPLETED!')
-            log_queue.put(f'event: log\ndata: URL: http://{config["sitename"]}')
-            log_queue.put('event: complete\ndata: {"message": "✅ Installation completed!"}')
+            if not tracker.feed(line):
+                job.log(prefix + line)
+    except BaseException:
+        # The caller will report the step as failed: don't leave it running
+        process.terminate()
+        raise
+    finally:
+        process.stdout.close()
+        _, wait_status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+
+    return process.returncode, {
+        'cpu_user': round(usage.ru_utime, 2),
+        'cpu_sys': round(usage.ru_stime, 2),
+        'max_rss_kb': usage.ru_maxrss,
+        'output_bytes': out_bytes,
+        'output_lines': out_lines,
+    }
+
+def run_install_plan(job, tracker, pending, done, work_dir, state, max_parallel):
+    """Run pending steps as soon as their dependencies and resources allow.
+
+    Steps whose 'after' steps are all in done and whose resources are not
+    held by a running step start in step order, up to max_parallel at a
+    time. Once a step fails (or the install is stopped) nothing new is
+    started; running steps are allowed to finish. Returns the exit code.
+    """
+    results = queue.Queue()
+    running = {}
+    exit_code = 0
+    prefix = '' if max_parallel == 1 else '[{}] '
+
+    def worker(num, script_path):
+        try:
+            code, metrics = run_step(job, tracker, script_path, prefix.format(num))
+        except Exception as e:
+            job.log(f'ERROR in Step {num}: {e}')
+            code, metrics = 1, {}
+        results.put((num, code, metrics))
+
+    while pending or running:
+        if exit_code == 0 and status['install_running']:
+            for step in list(pending):
+                if len(running) >= max_parallel:
+                    break
+                resources = set(step.get('resources', ()))
+                if not all(dep in done for dep in step['after']):
+                    continue
+                if any(resources & held for held in running.values()):
+                    continue
+                pending.remove(step)
+                running[step['num']] = resources
+                script_path = os.path.join(work_dir, f"step{step['num']}.sh")
+                threading.Thread(target=worker, args=(step['num'], script_path), daemon=True).start()
+        if not running:
+            # Stopped, or a failure left the remaining steps unreachable
+            return exit_code or -1
+
+        num, code, metrics = results.get()
+        del running[num]
+        tracker.record(num, metrics)
+        if code == 0:
+            done.add(num)
+            state['steps'][str(num)] = {'finished': time.time(), 'job_id': job.id}
+            save_install_state(job, state)
+        else:
+            tracker.fail(num)
+            if exit_code == 0:
+                exit_code = code
+
+    return exit_code
+
+def public_config(config):
+    """Config without passwords, safe to store in reports"""
+    return {k: v for k, v in config.items() if 'pass' not in k}
+
+def write_report(job, config, tracker, started, exit_code):
+    report = {
+        'job_id': job.id,
+        'config': public_config(config),
+        'started': started,
+        'finished': time.time(),
+        'exit_code': exit_code,
+        'steps': tracker.report(),
+    }
+    report['duration'] = round(report['finished'] - started, 2)
+    job.report = report
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    with open(os.path.join(REPORT_DIR, f'{job.id}.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def run_installation(config, job):
+    started = time.time()
+    tracker = StepTracker(job)
+    exit_code = None
+    work_dir = None
+    try:
+        bodies = install_step_bodies(config)
+        # Scripts contain the passwords: keep them in a private directory
+        work_dir = tempfile.mkdtemp(prefix='erpnext_web_install_')
+
+        job.log('═══════════════════════════════════════')
+        job.log('🚀 ERPNext Installation Started')
+        job.log('═══════════════════════════════════════')
+
+        state = load_install_state()
+        fingerprint = config_fingerprint(config)
+        if state.get('fingerprint') != fingerprint:
+            state = {'fingerprint': fingerprint, 'steps': {}}
+        verified = set()
+        if config.get('resume'):
+            verified = verify_completed_steps(job, config, state, work_dir)
+        else:
+            state['steps'] = {}
+        save_install_state(job, state)
+
+        done = set()
+        pending = []
+        for step in INSTALL_STEPS:
+            num = step['num']
+            if not step_enabled(step, config):
+                tracker.finish(num, 'skipped')
+                done.add(num)
+            elif num in verified:
+                tracker.finish(num, 'verified')
+                done.add(num)
+            else:
+                script_path = os.path.join(work_dir, f'step{num}.sh')
+                with open(script_path, 'w') as f:
+                    f.write("#!/bin/bash\nset -e\n" + step_section(step, bodies))
+                os.chmod(script_path, 0o700)
+                pending.append(step)
+
+        max_parallel = MAX_PARALLEL_STEPS if config.get('parallel') else 1
+        exit_code = run_install_plan(job, tracker, pending, done, work_dir, state, max_parallel)
+
+        if exit_code == 0:
+            tracker.complete()
+            if config.get('prod_mode'):
+                size_bench_processes(config, job)
+            job.log('✅ INSTALLATION COMPLETED!')
+            job.log(f'URL: http://{config["sitename"]}')
+            if config.get('benchmark_after') and not config.get('prod_mode'):
+                # Without production mode nothing serves the site until `bench start`
+                job.log('⚠️ Load benchmark skipped: it needs Production Mode (nginx)')
+            elif config.get('benchmark_after'):
+                bench = launch_benchmark({'site': config['sitename'], 'password': config['admin_pass']})
+                if bench:
+                    job.log(f'📈 Load benchmark started (job {bench.id}) - results in the Doctor tab')
+            job.event('complete', {'message': '✅ Installation completed!'})
         else:
-            log_queue.put('event: log\ndata: ❌ Installation failed!')
-            log_queue.put('event: complete\ndata: {"message": "❌ Installation failed!"}')
+            tracker.fail_running()
+            job.log('❌ Installation failed!')
+            job.log('💡 Tick "Resume previous install" to continue from the failed step')
+            job.event('complete', {'message': '❌ Installation failed!'})
 
     except Exception as e:
-        log_queue.put(f'event: log\ndata: ERROR: {str(e)}')
+        job.log(f'ERROR: {str(e)}')
     finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        try:
+            report = write_report(job, config, tracker, started, exit_code)
+            job.log('⏱ Step timings:')
+            for step in report['steps']:
+                if step.get('wall') is not None:
+                    job.log(f"   Step {step['num']:>2} {step['title']:<24} {step['wall']:>8.1f}s wall"
+                            f" {step['cpu_user'] + step['cpu_sys']:>8.1f}s CPU"
+                            f" {step['max_rss_kb'] // 1024:>6} MB peak")
+            job.event('report', {'job_id': job.id})
+        except Exception as e:
+            job.log(f'⚠️ Could not write performance report: {e}')
         status['install_running'] = False
-
-def run_doctor(config):
+        job.finish(exit_code)
+
+def run_fleet_install(config, hosts, job):
+    """Install on every host in the fleet, streaming [host]-tagged output"""
+    started = time.time()
+    trackers = {h['name']: StepTracker(job, host=h['name']) for h in hosts}
+    results = {}
+    exit_code = None
+    try:
+        script = generate_install_script(config)
+        workers = max(1, min(int(config.get('concurrency') or fleet.MAX_FLEET_WORKERS), fleet.MAX_FLEET_WORKERS))
+
+        job.log('═══════════════════════════════════════')
+        job.log(f'🌐 Fleet install on {len(hosts)} hosts ({workers} at a time)')
+        job.log('═══════════════════════════════════════')
+
+        def on_line(host, line):
+            if not trackers[host].feed(line):
+                job.log(f'[{host}] {line}')
+
+        def on_status(host, state, info):
+            job.event('host', {'host': host, 'status': state, 'exit_code': info.get('exit_code'),
+                               'error': info.get('error'), 'duration': info.get('duration')})
+            if state == 'success':
+                trackers[host].complete()
+                job.log(f"[{host}] ✅ Installed in {info['duration']}s")
+            elif state in ('failed', 'stopped'):
+                trackers[host].fail_running()
+                detail = info.get('error') or f"exit code {info.get('exit_code')}"
+                job.log(f'[{host}] ❌ {state.capitalize()} ({detail})')
+
+        results = fleet.run_fleet(hosts, script, on_line, on_status, workers,
+                                  should_stop=lambda: not status['fleet_running'],
+                                  password=config.get('ssh_password') or None,
+                                  key_filename=config.get('ssh_key') or None,
+                                  strict_host_keys=bool(config.get('strict_host_keys')))
+
+        ok = sum(1 for r in results.values() if r['status'] == 'success')
+        job.log(f'🌐 Fleet install finished: {ok}/{len(hosts)} hosts succeeded')
+        exit_code = 0 if ok == len(hosts) else 1
+        job.event('complete', {'message': f"{'✅' if ok == len(hosts) else '❌'} Fleet install: "
+                                          f"{ok}/{len(hosts)} hosts succeeded"})
+    except Exception as e:
+        job.log(f'ERROR: {str(e)}')
+    finally:
+        try:
+            job.report = {
+                'job_id': job.id,
+                'kind': 'fleet',
+                'config': public_config(config),
+                'started': started,
+                'finished': time.time(),
+                'duration': round(time.time() - started, 2),
+                'hosts': {name: dict(results.get(name, {}), steps=tracker.report())
+                          for name, tracker in trackers.items()},
+            }
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            with open(os.path.join(REPORT_DIR, f'{job.id}.json'), 'w') as f:
+                json.dump(job.report, f, indent=2)
+        except Exception as e:
+            job.log(f'⚠️ Could not write fleet report: {e}')
+        status['fleet_running'] = False
+        job.finish(exit_code)
+
+def run_doctor(config, job):
+    if not config.get('legacy'):
+        return run_doctor_checks(config, job)
+    exit_code = None
     try:
-        log_queue.put('event: log\ndata: 🏥 Starting ERPNext Doctor...')
-        log_queue.put('event: log\ndata: ═══════════════════════════════════════')
+        job.log('🏥 Starting ERPNext Doctor...')
+        job.log('═══════════════════════════════════════')
 
         script_dir = os.path.dirname(os.path.abspath(__file__))
         doctor_script = os.path.join(script_dir, 'doctor.sh')
 
         if not os.path.exists(doctor_script):
-            log_queue.put('event: log\ndata: ❌ ERROR: doctor.sh not found!')
-            log_queue.put('event: complete\ndata: {"message": "doctor.sh not found!"}')
+            job.log('❌ ERROR: doctor.sh not found!')
+            job.event('complete', {'message': 'doctor.sh not found!'})
             status['doctor_running'] = False
             return
 
@@ -822,33 +1485,112 @@ def run_doctor(config):
                 process.terminate()
                 break
             line = line.rstrip()
-            log_queue.put(f'event: log\ndata: {line}')
+            job.log(line)
 
-        process.wait()
+        exit_code = process.wait()
 
         if process.returncode == 0:
-            log_queue.put('event: log\ndata: ✅ Diagnostics completed!')
-            log_queue.put('event: complete\ndata: {"message": "✅ Diagnostics completed!"}')
+            job.log('✅ Diagnostics completed!')
+            job.event('complete', {'message': '✅ Diagnostics completed!'})
         else:
-            log_queue.put('event: log\ndata: ⚠️ Diagnostics finished with warnings')
-            log_queue.put('event: complete\ndata: {"message": "⚠️ Finished with warnings"}')
+            job.log('⚠️ Diagnostics finished with warnings')
+            job.event('complete', {'message': '⚠️ Finished with warnings'})
 
     except Exception as e:
-        log_queue.put(f'event: log\ndata: ERROR: {str(e)}')
+        job.log(f'ERROR: {str(e)}')
     finally:
         status['doctor_running'] = False
+        job.finish(exit_code)
+
+def run_doctor_checks(config, job):
+    """Run the doctor checks concurrently, streaming one 'check' event per result"""
+    started = time.time()
+    exit_code = None
+    try:
+        job.log('🏥 Starting ERPNext Doctor...')
+        job.log('═══════════════════════════════════════')
+
+        bench_dir = doctor_checks.find_bench()
+        if not bench_dir:
+            job.log('❌ CRITICAL: ERPNext installation not found!')
+            job.event('complete', {'message': 'ERPNext installation not found!'})
+            return
+        ctx = doctor_checks.CheckContext(bench_dir, doctor_checks.list_sites(bench_dir))
+        job.log(f'✅ Found: {bench_dir}')
+        job.log(f'🌐 Sites: {", ".join(ctx.sites) or "none"}')
+        job.log('')
+
+        def emit(result):
+            job.event('check', result)
+            for line in doctor_checks.format_result(result):
+                job.log(line)
+
+        try:
+            results = doctor_checks.run_checks(ctx, emit, should_stop=lambda: not status['doctor_running'])
+        finally:
+            ctx.close()
+
+        fixes = []
+        if config.get('auto_fix'):
+            for result in results:
+                if result['command'] and result['status'] in ('error', 'critical'):
+                    fixes.append(apply_doctor_fix(job, result))
+
+        summary = doctor_checks.summarize(results)
+        job.log('')
+        job.log('📊 SUMMARY: ' + ', '.join(f'{n} {s}' for s, n in sorted(summary.items())) +
+                f' in {time.time() - started:.1f}s')
+        job.report = {
+            'job_id': job.id,
+            'kind': 'doctor',
+            'bench_dir': bench_dir,
+            'started': started,
+            'duration': round(time.time() - started, 2),
+            'summary': summary,
+            'checks': results,
+            'fixes': fixes,
+        }
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        with open(os.path.join(REPORT_DIR, f'{job.id}.json'), 'w') as f:
+            json.dump(job.report, f, indent=2)
+
+        exit_code = 1 if summary.get('critical') or summary.get('error') else 0
+        if exit_code:
+            message = f"❌ {summary.get('critical', 0) + summary.get('error', 0)} problems found"
+        elif summary.get('warn') or summary.get('timeout'):
+            message = '⚠️ Healthy with warnings'
+        else:
+            message = '🎉 ERPNext is HEALTHY!'
+        job.event('complete', {'message': message, 'summary': summary})
 
-def run_uninstall(config):
+    except Exception as e:
+        job.log(f'ERROR: {str(e)}')
+    finally:
+        status['doctor_running'] = False
+        job.finish(exit_code)
+
+def apply_doctor_fix(job, result):
+    """Run one suggested fix as root; fixes run one at a time"""
+    job.log(f"🔧 Fixing {result['id']}: {result['command']}")
+    process = subprocess.run(['sudo', 'bash', '-c', result['command']],
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout.splitlines()[-20:]:
+        job.log(f'   {line}')
+    job.log(f"   {'✅ Fixed' if process.returncode == 0 else '❌ Fix failed'}")
+    return {'id': result['id'], 'command': result['command'], 'exit_code': process.returncode}
+
+def run_uninstall(config, job):
+    exit_code = None
     try:
-        log_queue.put('event: log\ndata: 🗑️ Starting Uninstallation...')
-        log_queue.put('event: log\ndata: ═══════════════════════════════════════')
+        job.log('🗑️ Starting Uninstallation...')
+        job.log('═══════════════════════════════════════')
 
         script_dir = os.path.dirname(os.path.abspath(__file__))
         uninstall_script = os.path.join(script_dir, 'uninstall.sh')
 
         if not os.path.exists(uninstall_script):
-            log_queue.put('event: log\ndata: ❌ ERROR: uninstall.sh not found!')
-            log_queue.put('event: complete\ndata: {"message": "uninstall.sh not found!"}')
+            job.log('❌ ERROR: uninstall.sh not found!')
+            job.event('complete', {'message': 'uninstall.sh not found!'})
             status['uninstall_running'] = False
             return
 
@@ -859,68 +1601,283 @@ def run_uninstall(config):
         else:
             inputs += "n\n"
 
+        # Big trees are only renamed aside by the script (##TRASH lines) and
+        # deleted after it exits, so a reinstall can start straight away
         process = subprocess.Popen(
-            ['sudo', 'bash', uninstall_script],
+            ['sudo', 'env', 'ERPNEXT_DEFER_DELETE=1', 'bash', uninstall_script],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True
+            text=True,
+            bufsize=1
         )
+        process.stdin.write(inputs)
+        process.stdin.close()
 
-        output, _ = process.communicate(input=inputs)
-        for line in output.split('\n'):
-            log_queue.put(f'event: log\ndata: {line}')
+        trash = []
+        for line in process.stdout:
+            line = line.rstrip()
+            if line.startswith('##TRASH '):
+                path = line[len('##TRASH '):]
+                # An earlier run may still be deleting its leftovers
+                if path not in trash and path not in deleting_trash:
+                    trash.append(path)
+                    job.log(f'   • Moved aside for background delete: {path}')
+                continue
+            job.log(line)
+
+        exit_code = process.wait()
+        status['uninstall_running'] = False
 
-        if process.returncode == 0:
-            log_queue.put('event: log\ndata: ✅ Uninstallation completed!')
-            log_queue.put('event: complete\ndata: {"message": "✅ Uninstallation completed!"}')
+        if exit_code == 0:
+            job.log('✅ Uninstallation completed!')
         else:
-            log_queue.put('event: log\ndata: ❌ Uninstallation failed!')
-            log_queue.put('event: complete\ndata: {"message": "❌ Uninstallation failed!"}')
+            job.log('❌ Uninstallation failed!')
+        job.event('complete', {'message': '✅ Uninstallation completed!' if exit_code == 0
+                               else '❌ Uninstallation failed!'})
+        if trash:
+            job.log('🧹 Deleting old files in the background - you can reinstall now')
+            deleting_trash.update(trash)
+            try:
+                delete_trash(trash, job)
+            finally:
+                deleting_trash.difference_update(trash)
 
     except Exception as e:
-        log_queue.put(f'event: log\ndata: ERROR: {str(e)}')
+        job.log(f'ERROR: {str(e)}')
     finally:
         status['uninstall_running'] = False
+        job.finish(exit_code)
+
+def delete_trash(paths, job):
+    """Delete moved-aside trees with fast_delete.py (as root), logging progress"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fast_delete.py')
+    process = subprocess.Popen(
+        ['sudo', sys.executable, script, '--in-place', '--json'] + paths,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+    for line in process.stdout:
+        try:
+            progress = json.loads(line)
+        except ValueError:
+            job.log(line.rstrip())
+            continue
+        if progress.get('error'):
+            job.log(f"❌ {progress['path']}: {progress['error']}")
+            continue
+        job.event('cleanup', progress)
+        freed = fast_delete.format_bytes(progress['bytes'])
+        if progress['done']:
+            job.log(f"✅ Deleted {progress['path']}: {progress['files']:,} files, {freed} freed "
+                    f"in {progress['duration']}s" + (f", {progress['errors']} errors" if progress['errors'] else ''))
+        else:
+            job.log(f"🧹 {progress['path']}: {progress['files']:,} files, {freed} freed...")
+    process.wait()
 
-def generate_install_script(config):
+def size_bench_processes(config, job):
+    """Fit the gunicorn and RQ worker counts of bench setup production to this host"""
+    bench = f"/home/{config['username']}/frappe-bench"
+    job.log('⚙️ Sizing gunicorn and RQ workers for this host...')
+    try:
+        output = subprocess.run(['sudo', sys.executable, os.path.abspath(sizing.__file__), '--bench', bench, '--apply'],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=120).stdout
+    except (OSError, subprocess.TimeoutExpired) as e:
+        job.log(f'⚠️ Worker sizing skipped: {e}')
+        return
+    for line in output.splitlines():
+        job.log(line)
+
+def launch_benchmark(config):
+    """Start a benchmark job; None if one is already running"""
+    if status['benchmark_running']:
+        return None
+    job = broker.create('benchmark', config)
+    status['benchmark_running'] = True
+    status['benchmark_job'] = job.id
+    thread = threading.Thread(target=run_benchmark, args=(config, job))
+    thread.daemon = True
+    thread.start()
+    return job
+
+def run_benchmark(config, job):
+    exit_code = None
+    try:
+        site = config['site']
+        job.log(f'📈 Load benchmark of {site}')
+        job.log('═══════════════════════════════════════')
+        previous = loadbench.history(broker.store, site, socket.gethostname(), limit=1)
+
+        def on_result(result):
+            if previous:
+                result['change'] = loadbench.compare({'endpoints': [result]}, previous[0]).get(result['name'])
+            job.event('benchmark', result)
+
+        port = config.get('port')
+        result = loadbench.benchmark(
+            site, config.get('host') or 'localhost', int(port) if port else None, bool(config.get('ssl')),
+            config.get('concurrency') or loadbench.DEFAULT_CONCURRENCY,
+            config.get('duration') or loadbench.DEFAULT_DURATION,
+            config.get('user') or 'Administrator', config.get('password'), job.log, on_result)
+        if previous:
+            result['compared_to'] = previous[0]['job_id']
+            result['changes'] = loadbench.compare(result, previous[0])
+            if result['changes']:
+                job.log('Compared with the previous run:')
+                for line in loadbench.format_changes(result['changes'], previous[0]):
+                    job.log(line)
+        job.report = result
+        measured = [e for e in result['endpoints'] if not e.get('skipped') and e['p50'] is not None]
+        exit_code = 0 if measured else 1
+        job.event('complete', {'message': '✅ Benchmark finished!' if measured else '❌ No endpoint answered'})
+    except Exception as e:
+        job.log(f'ERROR: {str(e)}')
+    finally:
+        status['benchmark_running'] = False
+        job.finish(exit_code)
+
+def apt_packages(config):
+    """All apt packages of the enabled steps, in install order"""
+    packages = []
+    for step in INSTALL_STEPS:
+        if step_enabled(step, config):
+            packages += [p for p in step.get('packages', ()) if p not in packages]
+    return packages
+
+def apt_settings(config):
+    """(cache_dir, apt-get options) for the package cache configuration.
+
+    With a cache directory every downloaded .deb is kept there and reused
+    by later installs; offline mode installs from that directory only.
+    """
+    cache_dir = (config.get('apt_cache_dir') or '').strip()
+    if not cache_dir:
+        return DEB_DOWNLOAD_DIR, ''
+    opts = f'-o Dir::Cache::archives="{cache_dir}" -o APT::Keep-Downloaded-Packages=true'
+    if config.get('apt_offline'):
+        opts += ' --no-download'
+    return cache_dir, opts
+
+def bench_cache_functions(config):
+    """Shell helpers for the pre-built bench cache used by Steps 9 and 12.
+
+    Packed benches are stored as BENCH_CACHE_DIR/<key>.tar.zst (or .tar.gz
+    without zstd) next to a <key>.json description. The key hashes
+    everything a bench build depends on: frappe branch, installed apps,
+    Python and Node versions, CPU architecture and the bench path (the
+    virtualenv has absolute paths baked in). Site directories are never
+    packed.
+    """
     user = config['username']
-    site = config['sitename']
     ver = config['version']
-    mysql = config['mysql_pass']
-    admin = config['admin_pass']
-    prod = "yes" if config['prod_mode'] else "no"
-    inst = "yes" if config['install_erpnext'] else "no"
-
     bench_ver = f"version-{ver}" if ver in ["13","14","15"] else "develop"
-    node_ver = "18" if ver in ["15","develop"] else "16"
-
-    return f'''#!/bin/bash
-set -e
 
-echo "Step 1: System update..."
-apt update && apt upgrade -y
-
-echo "Step 2: Python & dependencies..."
-apt install -y git curl wget python3-dev python3-pip python3-venv python3-setuptools software-properties-common pkg-config
+    return f'''cache_dir="{BENCH_CACHE_DIR}"
+bench_path="/home/{user}/frappe-bench"
+if command -v zstd >/dev/null; then
+    pack="zstd -T0 -3 -q"; unpack="zstd -d -T0 -q"; ext="tar.zst"
+else
+    pack="gzip -1"; unpack="gzip -d"; ext="tar.gz"
+fi
 
-echo "Step 3: MariaDB..."
-apt install -y mariadb-server mariadb-client default-libmysqlclient-dev
+bench_key() {{
+    local py node
+    py=$(python3 -c 'import sys; print("%d.%d" % sys.version_info[:2])')
+    node=$(sudo -u "{user}" -H bash -lc '. "$HOME/.nvm/nvm.sh" >/dev/null 2>&1; node --version')
+    printf 'frappe=%s apps=%s python=%s node=%s arch=%s path=%s' \\
+        "{bench_ver}" "$1" "$py" "$node" "$(uname -m)" "$bench_path" | sha256sum | cut -c1-16
+}}
 
-echo "Step 4: Redis..."
-apt install -y redis-server
+restore_bench() {{
+    local archive
+    archive=$(ls "$cache_dir/$1".tar.* 2>/dev/null | head -1)
+    [ -n "$archive" ] && [ ! -e "$bench_path" ] || return 1
+    echo "Restoring pre-built bench $1 from cache..."
+    tar -C "/home/{user}" -I "$unpack" -xf "$archive"
+    chown -R "{user}:{user}" "$bench_path"
+    touch "$cache_dir/$1.json"
+}}
 
-echo "Step 5: Nginx..."
-[[ "{prod}" == "yes" ]] && apt install -y nginx supervisor fail2ban certbot python3-certbot-nginx
+save_bench() {{
+    local key="$1" apps="$2" excludes=() site start
+    start=$(date +%s)
+    mkdir -p "$cache_dir"
+    for site in "$bench_path"/sites/*/; do
+        site=$(basename "$site")
+        [ "$site" != "assets" ] && excludes+=(--exclude="frappe-bench/sites/$site")
+    done
+    echo "Saving bench to cache as $key..."
+    tar -C "/home/{user}" -I "$pack" "${{excludes[@]}}" \\
+        --exclude=frappe-bench/logs --exclude=frappe-bench/config/pids \\
+        --exclude=frappe-bench/sites/currentsite.txt \\
+        -cf "$cache_dir/$key.$ext.part" frappe-bench
+    mv "$cache_dir/$key.$ext.part" "$cache_dir/$key.$ext"
+    printf '{{"key": "%s", "frappe_branch": "{bench_ver}", "apps": "%s", "archive": "%s", "created": %s, "pack_seconds": %s}}\\n' \\
+        "$key" "$apps" "$key.$ext" "$(date +%s)" "$(( $(date +%s) - start ))" > "$cache_dir/$key.json"
+}}'''
+
+def install_step_bodies(config):
+    """Shell commands of each install step, keyed by step number"""
+    user = config['username']
+    site = config['sitename']
+    ver = config['version']
+    mysql = config['mysql_pass']
+    admin = config['admin_pass']
 
-echo "Step 6: wkhtmltopdf..."
-arch=$(uname -m); [[ "$arch" == "x86_64" ]] && arch="amd64"; [[ "$arch" == "aarch64" ]] && arch="arm64"
-wget -q "https://github.com/wkhtmltopdf/packaging/releases/download/0.12.6.1-2/wkhtmltox_0.12.6.1-2.jammy_${{arch}}.deb" -O /tmp/w.deb
-dpkg -i /tmp/w.deb || apt --fix-broken install -y
-rm /tmp/w.deb
+    bench_ver = f"version-{ver}" if ver in ["13","14","15"] else "develop"
+    node_ver = "18" if ver in ["15","develop"] else "16"
 
-echo "Step 7: Node.js & Yarn..."
-if ! id "{user}" &>/dev/null; then
+    cache_functions = bench_cache_functions(config)
+    # Host-aware MariaDB / Redis / sysctl settings (tuning.py, inlined)
+    tune_skipped = 'echo "⚠️ Performance profile not applied"'
+    tune_mariadb = tuning.inline_command('mariadb --apply --no-restart', tune_skipped)
+    tune_host = tuning.inline_command('redis sysctl --apply', tune_skipped)
+    use_cache = "yes" if config.get('bench_cache') else "no"
+    full_apps = "frappe,erpnext" if config.get('install_erpnext') else "frappe"
+
+    deb_dir, apt_opts = apt_settings(config)
+    wkhtmltopdf_deb = WKHTMLTOPDF_DEB.format(dir=deb_dir)
+    packages = " ".join(apt_packages(config))
+    offline = bool(config.get('apt_offline'))
+    upgrade = config.get('system_upgrade', True)
+
+    if offline:
+        fetch_deb = 'echo "Offline mode: $deb is not in the package cache"; exit 1'
+    else:
+        fetch_deb = '''wget -q "$url" -O "$deb.part" || curl -fsSL "$url" -o "$deb.part" ||
+        python3 -c "import sys, urllib.request; urllib.request.urlretrieve(*sys.argv[1:])" "$url" "$deb.part"
+    mv "$deb.part" "$deb"'''
+
+    def verify(num):
+        names = " ".join(next(s for s in INSTALL_STEPS if s['num'] == num)['packages'])
+        return f"dpkg-query -W -f='  ${{Package}} ${{Version}}\\n' {names}"
+
+    return {
+        1: f'''mkdir -p "{deb_dir}/partial"
+{"echo 'Offline mode: using cached package lists'" if offline else "apt-get update"}
+{f"apt-get -y {apt_opts} upgrade" if upgrade else "echo 'Skipping system upgrade'"}''',
+
+        2: f'''{wkhtmltopdf_deb}
+apt-get install -y {apt_opts + " " if apt_opts else ""}{packages} "$deb"
+{"" if config.get('apt_cache_dir') else 'rm -f "$deb"'}''',
+
+        3: verify(3),
+
+        4: verify(4),
+
+        5: verify(5),
+
+        6: f'''{wkhtmltopdf_deb}
+mkdir -p "{deb_dir}"
+if [ -s "$deb" ]; then
+    echo "Using cached $deb"
+else
+    {fetch_deb}
+fi''',
+
+        7: f'''if ! id "{user}" &>/dev/null; then
     adduser --gecos "" --disabled-password "{user}"
     echo "{user}:$(openssl rand -base64 12)" | chpasswd
     usermod -aG sudo "{user}"
@@ -936,22 +1893,25 @@ export NVM_DIR="$HOME/.nvm"
 [ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh"
 nvm install {node_ver}
 npm install -g yarn@1.22.19
-'
+\'''',
 
-echo "Step 8: Frappe Bench..."
-find /usr/lib/python3.*/EXTERNALLY-MANAGED 2>/dev/null | xargs rm -f || true
-pip3 install frappe-bench
+        8: '''find /usr/lib/python3.*/EXTERNALLY-MANAGED 2>/dev/null | xargs rm -f || true
+pip3 install frappe-bench''',
 
-echo "Step 9: Bench initialization..."
+        9: f'''{cache_functions}
+if [ "{use_cache}" = "yes" ] && {{ restore_bench "$(bench_key {full_apps})" || restore_bench "$(bench_key frappe)"; }}; then
+    echo "Skipped bench init: using cached build"
+else
 sudo -u "{user}" -H bash -lc '
 export NVM_DIR="$HOME/.nvm"
 [ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh"
 cd "$HOME"
 bench init frappe-bench --frappe-branch {bench_ver}
 '
+[ "{use_cache}" = "yes" ] && save_bench "$(bench_key frappe)" frappe
+fi''',
 
-echo "Step 10: MariaDB configuration..."
-systemctl stop mariadb || true
+        10: f'''systemctl stop mariadb || true
 mkdir -p /etc/mysql/conf.d /etc/mysql/mariadb.conf.d
 [ ! -f /var/lib/mysql/ibdata1 ] && rm -rf /var/lib/mysql/* && mysql_install_db --user=mysql
 systemctl start mariadb
@@ -963,32 +1923,38 @@ cat >> /etc/mysql/my.cnf << 'EOF'
 character-set-server = utf8mb4
 collation-server = utf8mb4_unicode_ci
 EOF
+{tune_mariadb}
 systemctl restart mariadb
-sleep 3
+sleep 3''',
 
-echo "Step 11: Creating site..."
-until mysqladmin ping -u root -p"{mysql}" --silent 2>/dev/null; do sleep 2; done
+        11: f'''until mysqladmin ping -u root -p"{mysql}" --silent 2>/dev/null; do sleep 2; done
 sudo -u "{user}" -H bash -lc '
 export NVM_DIR="$HOME/.nvm"
 [ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh"
 cd "$HOME/frappe-bench"
 bench new-site {site} --db-root-password {mysql} --admin-password {admin}
-'
+\'''',
 
-[[ "{inst}" == "yes" ]] && {{
-echo "Step 12: Installing ERPNext..."
+        12: f'''{cache_functions}
+if [ -d "$bench_path/apps/erpnext" ]; then
+    echo "ERPNext app already in bench (restored from cache)"
+else
 sudo -u "{user}" -H bash -lc '
 export NVM_DIR="$HOME/.nvm"
 [ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh"
 cd "$HOME/frappe-bench"
 bench get-app erpnext --branch {bench_ver}
-bench --site {site} install-app erpnext
 '
-}}
+[ "{use_cache}" = "yes" ] && save_bench "$(bench_key {full_apps})" {full_apps}
+fi
+sudo -u "{user}" -H bash -lc '
+export NVM_DIR="$HOME/.nvm"
+[ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh"
+cd "$HOME/frappe-bench"
+bench --site {site} install-app erpnext
+\'''',
 
-[[ "{prod}" == "yes" ]] && {{
-echo "Step 13: Production setup..."
-pkill -f "bench start" 2>/dev/null || true
+        13: f'''pkill -f "bench start" 2>/dev/null || true
 cd /home/{user}/frappe-bench
 yes | bench setup production {user}
 sudo -u "{user}" -H bash -lc '
@@ -997,19 +1963,160 @@ export NVM_DIR="$HOME/.nvm"
 cd "$HOME/frappe-bench"
 bench --site {site} scheduler enable
 '
-supervisorctl restart all
-}}
+supervisorctl restart all''',
 
-echo "Step 14: Security setup..."
-command -v ufw && ufw allow 22,80,443/tcp && ufw --force enable || true
+        14: '''command -v ufw && ufw allow 22,80,443/tcp && ufw --force enable || true''',
 
-echo "Step 15: Optimization..."
-sysctl -w net.core.somaxconn=65535 2>/dev/null || true
+        15: tune_host,
+    }
 
-echo "✅ Installation complete!"
-exit 0
+def install_step_probes(config):
+    """Shell conditions that hold once a step's work is in place.
+
+    Used when resuming: a step recorded as done in the state file is only
+    skipped if its probe still succeeds.
+    """
+    user = config['username']
+    site = config['sitename']
+    ver = config['version']
+    mysql = config['mysql_pass']
+    node_ver = "18" if ver in ["15","develop"] else "16"
+    bench = f"/home/{user}/frappe-bench"
+
+    return {
+        1: '''[ -n "$(find /var/lib/apt/lists -maxdepth 1 -name '*_Packages' -mmin -1440 2>/dev/null | head -1)" ]''',
+        2: f'''dpkg -s {" ".join(apt_packages(config))} && command -v wkhtmltopdf''',
+        3: '''dpkg -s mariadb-server mariadb-client default-libmysqlclient-dev''',
+        4: '''dpkg -s redis-server''',
+        5: '''dpkg -s nginx supervisor fail2ban certbot python3-certbot-nginx''',
+        6: f'''command -v wkhtmltopdf || {{ {WKHTMLTOPDF_DEB.format(dir=apt_settings(config)[0])}; [ -s "$deb" ]; }}''',
+        7: f'''id "{user}" && sudo -u "{user}" -H bash -lc '. "$HOME/.nvm/nvm.sh" && nvm ls {node_ver} && command -v yarn\'''',
+        8: '''command -v bench''',
+        9: f'''[ -d {bench}/apps/frappe ] && [ -x {bench}/env/bin/python ]''',
+        10: f'''grep -q "character-set-server = utf8mb4" /etc/mysql/my.cnf && [ -f {tuning.MARIADB_CONF} ] && mysqladmin ping -u root -p"{mysql}" --silent''',
+        11: f'''[ -f {bench}/sites/{site}/site_config.json ]''',
+        12: f'''[ -d {bench}/apps/erpnext ] && sudo -u "{user}" -H bash -lc 'cd "$HOME/frappe-bench" && bench --site {site} list-apps' | grep -q erpnext''',
+        13: '''[ -f /etc/supervisor/conf.d/frappe-bench.conf ] && [ -f /etc/nginx/conf.d/frappe-bench.conf ]''',
+        14: '''! command -v ufw || ufw status | grep -q "Status: active"''',
+        15: f'''[ -f {tuning.SYSCTL_CONF} ] && [ "$(sysctl -n net.core.somaxconn)" -ge 65535 ]''',
+    }
+
+def state_path(name):
+    """Path of a file in the installer state directory.
+
+    STATE_DIR needs root; when the web installer runs unprivileged the
+    state lives under ~/.local/state instead.
+    """
+    for directory in (STATE_DIR, os.path.expanduser('~/.local/state/erpnext-installer')):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(directory, os.W_OK):
+            return os.path.join(directory, name)
+    raise PermissionError(f'No writable state directory ({STATE_DIR})')
+
+def config_fingerprint(config):
+    """Hash of the settings that decide what the install steps produce"""
+    keys = ('username', 'sitename', 'version', 'prod_mode', 'install_erpnext')
+    data = json.dumps({k: config.get(k) for k in keys}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+def load_install_state():
+    try:
+        with open(state_path('state.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_install_state(job, state):
+    """Atomically replace the state file; failures only cost resumability"""
+    state['updated'] = time.time()
+    try:
+        path = state_path('state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        job.log(f'⚠️ Could not save install state: {e}')
+
+def verify_completed_steps(job, config, state, work_dir):
+    """Steps that can be skipped on resume.
+
+    All probes run in a single shell. Steps count as verified up to the
+    first enabled step that is either not recorded as done or whose
+    probe fails; everything from there on is run again.
+    """
+    probes = install_step_probes(config)
+    enabled = [s['num'] for s in INSTALL_STEPS if step_enabled(s, config)]
+    recorded = [n for n in enabled if str(n) in state.get('steps', {})]
+    if not recorded:
+        job.log('▶️ No completed steps recorded, starting from Step 1')
+        return set()
+
+    script = "#!/bin/bash\n" + "".join(
+        f'if ( {probes[n]} ) >/dev/null 2>&1; then echo "##PROBE {n} ok"; else echo "##PROBE {n} fail"; fi\n'
+        for n in recorded)
+    script_path = os.path.join(work_dir, 'probes.sh')
+    with open(script_path, 'w') as f:
+        f.write(script)
+    os.chmod(script_path, 0o700)
+
+    started = time.time()
+    output = subprocess.run(['sudo', 'bash', script_path], capture_output=True, text=True).stdout
+    passed = {int(m.group(1)) for m in PROBE_MARKER.finditer(output) if m.group(2) == 'ok'}
+
+    verified = set()
+    for num in enabled:
+        if num not in passed:
+            break
+        verified.add(num)
+    resume_at = next((n for n in enabled if n not in verified), None)
+    job.log(f'🔎 Verified {len(verified)} completed step(s) in {time.time() - started:.1f}s')
+    if resume_at:
+        job.log(f'▶️ Resuming from Step {resume_at}')
+    return verified
+
+def step_section(step, bodies):
+    """Script fragment running one step between its start/end markers"""
+    num = step['num']
+    return f'''echo "##STEP {num} start"
+echo "Step {num}: {step['message']}"
+{bodies[num]}
+echo "##STEP {num} end"
 '''
 
+def sequential_order():
+    """Steps in the order a one-at-a-time run executes them.
+
+    Always the lowest-numbered step whose dependencies are done, which is
+    also what run_install_plan() does with max_parallel=1.
+    """
+    order = []
+    done = set()
+    remaining = list(INSTALL_STEPS)
+    while remaining:
+        step = next(s for s in remaining if all(dep in done for dep in s['after']))
+        remaining.remove(step)
+        done.add(step['num'])
+        order.append(step)
+    return order
+
+def generate_install_script(config):
+    """Complete install script, e.g. for running by hand on another host"""
+    bodies = install_step_bodies(config)
+    parts = ["#!/bin/bash\nset -e\n"]
+    for step in sequential_order():
+        num = step['num']
+        if not step_enabled(step, config):
+            parts.append(f'echo "##STEP {num} skip"\n')
+            continue
+        parts.append(step_section(step, bodies))
+    parts.append('''echo "✅ Installation complete!"
+exit 0
+''')
+    return "\n".join(parts)
+
 if __name__ == '__main__':
     server_ip = get_server_ip()
     print("\n" + "="*70)
@@ -1021,4 +2128,10 @@ if __name__ == '__main__':
     print("\n⚠️  Run with sudo for installation")
     print("⏹️  Press Ctrl+C to stop the server\n")
 
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    # Production mode: streams on an asyncio loop instead of a thread each
+    if '--async' in sys.argv or os.environ.get('ERPNEXT_ASYNC'):
+        # async_server serves the app and broker of its own `import web_installer`
+        import async_server
+        async_server.run(host='0.0.0.0', port=5000)
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)